@@ -6,7 +6,6 @@ Users can ask questions about their annotations and receive intelligent response
 with clickable annotation references.
 """
 
-import json
 import os
 import re
 from datetime import datetime
@@ -14,16 +13,29 @@ from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QTextEdi
                              QGroupBox, QComboBox, QPushButton, QProgressBar,
                              QMessageBox, QFormLayout, QApplication, QCheckBox,
                              QSplitter, QFrame, QTextBrowser, QLineEdit)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QUrl, QTimer
+from PyQt6.QtCore import Qt, QUrl, QTimer
 from PyQt6.QtGui import QFont, QTextCursor, QTextCharFormat, QColor, QDesktopServices
 
 try:
-    from google import genai
-    import google.genai.types as genai_types
-    NEW_API = True
+    from .ai_request_engine import get_request_engine, AIJob
+    from .context_cache import get_context_cache
+    from .transcript_cache import get_transcript_cache
+    from .annotation_store import AnnotationIndex
+    from .annotation_aliases import AnnotationAliases
+    from .prompt_templates import get_prompt_template
+    from .streaming_text_sink import StreamingMarkdownSink
+    from .prompt_budget_controls import PromptBudgetControls
+    from .session_store import get_main_window_session_store, compact_main_window_session
 except ImportError:
-    import google.generativeai as genai
-    NEW_API = False
+    from ai_request_engine import get_request_engine, AIJob
+    from context_cache import get_context_cache
+    from transcript_cache import get_transcript_cache
+    from annotation_store import AnnotationIndex
+    from annotation_aliases import AnnotationAliases
+    from prompt_templates import get_prompt_template
+    from streaming_text_sink import StreamingMarkdownSink
+    from prompt_budget_controls import PromptBudgetControls
+    from session_store import get_main_window_session_store, compact_main_window_session
 
 
 class QueryTextEdit(QTextEdit):
@@ -48,113 +60,6 @@ class QueryTextEdit(QTextEdit):
             super().keyPressEvent(event)
 
 
-class AIChatWorkerThread(QThread):
-    """Worker thread for AI chat processing"""
-    
-    response_received = pyqtSignal(str)
-    chunk_received = pyqtSignal(str)
-    error_occurred = pyqtSignal(str)
-    retry_suggested = pyqtSignal(str)
-    
-    def __init__(self, prompt, api_key, model="gemini-2.5-pro", max_retries=2):
-        super().__init__()
-        self.prompt = prompt
-        self.api_key = api_key
-        self.model = model
-        self.max_retries = max_retries
-        self._stop_requested = False
-        
-    def stop_generation(self):
-        """Request to stop the generation"""
-        self._stop_requested = True
-        
-    def run(self):
-        """Execute AI request with retry logic"""
-        for attempt in range(self.max_retries + 1):
-            if self._stop_requested:
-                return
-                
-            try:
-                if attempt > 0:
-                    print(f"AI chat attempt {attempt + 1}/{self.max_retries + 1}")
-                    import time
-                    time.sleep(2 ** attempt)
-                
-                if NEW_API:
-                    client = genai.Client(api_key=self.api_key)
-                    config = genai_types.GenerateContentConfig(
-                        temperature=0.7,
-                        top_p=0.9,
-                    )
-                    
-                    response = client.models.generate_content(
-                        model=self.model,
-                        contents=self.prompt,
-                        config=config
-                    )
-                    
-                    full_response = response.text if hasattr(response, 'text') else str(response)
-                    if full_response:
-                        self.chunk_received.emit(full_response)
-                        self.response_received.emit(full_response)
-                        return
-                    else:
-                        self.error_occurred.emit("No response generated from AI")
-                        return
-                        
-                else:
-                    genai.configure(api_key=self.api_key)
-                    model = genai.GenerativeModel(self.model)
-                    
-                    response = model.generate_content(
-                        self.prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            temperature=0.7,
-                            top_p=0.9,
-                        ),
-                        stream=True
-                    )
-                    
-                    full_response = ""
-                    for chunk in response:
-                        if self._stop_requested:
-                            return
-                        if chunk.text:
-                            full_response += chunk.text
-                            self.chunk_received.emit(chunk.text)
-                            
-                    if full_response:
-                        self.response_received.emit(full_response)
-                        return
-                    else:
-                        self.error_occurred.emit("No response generated from AI")
-                        return
-                        
-            except Exception as e:
-                error_str = str(e).lower()
-                retryable_errors = [
-                    '500 internal', 'internal server error', 'service unavailable',
-                    'timeout', 'connection error', 'network error', 'temporarily unavailable'
-                ]
-                
-                is_retryable = any(err in error_str for err in retryable_errors)
-                
-                if is_retryable and attempt < self.max_retries:
-                    print(f"Retryable error on attempt {attempt + 1}: {str(e)}")
-                    continue
-                else:
-                    if is_retryable:
-                        error_message = (
-                            f"AI service temporarily unavailable after {self.max_retries + 1} attempts.\n\n"
-                            f"Please try again in a few moments.\n\n"
-                            f"Original error: {str(e)}"
-                        )
-                        self.retry_suggested.emit(error_message)
-                    else:
-                        self.error_occurred.emit(f"AI chat failed: {str(e)}")
-                    return
-
-
 class AIAnnotationChatDialog(QDialog):
     """
     Dialog for AI-powered annotation querying and analysis.
@@ -165,9 +70,13 @@ class AIAnnotationChatDialog(QDialog):
         self.web_view = web_view
         self.main_window = main_window
         self.annotations_data = []
+        self.annotations_index = AnnotationIndex(self.annotations_data)
+        self.annotations_context = None  # Formatted annotation list, rebuilt when annotations reload
+        self.id_aliases = AnnotationAliases()  # Short IDs (A1, A2, ...) used in prompts and responses
+        self.context_cache_owner = f"{type(self).__name__}:{id(self)}"  # Server-side caches released on close
         self.full_transcript = ""
         self.api_key = ""
-        self.worker_thread = None
+        self.ai_job = None
         
         self.setWindowTitle("Ask Gemini (Annotations)")
         self.setModal(False)  # Non-modal dialog
@@ -182,6 +91,11 @@ class AIAnnotationChatDialog(QDialog):
         self.load_transcript_data()
         self.load_annotations_data()
         
+        # Live projected prompt size
+        self.budget_controls.set_prompt_source(lambda: self.create_ai_prompt(self.query_input.toPlainText().strip()))
+        self.include_transcript.toggled.connect(self.budget_controls.schedule_update)
+        self.query_input.textChanged.connect(self.budget_controls.schedule_update)
+        
     def setup_ui(self):
         """Setup the dialog UI"""
         layout = QVBoxLayout(self)
@@ -305,6 +219,21 @@ class AIAnnotationChatDialog(QDialog):
         self.include_transcript.setToolTip("When checked, AI gets full transcript for better context")
         model_layout.addRow(self.include_transcript)
         
+        # Response cache opt-out
+        self.use_cache_checkbox = QCheckBox("Reuse cached AI responses")
+        self.use_cache_checkbox.setChecked(True)
+        self.use_cache_checkbox.setToolTip("Answer an identical request (same prompt, model and settings) from the local response cache instead of calling Gemini again")
+        model_layout.addRow(self.use_cache_checkbox)
+
+        self.context_cache_checkbox = QCheckBox("Cache context on server")
+        self.context_cache_checkbox.setChecked(False)
+        self.context_cache_checkbox.setToolTip("Upload the transcript and annotation context to Gemini once (kept for 10 minutes) so each further question only sends the question itself")
+        model_layout.addRow(self.context_cache_checkbox)
+        
+        # Prompt token budget
+        self.budget_controls = PromptBudgetControls(self)
+        model_layout.addRow("Prompt Budget:", self.budget_controls)
+        
         config_layout.addWidget(model_group)
         
         # Statistics
@@ -357,6 +286,9 @@ class AIAnnotationChatDialog(QDialog):
         """)
         response_layout.addWidget(self.response_display)
         
+        # Streamed markdown is rendered block by block; only new HTML is appended
+        self.stream_sink = StreamingMarkdownSink(self.response_display, self.process_annotation_references)
+        
         splitter.addWidget(response_widget)
         
         # Set splitter proportions - smaller query section, larger response
@@ -402,7 +334,7 @@ class AIAnnotationChatDialog(QDialog):
         self.stop_button.hide()
         
         close_button = QPushButton("Close")
-        close_button.clicked.connect(self.hide)  # Hide instead of close
+        close_button.clicked.connect(self.close)  # closeEvent hides instead of closing
         
         button_layout.addWidget(self.clear_button)
         button_layout.addStretch()
@@ -423,55 +355,13 @@ class AIAnnotationChatDialog(QDialog):
         if not self.web_view:
             return
         
-        def handle_transcript(html):
-            if html:
-                from bs4 import BeautifulSoup
-                
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                for element in soup(["style", "script", "head"]):
-                    element.decompose()
-                
-                transcript_parts = []
-                speech_headers = soup.find_all('div', class_='speech-header')
-                
-                if speech_headers:
-                    for header in speech_headers:
-                        title_elem = header.find(class_='speech-title')
-                        
-                        if title_elem:
-                            title_text = title_elem.get_text(strip=True)
-                            
-                            content_elem = None
-                            next_sibling = header.find_next_sibling()
-                            while next_sibling:
-                                if next_sibling.name == 'div' and 'speech-content' in next_sibling.get('class', []):
-                                    content_elem = next_sibling
-                                    break
-                                next_sibling = next_sibling.find_next_sibling()
-                            
-                            if not content_elem:
-                                parent = header.find_parent()
-                                if parent:
-                                    content_elem = parent.find(class_='speech-content')
-                            
-                            if content_elem:
-                                content_text = content_elem.get_text(separator=' ', strip=True)
-                                if title_text and content_text:
-                                    formatted_entry = f"{title_text}: {content_text}"
-                                    transcript_parts.append(formatted_entry)
-                            elif title_text:
-                                transcript_parts.append(title_text)
-                else:
-                    text = soup.get_text(separator=' ', strip=True)
-                    import re
-                    text = re.sub(r'\s+', ' ', text).strip()
-                    transcript_parts.append(text)
-                
-                self.full_transcript = '\n\n'.join(transcript_parts)
-                print(f"DEBUG: Loaded transcript with {len(self.full_transcript)} characters for annotation chat")
+        def handle_transcript(transcript_text):
+            self.full_transcript = transcript_text
+            print(f"DEBUG: Loaded transcript with {len(self.full_transcript)} characters for annotation chat")
+            if hasattr(self, 'budget_controls'):
+                self.budget_controls.schedule_update()
                 
-        self.web_view.page().toHtml(handle_transcript)
+        get_transcript_cache().request_transcript(self.web_view, handle_transcript, self.main_window)
         
     def load_api_key(self):
         """Load API key from file"""
@@ -500,22 +390,14 @@ class AIAnnotationChatDialog(QDialog):
     def load_transcript_data(self):
         """Load persistent transcript data from session file (shared with Generate Notes)"""
         try:
-            if not hasattr(self.main_window, 'current_session_file') or not self.main_window.current_session_file:
+            session_store = get_main_window_session_store(self.main_window)
+            if not session_store:
                 print("DEBUG: No session file available to load transcript data")
                 return
             
-            session_file = self.main_window.current_session_file
-            if not os.path.exists(session_file):
-                print("DEBUG: Session file does not exist")
-                return
-            
-            # Load session data from file
-            with open(session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-            
-            # Load saved values from session data (same keys as Generate Notes)
-            title = session_data.get('ai_notes_title', '')
-            description = session_data.get('ai_notes_description', '')
+            # Load saved values (same keys as Generate Notes) with any journaled edits applied
+            title = session_store.get('ai_notes_title', '')
+            description = session_store.get('ai_notes_description', '')
             
             # Set UI values
             self.transcript_title.setText(title)
@@ -526,47 +408,21 @@ class AIAnnotationChatDialog(QDialog):
             print(f"Error loading transcript data: {e}")
     
     def save_transcript_data(self):
-        """Save transcript data directly to session file (shared with Generate Notes)"""
+        """Save transcript data to the session (journaled, shared with Generate Notes)"""
         try:
-            if not hasattr(self.main_window, 'current_session_file') or not self.main_window.current_session_file:
+            session_store = get_main_window_session_store(self.main_window)
+            if not session_store:
                 print("DEBUG: No session file available to save transcript data")
                 return
             
-            session_file = self.main_window.current_session_file
-            if not os.path.exists(session_file):
-                print("DEBUG: Session file does not exist")
-                return
-            
-            # Load current session data
-            with open(session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-            
             # Update AI notes configuration fields (same keys as Generate Notes)
-            session_data['ai_notes_title'] = self.transcript_title.text().strip()
-            session_data['ai_notes_description'] = self.transcript_description.toPlainText().strip()
-            
-            # Atomic write using temporary file for safety
-            import tempfile
-            import shutil
+            values = {
+                'ai_notes_title': self.transcript_title.text().strip(),
+                'ai_notes_description': self.transcript_description.toPlainText().strip(),
+            }
+            session_store.set_values(values)
             
-            temp_file = None
-            try:
-                with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False, 
-                                               dir=os.path.dirname(session_file)) as tf:
-                    temp_file = tf.name
-                    json.dump(session_data, tf, indent=2, ensure_ascii=False)
-                
-                # Atomic replacement
-                if os.path.exists(session_file):
-                    os.remove(session_file)
-                shutil.move(temp_file, session_file)
-                temp_file = None
-                
-                print(f"DEBUG: Saved transcript data to session file - title: '{session_data['ai_notes_title']}'")
-                
-            finally:
-                if temp_file and os.path.exists(temp_file):
-                    os.remove(temp_file)
+            print(f"DEBUG: Saved transcript data to session journal - title: '{values['ai_notes_title']}'")
                 
         except Exception as e:
             print(f"Error saving transcript data: {e}")
@@ -663,6 +519,9 @@ class AIAnnotationChatDialog(QDialog):
             }
             self.annotations_data.append(annotation_info)
         
+        self.annotations_index = AnnotationIndex(self.annotations_data)
+        self.id_aliases = AnnotationAliases()
+        self.annotations_context = None
         filtered_count = len(self.annotations_data)
         
         # Update stats display to show filtering status
@@ -693,10 +552,12 @@ class AIAnnotationChatDialog(QDialog):
         
         print(f"DEBUG: Loaded {filtered_count}/{total_annotations} annotations for AI chat (filtering: {self._has_active_filters(theme_search)})")
         
-    def create_ai_prompt(self, user_query):
-        """Create the AI prompt with annotations context"""
-        annotations_context = self.build_annotations_context()
+    def create_ai_prompt(self, user_query, transcript_text=None, compact=False):
+        """Create the AI prompt with annotations context (transcript_text overrides the full transcript, e.g. when trimmed)"""
+        annotations_context = self.build_annotations_context(compact)
         include_transcript = self.include_transcript.isChecked()
+        if transcript_text is None:
+            transcript_text = self.full_transcript
         
         # Get transcript information (always included)
         transcript_title = self.transcript_title.text().strip()
@@ -707,7 +568,8 @@ class AIAnnotationChatDialog(QDialog):
         transcript_info += f"Title: {transcript_title if transcript_title else 'Not specified'}\n"
         transcript_info += f"Description: {transcript_description if transcript_description else 'Not specified'}\n"
         
-        prompt = f"""You are an AI assistant helping users analyze and find specific annotations from their text analysis work in Scriptoria.
+        # Stable sections first so repeated questions share a cacheable prefix
+        instructions = f"""You are an AI assistant helping users analyze and find specific annotations from their text analysis work in Scriptoria.
 
 {transcript_info}
 
@@ -720,44 +582,45 @@ Scriptoria is a text analysis and annotation tool. Users read through text docum
 - Notes: Brief summary (3-6 words)
 - Notes HTML: Detailed explanation (1-2 sentences)
 
-ANNOTATIONS AVAILABLE ({len(self.annotations_data)} total):
-{annotations_context}
-
-{'FULL TRANSCRIPT CONTEXT:' + self.full_transcript if include_transcript else 'Note: Full transcript context not included (user can enable this option).'}
-
-USER QUESTION: {user_query}
-
 RESPONSE INSTRUCTIONS:
 1. Analyze the user's question and find relevant annotations
-2. When referencing specific annotations, use the format [[ANNOTATION_ID]] where ANNOTATION_ID is the EXACT ID from the annotation list above
+2. When referencing specific annotations, use the format [[ANNOTATION_ID]] where ANNOTATION_ID is the EXACT ID from the annotation list (e.g. [[A12]])
 3. Be helpful and specific in your analysis
 4. If you can't find exact matches, suggest the closest alternatives
 5. For each annotation reference, provide brief reasoning (1 sentence) explaining why it matches
 6. Do not include the full annotation text in your response - users can click the links to see the content
 
 CRITICAL ANNOTATION ID RULES:
-- ONLY use annotation IDs that appear EXACTLY in the "ANNOTATIONS AVAILABLE" list above
-- IDs are long UUID strings like "e5ef45de-a6dd-47e7-9a85-ed10fe13a187"
-- Do NOT make up IDs, use short IDs, or modify existing IDs
-- Do NOT use numbers like "14" or "12" - these are not valid IDs
-- If you reference an annotation, copy its FULL ID exactly from the list
-- Invalid IDs will show as "annotation not found" and break the user experience
+- ONLY use annotation IDs that appear EXACTLY in the "ANNOTATIONS AVAILABLE" list
+- IDs are short codes like "A12" - the letter A followed by a number
+- Do NOT make up IDs or modify existing IDs
+- Do NOT use bare numbers like "14" or "12" - these are not valid IDs
+- If you reference an annotation, copy its ID exactly from the list
+- Invalid IDs will show as "annotation not found" and break the user experience"""
+
+        transcript_section = ('FULL TRANSCRIPT CONTEXT:' + transcript_text if include_transcript
+                              else 'Note: Full transcript context not included (user can enable this option).')
+        annotations_section = f"ANNOTATIONS AVAILABLE ({len(self.annotations_data)} total):\n{annotations_context}"
+        request = f"""USER QUESTION: {user_query}
 
 DOUBLE-CHECK: Before using any [[ANNOTATION_ID]], verify it exists in the list above.
 
 Respond naturally and helpfully to the user's question."""
 
+        prompt = get_prompt_template('ask_gemini').render(instructions, transcript_section, annotations_section, request)
         return prompt
         
-    def build_annotations_context(self):
-        """Build context string from annotations data"""
+    def build_annotations_context(self, compact=False):
+        """Build context string from annotations data (compact drops detailed notes and long text to save tokens)"""
         if not self.annotations_data:
             return "No annotations available."
+        if not compact and self.annotations_context is not None:
+            return self.annotations_context
         
         context_parts = []
         for i, annotation in enumerate(self.annotations_data, 1):
             context_part = f"Annotation {i}:\n"
-            context_part += f"ID: {annotation['id']}\n"
+            context_part += f"ID: {self.id_aliases.alias(annotation['id'])}\n"
             context_part += f"Theme: {annotation['scene']}\n"
             
             if annotation['secondary_scenes']:
@@ -769,16 +632,22 @@ Respond naturally and helpfully to the user's question."""
             if annotation['notes']:
                 context_part += f"Brief Notes: {annotation['notes']}\n"
                 
-            if annotation['notes_html']:
+            if annotation['notes_html'] and not compact:
                 # Strip HTML tags for context
                 from bs4 import BeautifulSoup
                 clean_notes = BeautifulSoup(annotation['notes_html'], 'html.parser').get_text()
                 context_part += f"Detailed Notes: {clean_notes}\n"
                 
-            context_part += f"Text: {annotation['text']}\n"
+            text = annotation['text']
+            if compact and len(text) > 200:
+                text = text[:200] + "..."
+            context_part += f"Text: {text}\n"
             context_parts.append(context_part)
         
-        return '\n'.join(context_parts)
+        context = '\n'.join(context_parts)
+        if not compact:
+            self.annotations_context = context
+        return context
         
     def ask_gemini(self):
         """Send query to Gemini AI"""
@@ -798,23 +667,15 @@ Respond naturally and helpfully to the user's question."""
             QMessageBox.warning(self, "No Annotations", "No annotations found to analyze.")
             return
             
-        # Check if full transcript context is enabled and transcript is large
-        if self.include_transcript.isChecked() and len(self.full_transcript) > 500000:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Large Transcript Warning")
-            msg.setText("The transcript is very large (over 500,000 characters).")
-            msg.setInformativeText("Including full transcript context will use a significant number of tokens. Do you want to continue?")
-            msg.setDetailedText(f"Transcript size: {len(self.full_transcript):,} characters\n\n"
-                               f"This will consume substantial API tokens and may be expensive. "
-                               f"Consider unchecking 'Include full transcript context' for a more economical approach.")
-            msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-            msg.setDefaultButton(QMessageBox.StandardButton.No)
-            msg.setIcon(QMessageBox.Icon.Warning)
-            
-            if msg.exec() == QMessageBox.StandardButton.No:
-                return
-            
-        prompt = self.create_ai_prompt(query)
+        # Hold the prompt to the token budget - trim transcript context, then annotation detail
+        transcript_context = self.full_transcript if self.include_transcript.isChecked() else ""
+        prompt = self.budget_controls.apply_budget(
+            lambda context: self.create_ai_prompt(query, context),
+            transcript_context,
+            compact_build_prompt=lambda context: self.create_ai_prompt(query, context, compact=True)
+        )
+        if not prompt:
+            return
         
         print("=" * 80)
         print("DEBUG: ANNOTATION CHAT PROMPT:")
@@ -822,8 +683,8 @@ Respond naturally and helpfully to the user's question."""
         print(prompt[:1000] + "..." if len(prompt) > 1000 else prompt)
         print("=" * 80)
         
-        # Reset streaming accumulation
-        self._accumulating_text = ""
+        # Reset streaming display
+        self.stream_sink.clear()
         
         # Update UI for processing state
         self.ask_button.hide()
@@ -831,40 +692,33 @@ Respond naturally and helpfully to the user's question."""
         self.progress_bar.show()
         self.progress_bar.setFormat("Gemini is analyzing your annotations...")
         
-        # Start AI worker thread
+        # Submit to the shared AI request engine
         model = self.model_selector.currentText()
-        self.worker_thread = AIChatWorkerThread(prompt, self.api_key, model)
-        self.worker_thread.response_received.connect(self.handle_ai_response)
-        self.worker_thread.chunk_received.connect(self.handle_ai_chunk)
-        self.worker_thread.error_occurred.connect(self.handle_ai_error)
-        self.worker_thread.retry_suggested.connect(self.handle_retry_suggestion)
-        self.worker_thread.finished.connect(self.cleanup_worker)
-        self.worker_thread.start()
+        self.ai_job = get_request_engine().submit(prompt, self.api_key, model,
+                                                  temperature=0.7, top_p=0.9,
+                                                  label="Ask Gemini",
+                                                  use_cache=self.use_cache_checkbox.isChecked(),
+                                                  context_cache=self.context_cache_checkbox.isChecked(),
+                                                  cache_owner=self.context_cache_owner)
+        self.ai_job.response_received.connect(self.handle_ai_response)
+        self.ai_job.chunk_received.connect(self.handle_ai_chunk)
+        self.ai_job.error_occurred.connect(self.handle_ai_error)
+        self.ai_job.retry_suggested.connect(self.handle_retry_suggestion)
+        self.ai_job.finished.connect(self.cleanup_worker)
         
     def handle_ai_response(self, response_text):
         """Handle complete AI response"""
         print(f"DEBUG: Received complete AI response: {len(response_text)} characters")
         
-        # Process the response to convert [[ANNOTATION_ID]] to clickable links
-        processed_response = self.process_annotation_references(response_text)
-        
-        # Set the processed response
-        self.response_display.setHtml(processed_response)
+        # Render the last block - streamed blocks already have their links and formatting
+        self.stream_sink.finish(response_text)
         
     def handle_ai_chunk(self, chunk_text):
         """Handle streaming AI response chunks"""
         self.progress_bar.setFormat("Gemini is responding...")
         
-        # For QTextBrowser, we'll accumulate text and show it
-        current_text = getattr(self, '_accumulating_text', '') + chunk_text
-        self._accumulating_text = current_text
-        
-        # Show the raw text while streaming (will be processed when complete)
-        self.response_display.setPlainText(current_text)
-        
-        # Auto-scroll to bottom
-        scrollbar = self.response_display.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        # Completed markdown blocks are rendered (with annotation links) as they arrive
+        self.stream_sink.append(chunk_text)
         
     def handle_ai_error(self, error_message):
         """Handle AI processing errors"""
@@ -888,24 +742,26 @@ Respond naturally and helpfully to the user's question."""
             
     def stop_processing(self):
         """Stop the AI processing"""
-        if self.worker_thread:
-            self.worker_thread.stop_generation()
-            self.worker_thread.terminate()
-            self.worker_thread.wait()
-            self.worker_thread.deleteLater()
+        if self.ai_job:
+            self.ai_job.cancel()  # Engine drops any further output from this job
         
         self.cleanup_worker()
+        self.stream_sink.finish()
         self.response_display.append("\n<i>Generation stopped by user.</i>")
         
     def cleanup_worker(self):
-        """Clean up worker thread and reset UI"""
+        """Reset UI once the AI job is done"""
+        job = self.sender() if isinstance(self.sender(), AIJob) else None
+        # A retry may already have submitted a newer job - leave its UI state alone
+        if job is not None and job is not self.ai_job and self.ai_job is not None and self.ai_job.is_active():
+            return
+            
         self.ask_button.show()
         self.stop_button.hide()
         self.progress_bar.hide()
         
-        if self.worker_thread:
-            self.worker_thread.deleteLater()
-            self.worker_thread = None
+        if job is None or job is self.ai_job:
+            self.ai_job = None
             
     def clear_response(self):
         """Clear the response display"""
@@ -916,14 +772,13 @@ Respond naturally and helpfully to the user's question."""
         if not self.annotations_data:
             return self.markdown_to_html(text)
         
-        # Create a mapping of annotation IDs to their text
-        id_to_annotation = {ann['id']: ann for ann in self.annotations_data}
-        
         def replace_annotation_ref(match):
-            annotation_id = match.group(1).strip()
+            # Prompts list short aliases - map them back to real IDs
+            annotation_id = self.id_aliases.resolve(match.group(1).strip())
             
-            if annotation_id in id_to_annotation:
-                annotation = id_to_annotation[annotation_id]
+            # ID lookups go through the index built in load_annotations_data
+            annotation = self.annotations_index.get(annotation_id)
+            if annotation:
                 annotation_text = annotation['text']
                 
                 # Truncate text if too long for display
@@ -940,12 +795,12 @@ Respond naturally and helpfully to the user's question."""
                 # Annotation not found - try to find closest match
                 print(f"DEBUG: Annotation ID not found: '{annotation_id}'")
                 
-                # Only try matching if ID is more than 6 characters
-                if len(annotation_id) > 6:
+                # Only try matching real IDs of more than 6 characters - an unknown alias is not a typo
+                if len(annotation_id) > 6 and not self.id_aliases.is_alias(annotation_id):
                     closest_id = self.find_closest_annotation_id(annotation_id)
                     if closest_id:
                         print(f"DEBUG: Found closest match: '{closest_id}' for '{annotation_id}'")
-                        annotation = id_to_annotation[closest_id]
+                        annotation = self.annotations_index.get(closest_id)
                         annotation_text = annotation['text']
                         
                         # Truncate text if too long for display
@@ -1033,54 +888,10 @@ Respond naturally and helpfully to the user's question."""
         return '\n'.join(html_paragraphs)
     
     def find_closest_annotation_id(self, target_id):
-        """Find the closest matching annotation ID using string similarity"""
+        """Find the annotation ID a truncated or mistyped reference most likely means"""
         if not self.annotations_data:
             return None
-        
-        # Get all available IDs
-        available_ids = [ann['id'] for ann in self.annotations_data]
-        
-        best_match = None
-        best_score = 0
-        
-        # Use a simple character-based similarity metric
-        for candidate_id in available_ids:
-            score = self.calculate_similarity(target_id, candidate_id)
-            if score > best_score and score > 0.3:  # Minimum 30% similarity threshold
-                best_score = score
-                best_match = candidate_id
-        
-        return best_match
-    
-    def calculate_similarity(self, str1, str2):
-        """Calculate similarity between two strings (0.0 to 1.0)"""
-        # Convert to lowercase for comparison
-        str1, str2 = str1.lower(), str2.lower()
-        
-        # If one string is contained in the other, high similarity
-        if str1 in str2 or str2 in str1:
-            return 0.8
-        
-        # Calculate character overlap
-        set1, set2 = set(str1), set(str2)
-        intersection = len(set1.intersection(set2))
-        union = len(set1.union(set2))
-        
-        if union == 0:
-            return 0.0
-        
-        # Basic Jaccard similarity with length penalty
-        jaccard = intersection / union
-        
-        # Penalize large length differences
-        len_diff = abs(len(str1) - len(str2))
-        max_len = max(len(str1), len(str2))
-        if max_len > 0:
-            length_penalty = 1 - (len_diff / max_len)
-        else:
-            length_penalty = 1
-        
-        return jaccard * length_penalty
+        return self.annotations_index.resolver().resolve(target_id)
         
     def handle_annotation_click(self, url):
         """Handle clicks on annotation links"""
@@ -1101,11 +912,8 @@ Respond naturally and helpfully to the user's question."""
             try:
                 if hasattr(self.main_window, 'handle_navigate_to_annotation'):
                     # Find the scene for this annotation
-                    annotation_scene = None
-                    for annotation in self.annotations_data:
-                        if annotation['id'] == annotation_id:
-                            annotation_scene = annotation['scene']
-                            break
+                    annotation = self.annotations_index.get(annotation_id)
+                    annotation_scene = annotation['scene'] if annotation else None
                     
                     if annotation_scene:
                         print(f"DEBUG: Navigating to annotation {annotation_id} in scene {annotation_scene}")
@@ -1141,11 +949,15 @@ Respond naturally and helpfully to the user's question."""
             
     def hideEvent(self, event):
         """Override hide event to stop any running workers"""
-        if self.worker_thread and self.worker_thread.isRunning():
+        if self.ai_job and self.ai_job.is_active():
             self.stop_processing()
         super().hideEvent(event)
         
     def closeEvent(self, event):
         """Override close event to hide instead of close"""
+        # Write journaled title/description edits into the session file itself
+        compact_main_window_session(self.main_window)
+        # Delete the server-side context this dialog uploaded, off the GUI thread
+        get_context_cache().release_in_background(self.context_cache_owner)
         self.hide()
         event.ignore()  # Prevent actual closing
\ No newline at end of file
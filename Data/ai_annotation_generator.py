@@ -14,255 +14,44 @@ from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QTextEdi
                              QGroupBox, QComboBox, QSlider, QPushButton, QProgressDialog,
                              QMessageBox, QFormLayout, QApplication, QProgressBar, QWidget,
                              QTabWidget, QLineEdit, QCheckBox, QSpinBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont
+
 try:
-    from google import genai
-    import google.genai.types as genai_types
-    NEW_API = True
+    from .ai_request_engine import get_request_engine, AIJob, DEFAULT_MAX_CONCURRENCY, DEFAULT_GROUP_PARALLELISM
+    from .transcript_cache import get_transcript_cache
+    from .annotation_store import AnnotationIndex
+    from .annotation_windows import split_transcript_window_spans, merge_annotation_responses, DEFAULT_WINDOW_CHARS
+    from .token_budget import get_token_estimator
+    from .prompt_budget_controls import PromptBudgetControls
+    from .transcript_index import get_transcript_index
+    from .annotation_creation import create_annotations
+    from .theme_view_item_cache import get_theme_view_item_cache
+    from .session_store import get_main_window_session_store, compact_main_window_session
+    from .response_records import BracketRecordStream, iter_bracket_records, parse_annotation_record, parse_notes_record
+    from .annotation_aliases import AnnotationAliases
+    from .prompt_templates import get_prompt_template
 except ImportError:
-    import google.generativeai as genai
-    NEW_API = False
+    from ai_request_engine import get_request_engine, AIJob, DEFAULT_MAX_CONCURRENCY, DEFAULT_GROUP_PARALLELISM
+    from transcript_cache import get_transcript_cache
+    from annotation_store import AnnotationIndex
+    from annotation_windows import split_transcript_window_spans, merge_annotation_responses, DEFAULT_WINDOW_CHARS
+    from token_budget import get_token_estimator
+    from prompt_budget_controls import PromptBudgetControls
+    from transcript_index import get_transcript_index
+    from annotation_creation import create_annotations
+    from theme_view_item_cache import get_theme_view_item_cache
+    from session_store import get_main_window_session_store, compact_main_window_session
+    from response_records import BracketRecordStream, iter_bracket_records, parse_annotation_record, parse_notes_record
+    from annotation_aliases import AnnotationAliases
+    from prompt_templates import get_prompt_template
 
 
-class AIWorkerThread(QThread):
-    """Worker thread for AI processing to prevent UI blocking"""
-    
-    response_received = pyqtSignal(str)
-    chunk_received = pyqtSignal(str)
-    error_occurred = pyqtSignal(str)
-    retry_suggested = pyqtSignal(str)  # For suggesting retry on recoverable errors
-    
-    def __init__(self, prompt, api_key, model="gemini-2.5-pro", thinking_budget=None, max_retries=2):
-        super().__init__()
-        self.prompt = prompt
-        self.api_key = api_key
-        self.model = model
-        self.thinking_budget = thinking_budget
-        self.max_retries = max_retries
-        
-    def run(self):
-        """Execute AI request in background thread with streaming and retry logic"""
-        for attempt in range(self.max_retries + 1):
-            try:
-                if attempt > 0:
-                    print(f"AI request attempt {attempt + 1}/{self.max_retries + 1}")
-                    import time
-                    time.sleep(2 ** attempt)  # Exponential backoff: 2s, 4s, 8s...
-                
-                if NEW_API:
-                    # Use new google.genai API with thinking budget support
-                    print(f"DEBUG: Using NEW API (google.genai) - attempt {attempt + 1}")
-                    print(f"DEBUG: API key length: {len(self.api_key) if self.api_key else 0}")
-                    print(f"DEBUG: API key starts with: {self.api_key[:10]}..." if self.api_key and len(self.api_key) > 10 else "DEBUG: API key too short or missing")
-                    print(f"DEBUG: Prompt length: {len(self.prompt)} characters")
-                    print(f"DEBUG: Thinking budget: {self.thinking_budget}")
-                    
-                    client = genai.Client(api_key=self.api_key)
-                    
-                    # Configure generation with thinking budget
-                    config = genai_types.GenerateContentConfig(
-                        temperature=0.3,
-                        top_p=0.8,
-                    )
-                    
-                    # Add thinking budget if specified
-                    if self.thinking_budget is not None:
-                        config.thinking_config = genai_types.ThinkingConfig(
-                            thinking_budget=self.thinking_budget
-                        )
-                    
-                    print(f"DEBUG: Making API call to {self.model}...")
-                    # Generate response with streaming
-                    response = client.models.generate_content(
-                        model=self.model,
-                        contents=self.prompt,
-                        config=config
-                    )
-                    print(f"DEBUG: API call completed, processing response...")
-                else:
-                    # Fallback to old google.generativeai API
-                    print(f"DEBUG: Using OLD API (google.generativeai) - attempt {attempt + 1}")
-                    print(f"DEBUG: API key length: {len(self.api_key) if self.api_key else 0}")
-                    print(f"DEBUG: API key starts with: {self.api_key[:10]}..." if self.api_key and len(self.api_key) > 10 else "DEBUG: API key too short or missing")
-                    print(f"DEBUG: Prompt length: {len(self.prompt)} characters")
-                    
-                    genai.configure(api_key=self.api_key)
-                    model = genai.GenerativeModel(self.model)
-                    
-                    print(f"DEBUG: Making streaming API call to {self.model}...")
-                    # Generate response with streaming (no thinking budget support)
-                    response = model.generate_content(
-                        self.prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            temperature=0.3,
-                            top_p=0.8,
-                        ),
-                        stream=True
-                    )
-                    print(f"DEBUG: Streaming API call initiated, processing chunks...")
-                
-                if NEW_API:
-                    # New API returns text directly
-                    print(f"DEBUG: Processing NEW API response...")
-                    print(f"DEBUG: Response object type: {type(response)}")
-                    print(f"DEBUG: Response has 'text' attribute: {hasattr(response, 'text')}")
-                    
-                    if hasattr(response, 'text'):
-                        full_response = response.text
-                        print(f"DEBUG: Response.text length: {len(full_response) if full_response else 0}")
-                        if full_response:
-                            print(f"DEBUG: Response starts with: '{full_response[:100]}...'")
-                        else:
-                            print(f"DEBUG: Response.text is empty or None: {repr(full_response)}")
-                    else:
-                        full_response = str(response)
-                        print(f"DEBUG: No 'text' attribute, using str(response): '{full_response[:100]}...'")
-                    
-                    if full_response:
-                        print(f"DEBUG: Emitting successful response ({len(full_response)} chars)")
-                        self.chunk_received.emit(full_response)
-                        self.response_received.emit(full_response)
-                        return  # Success - exit retry loop
-                    else:
-                        # Analyze the empty response to provide better error information
-                        print(f"DEBUG: Empty response from API - analyzing response object...")
-                        
-                        # Check for candidates and finish reasons
-                        candidates_info = ""
-                        if hasattr(response, 'candidates') and response.candidates:
-                            candidate = response.candidates[0]
-                            finish_reason = getattr(candidate, 'finish_reason', 'UNKNOWN')
-                            safety_ratings = getattr(candidate, 'safety_ratings', None)
-                            
-                            candidates_info = f"Finish reason: {finish_reason}"
-                            if safety_ratings:
-                                candidates_info += f", Safety ratings: {safety_ratings}"
-                            
-                            print(f"DEBUG: Candidate analysis: {candidates_info}")
-                            
-                            # Check if content filtering might be the issue
-                            if finish_reason == 'SAFETY':
-                                error_msg = (
-                                    "AI response blocked by safety filters. This may be due to:\n"
-                                    "• Content in your transcript triggering safety systems\n"
-                                    "• Try simplifying your prompt or filtering sensitive content\n"
-                                    f"• Technical details: {candidates_info}"
-                                )
-                            elif finish_reason == 'MAX_TOKENS':
-                                error_msg = (
-                                    "AI response truncated due to token limits. Try:\n"
-                                    "• Reducing transcript length\n"
-                                    "• Processing fewer annotations at once\n"
-                                    "• Using a lower thinking budget\n"
-                                    f"• Technical details: {candidates_info}"
-                                )
-                            elif finish_reason == 'STOP':
-                                # Check usage metadata for more clues
-                                usage_info = ""
-                                if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                                    usage = response.usage_metadata
-                                    prompt_tokens = getattr(usage, 'prompt_token_count', 0)
-                                    total_tokens = getattr(usage, 'total_token_count', 0)
-                                    thoughts_tokens = getattr(usage, 'thoughts_token_count', 0)
-                                    usage_info = f" (Prompt: {prompt_tokens}, Total: {total_tokens}, Thoughts: {thoughts_tokens} tokens)"
-                                
-                                error_msg = (
-                                    "AI completed processing but returned no content. This may be due to:\n\n"
-                                    "LIKELY CAUSES:\n"
-                                    "• Content filtering or safety restrictions\n"
-                                    "• Prompt too complex or confusing for the AI\n"
-                                    "• Annotation format issues (missing IDs, malformed text)\n\n"
-                                    "TRY THESE SOLUTIONS:\n"
-                                    "• Use fewer annotations per request (try 5-10 instead of 17)\n"
-                                    "• Disable 'Use Full Transcript Context' to reduce complexity\n"
-                                    "• Lower the thinking budget (try 1000 instead of 2000)\n"
-                                    "• Check for unusual characters or content in annotations\n\n"
-                                    f"Technical details: {candidates_info}{usage_info}"
-                                )
-                            else:
-                                error_msg = f"AI processing stopped unexpectedly: {finish_reason}\n{candidates_info}"
-                        else:
-                            error_msg = "No response candidates received from AI API"
-                        
-                        print(f"DEBUG: Detailed error analysis: {error_msg}")
-                        self.error_occurred.emit(error_msg)
-                        return
-                else:
-                    # Old API streaming handling
-                    print(f"DEBUG: Processing OLD API streaming response...")
-                    full_response = ""
-                    chunk_count = 0
-                    
-                    for chunk in response:
-                        chunk_count += 1
-                        print(f"DEBUG: Processing chunk {chunk_count}: has text={hasattr(chunk, 'text')}")
-                        
-                        if hasattr(chunk, 'text') and chunk.text:
-                            chunk_text = chunk.text
-                            print(f"DEBUG: Chunk {chunk_count} text length: {len(chunk_text)}")
-                            full_response += chunk_text
-                            self.chunk_received.emit(chunk_text)
-                        else:
-                            print(f"DEBUG: Chunk {chunk_count} has no text or empty text: {repr(getattr(chunk, 'text', 'NO_TEXT_ATTR'))}")
-                            
-                    print(f"DEBUG: Processed {chunk_count} chunks, total response length: {len(full_response)}")
-                            
-                    if full_response:
-                        print(f"DEBUG: Emitting successful streaming response ({len(full_response)} chars)")
-                        self.response_received.emit(full_response)
-                        return  # Success - exit retry loop
-                    else:
-                        print(f"DEBUG: No content received from {chunk_count} streaming chunks")
-                        self.error_occurred.emit(f"No response generated from AI - processed {chunk_count} chunks but no text content")
-                        return
-                        
-            except Exception as e:
-                print(f"DEBUG: Exception occurred on attempt {attempt + 1}: {type(e).__name__}: {str(e)}")
-                
-                # Import traceback for detailed error info
-                import traceback
-                error_traceback = traceback.format_exc()
-                print(f"DEBUG: Full traceback:\n{error_traceback}")
-                
-                error_str = str(e).lower()
-                
-                # Check if this is a retryable error
-                retryable_errors = [
-                    '500 internal', 'internal server error', 'service unavailable',
-                    'timeout', 'connection error', 'network error', 'temporarily unavailable'
-                ]
-                
-                is_retryable = any(err in error_str for err in retryable_errors)
-                print(f"DEBUG: Error classified as retryable: {is_retryable}")
-                print(f"DEBUG: Attempt {attempt + 1}/{self.max_retries + 1}, can retry: {attempt < self.max_retries}")
-                
-                if is_retryable and attempt < self.max_retries:
-                    print(f"DEBUG: Retrying after retryable error on attempt {attempt + 1}: {str(e)}")
-                    continue  # Try again
-                else:
-                    # Final attempt failed or non-retryable error
-                    if is_retryable:
-                        error_message = (
-                            f"AI service temporarily unavailable after {self.max_retries + 1} attempts.\n\n"
-                            f"This appears to be a temporary issue with the Gemini API service. "
-                            f"Please try again in a few moments.\n\n"
-                            f"Original error: {str(e)}\n\n"
-                            f"Full traceback:\n{error_traceback}"
-                        )
-                        print(f"DEBUG: Emitting retry suggestion after exhausted retries")
-                        self.retry_suggested.emit(error_message)
-                    else:
-                        detailed_error = (
-                            f"AI request failed: {str(e)}\n\n"
-                            f"Error type: {type(e).__name__}\n"
-                            f"API: {'NEW (google.genai)' if NEW_API else 'OLD (google.generativeai)'}\n"
-                            f"Attempt: {attempt + 1}/{self.max_retries + 1}\n\n"
-                            f"Full traceback:\n{error_traceback}"
-                        )
-                        print(f"DEBUG: Emitting non-retryable error")
-                        self.error_occurred.emit(detailed_error)
-                    return
+# Annotations per Generate Notes request before the work is split into batches
+DEFAULT_NOTES_BATCH_SIZE = 10
+
+# Fixed labels and fields each annotation adds to the notes prompt besides its text, scene and tags
+NOTES_PROMPT_CHARS_PER_ANNOTATION = 150
 
 
 class AIAnnotationGenerator(QDialog):
@@ -279,6 +68,10 @@ class AIAnnotationGenerator(QDialog):
         self.full_transcript = ""
         self.parsed_annotations = []
         self.api_key = ""
+        self.ai_job = None
+        self.window_group = None  # AIJobGroup while a long transcript is processed in windows
+        self.window_spans = []  # (start, end) of each window in the full transcript
+        self.annotation_stream = None  # Incremental parser for the response being streamed
         
         self.setWindowTitle("AI Generate Annotations")
         self.setModal(True)
@@ -288,6 +81,10 @@ class AIAnnotationGenerator(QDialog):
         self.load_transcript()
         self.load_api_key()
         
+        # Live projected prompt size (no projection until themes exist - the prompt needs them)
+        self.budget_controls.set_prompt_source(lambda: self.create_annotation_prompt() if self.scene_styles else None)
+        self.purpose_input.textChanged.connect(self.budget_controls.schedule_update)
+        
     def setup_ui(self):
         """Setup the dialog UI"""
         layout = QVBoxLayout(self)
@@ -379,6 +176,26 @@ class AIAnnotationGenerator(QDialog):
         help_text.setStyleSheet("font-size: 10px; color: #666; font-style: italic;")
         ai_layout.addRow("", help_text)
         
+        # Windowed mode for long transcripts
+        self.windowed_checkbox = QCheckBox("Split long transcripts into parallel windows")
+        self.windowed_checkbox.setChecked(True)
+        self.windowed_checkbox.setToolTip(
+            f"Transcripts over {DEFAULT_WINDOW_CHARS:,} characters are split on speech boundaries into "
+            "overlapping windows that are annotated concurrently and merged"
+        )
+        ai_layout.addRow("", self.windowed_checkbox)
+        
+        # Response cache opt-out
+        self.use_cache_checkbox = QCheckBox("Reuse cached AI responses")
+        self.use_cache_checkbox.setChecked(True)
+        self.use_cache_checkbox.setToolTip("Answer an identical request (same prompt, model and settings) from the local response cache instead of calling Gemini again")
+        ai_layout.addRow("", self.use_cache_checkbox)
+        
+        # Prompt token budget - over-budget transcripts are split into windows that fit
+        self.budget_controls = PromptBudgetControls(self)
+        self.budget_controls.auto_trim_checkbox.setToolTip("Split transcripts whose prompt would exceed the budget into windows that fit")
+        ai_layout.addRow("Prompt Budget:", self.budget_controls)
+        
         right_layout.addWidget(ai_group)
         content_layout.addWidget(right_widget, 1)
         
@@ -483,114 +300,16 @@ class AIAnnotationGenerator(QDialog):
         if not self.web_view:
             return
         
-        # Use the same method as AI Generate Script to get clean transcript text with speaker info
-        def handle_transcript(html):
-            if html:
-                from bs4 import BeautifulSoup
-                
-                # Parse HTML
-                soup = BeautifulSoup(html, 'html.parser')
+        # Shared with the other AI dialogs - only re-extracted when the document revision changes
+        def handle_transcript(transcript_text):
+            self.full_transcript = transcript_text
+            print(f"DEBUG: Loaded transcript with {len(self.full_transcript)} characters including speech titles")
+            print(f"DEBUG: First 500 characters of transcript:")
+            print(self.full_transcript[:500] + "..." if len(self.full_transcript) > 500 else self.full_transcript)
+            if hasattr(self, 'budget_controls'):
+                self.budget_controls.schedule_update()
                 
-                # Remove CSS and script elements
-                for element in soup(["style", "script", "head"]):
-                    element.decompose()
-                
-                # DEBUG: Check overall HTML structure
-                print(f"DEBUG: HTML body contains {len(soup.find_all())} total elements")
-                speech_related = soup.find_all(class_=lambda x: x and 'speech' in x)
-                print(f"DEBUG: Found {len(speech_related)} elements with 'speech' in class name:")
-                for elem in speech_related[:5]:  # Show first 5
-                    print(f"  - {elem.name}.{' '.join(elem.get('class', []))}")
-                
-                # Extract text with speech titles included
-                transcript_parts = []
-                
-                # Look for speech headers and content sections
-                speech_headers = soup.find_all('div', class_='speech-header')
-                print(f"DEBUG: Found {len(speech_headers)} speech-header divs")
-                
-                if speech_headers:
-                    # Process each speech header to get title and find corresponding content
-                    for i, header in enumerate(speech_headers):
-                        print(f"DEBUG: Processing speech-header {i+1}/{len(speech_headers)}")
-                        title_elem = header.find(class_='speech-title')
-                        
-                        if title_elem:
-                            title_text = title_elem.get_text(strip=True)
-                            print(f"DEBUG: Found speech-title: '{title_text}'")
-                            
-                            # Find the corresponding speech content (usually follows the header)
-                            content_elem = None
-                            next_sibling = header.find_next_sibling()
-                            while next_sibling:
-                                if next_sibling.name == 'div' and 'speech-content' in next_sibling.get('class', []):
-                                    content_elem = next_sibling
-                                    break
-                                next_sibling = next_sibling.find_next_sibling()
-                            
-                            # If no sibling found, look for speech-content within the same parent
-                            if not content_elem:
-                                parent = header.find_parent()
-                                if parent:
-                                    content_elem = parent.find(class_='speech-content')
-                            
-                            if content_elem:
-                                content_text = content_elem.get_text(separator=' ', strip=True)
-                                print(f"DEBUG: Found speech-content with {len(content_text)} characters")
-                                if title_text and content_text:
-                                    # Format as "Speaker: content"
-                                    formatted_entry = f"{title_text}: {content_text}"
-                                    transcript_parts.append(formatted_entry)
-                                    print(f"DEBUG: Added transcript part: '{title_text}: {content_text[:50]}...'")
-                            elif title_text:
-                                # Just title without content
-                                transcript_parts.append(title_text)
-                                print(f"DEBUG: Added title-only transcript part: '{title_text}'")
-                
-                # Fallback: Look for speech sections (original logic)
-                elif soup.find_all('div', class_='speech-section'):
-                    speech_sections = soup.find_all('div', class_='speech-section')
-                    for section in speech_sections:
-                        # Get speech title if available
-                        title_elem = section.find(class_='speech-title')
-                        content_elem = section.find(class_='speech-content')
-                        
-                        if title_elem and content_elem:
-                            title_text = title_elem.get_text(strip=True)
-                            content_text = content_elem.get_text(separator=' ', strip=True)
-                            
-                            if title_text and content_text:
-                                # Format as "Speaker: content"
-                                transcript_parts.append(f"{title_text}: {content_text}")
-                        elif content_elem:
-                            # Just content without title
-                            content_text = content_elem.get_text(separator=' ', strip=True)
-                            if content_text:
-                                transcript_parts.append(content_text)
-                else:
-                    # Fallback: look for speech content areas only
-                    speech_contents = soup.find_all(class_="speech-content")
-                    if speech_contents:
-                        for content in speech_contents:
-                            text = content.get_text(separator=' ', strip=True)
-                            if text:
-                                transcript_parts.append(text)
-                    else:
-                        # Final fallback: get all text but clean it up
-                        text = soup.get_text(separator=' ', strip=True)
-                        # Remove extra whitespace
-                        import re
-                        text = re.sub(r'\s+', ' ', text).strip()
-                        transcript_parts.append(text)
-                
-                self.full_transcript = '\n\n'.join(transcript_parts)
-                print(f"DEBUG: Loaded transcript with {len(self.full_transcript)} characters including speech titles")
-                print(f"DEBUG: Total transcript parts: {len(transcript_parts)}")
-                print(f"DEBUG: First 500 characters of transcript:")
-                print(self.full_transcript[:500] + "..." if len(self.full_transcript) > 500 else self.full_transcript)
-                
-        # Get the HTML content
-        self.web_view.page().toHtml(handle_transcript)
+        get_transcript_cache().request_transcript(self.web_view, handle_transcript, self.main_window)
         
     def load_api_key(self):
         """Load API key from file"""
@@ -625,8 +344,20 @@ class AIAnnotationGenerator(QDialog):
         except Exception as e:
             print(f"Error loading API key: {e}")
             
-    def create_annotation_prompt(self):
-        """Create the AI prompt for annotation generation"""
+    def create_annotation_prompt(self, transcript_text=None, window_info=None):
+        """Create the AI prompt for annotation generation (for one window when window_info is (index, total))"""
+        if transcript_text is None:
+            transcript_text = self.full_transcript
+        
+        transcript_heading = "TRANSCRIPT TO ANALYZE:"
+        if window_info:
+            window_index, window_count = window_info
+            transcript_heading = (
+                f"TRANSCRIPT TO ANALYZE (part {window_index + 1} of {window_count} - the transcript is split into "
+                f"overlapping parts that are annotated separately; select the segments from this part that "
+                f"belong in the story, applying the selectivity requirement to this part):"
+            )
+        
         purpose_text = self.purpose_input.toPlainText().strip()
         selectivity_level = self.selectivity_slider.value()
         thinking_budget = self.thinking_budget.value()
@@ -645,11 +376,10 @@ class AIAnnotationGenerator(QDialog):
             3: "Complete Story - As many annotations as necessary to tell the full story with setup, context, and highlights"
         }
         
-        prompt = f"""<thinking>
+        # Stable sections first - the transcript, then the per-request settings last
+        instructions = f"""<thinking>
 You are creating a compelling VIDEO STORY, not just selecting individual clips. Take time to deeply analyze the content and understand the narrative journey.
 
-Budget: {thinking_budget} tokens for reasoning about story construction.
-
 Think about STORY ARCHITECTURE:
 1. What's the complete journey from beginning to end?
 2. How does the person change, grow, or transform?
@@ -687,11 +417,7 @@ Remember: Great video stories need setup, context, and connecting details - not
 
 You are creating a compelling video story from this transcript. Your job is to select segments that work together to build audience engagement, emotional connection, and a complete narrative journey.
 
-SELECTIVITY REQUIREMENT: {selectivity_guidance[selectivity_level]}
-
-CRITICAL: The selectivity level determines the FOCUS and COMPLETENESS of your story selection. Very Selective means only the most essential moments. Balanced means key narrative beats with supporting details. Complete Story means include whatever is needed for a full narrative.
-
-STORY-BUILDING APPROACH: Prioritize narrative coherence over individual segment perfection, but respect the selectivity requirement above.
+STORY-BUILDING APPROACH: Prioritize narrative coherence over individual segment perfection, but respect the selectivity requirement given at the end.
 
 NARRATIVE FLOW REQUIREMENTS:
 - Include setup moments that establish emotional stakes and anticipation
@@ -705,15 +431,6 @@ PROMOTIONAL CONTENT STRATEGY: When creating fundraising/promotional videos, reme
 - Underlying story: This organization has the expertise, quality, and strategic thinking to create these outcomes
 Select segments that advance both narratives simultaneously - showing personal impact while demonstrating organizational competence.
 
-VIDEO PURPOSE & GUIDANCE:
-{purpose_text if purpose_text else "Focus on creating an engaging story that connects with viewers emotionally and shows personal transformation."}
-
-AVAILABLE THEMES/SCENES:
-{scenes_text}
-
-TRANSCRIPT TO ANALYZE:
-{self.full_transcript}
-
 STORY ARC CONSTRUCTION:
 1. HOOK: Lead with surprising claims, vivid details, or compelling contradictions
 2. SETUP: Establish who they are, where they are, what they want/need
@@ -782,6 +499,21 @@ CORRECT: Copy the complete sentence exactly as written in the transcript
 
 Only provide annotations in the specified format. No additional text or explanations."""
 
+        request = f"""VIDEO PURPOSE & GUIDANCE:
+{purpose_text if purpose_text else "Focus on creating an engaging story that connects with viewers emotionally and shows personal transformation."}
+
+AVAILABLE THEMES/SCENES:
+{scenes_text}
+
+SELECTIVITY REQUIREMENT: {selectivity_guidance[selectivity_level]}
+
+CRITICAL: The selectivity level determines the FOCUS and COMPLETENESS of your story selection. Very Selective means only the most essential moments. Balanced means key narrative beats with supporting details. Complete Story means include whatever is needed for a full narrative.
+
+Budget: {thinking_budget} tokens for reasoning about story construction."""
+
+        prompt = get_prompt_template('generate_annotations').render(
+            instructions, f"{transcript_heading}\n{transcript_text}", request=request)
+
         return prompt
         
     def process_with_ai(self):
@@ -794,23 +526,27 @@ Only provide annotations in the specified format. No additional text or explanat
             QMessageBox.warning(self, "API Key Required", "Please configure your Gemini API key first.")
             return
             
-        # Check if transcript is large and warn user
-        if len(self.full_transcript) > 500000:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Large Transcript Warning")
-            msg.setText("The transcript is very large (over 500,000 characters).")
-            msg.setInformativeText("Processing this transcript will use a significant number of tokens. Do you want to continue?")
-            msg.setDetailedText(f"Transcript size: {len(self.full_transcript):,} characters\n\n"
-                               f"This will consume substantial API tokens and may be expensive. "
-                               f"Consider using a shorter transcript or splitting the content.")
-            msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-            msg.setDefaultButton(QMessageBox.StandardButton.No)
-            msg.setIcon(QMessageBox.Icon.Warning)
-            
-            if msg.exec() == QMessageBox.StandardButton.No:
-                return
+        # Project the prompt size locally before paying for a round trip
+        template_prompt = self.create_annotation_prompt("")
+        if not template_prompt:
+            return
+        estimator = get_token_estimator()
+        template_tokens = estimator.estimate(template_prompt)
+        projected_tokens = template_tokens + estimator.estimate(self.full_transcript)
+        over_budget = projected_tokens > self.budget_controls.budget()
+        self.budget_controls.show_projection(projected_tokens)
+        
+        # Long (or over-budget) transcripts are annotated window by window and merged
+        window_chars = DEFAULT_WINDOW_CHARS
+        if self.budget_controls.auto_trim():
+            window_chars = min(window_chars, estimator.chars_for_tokens(self.budget_controls.budget() - template_tokens))
+        use_windows = ((self.windowed_checkbox.isChecked() and len(self.full_transcript) > DEFAULT_WINDOW_CHARS) or
+                       (over_budget and self.budget_controls.auto_trim()))
+        if use_windows and window_chars > 0:
+            self.process_in_windows(window_chars)
+            return
             
-        prompt = self.create_annotation_prompt()
+        prompt = self.budget_controls.apply_budget(lambda context: self.create_annotation_prompt())
         if not prompt:
             return
             
@@ -834,22 +570,117 @@ Only provide annotations in the specified format. No additional text or explanat
         # Clear response display
         self.response_display.clear()
         
-        # Start AI worker thread with thinking budget
+        # Annotations are parsed and validated as their blocks close in the stream
+        self.parsed_annotations = []
+        self.annotation_stream = BracketRecordStream('ANNOTATION')
+        
+        # Submit to the shared AI request engine with thinking budget
         thinking_budget = self.thinking_budget.value()
         selected_model = self.model_selector.currentText()
-        self.worker_thread = AIWorkerThread(prompt, self.api_key, selected_model, thinking_budget)
-        self.worker_thread.response_received.connect(self.handle_ai_response)
-        self.worker_thread.chunk_received.connect(self.handle_ai_chunk)
-        self.worker_thread.error_occurred.connect(self.handle_ai_error)
-        self.worker_thread.retry_suggested.connect(self.handle_retry_suggestion)
-        self.worker_thread.finished.connect(self.cleanup_worker)
-        self.worker_thread.start()
+        self.ai_job = get_request_engine().submit(prompt, self.api_key, selected_model,
+                                                  thinking_budget=thinking_budget,
+                                                  temperature=0.3, top_p=0.8,
+                                                  label="Generate Annotations",
+                                                  use_cache=self.use_cache_checkbox.isChecked())
+        self.ai_job.response_received.connect(self.handle_ai_response)
+        self.ai_job.chunk_received.connect(self.handle_ai_chunk)
+        self.ai_job.error_occurred.connect(self.handle_ai_error)
+        self.ai_job.retry_suggested.connect(self.handle_retry_suggestion)
+        self.ai_job.finished.connect(self.cleanup_worker)
+        
+    def process_in_windows(self, window_chars=DEFAULT_WINDOW_CHARS):
+        """Annotate overlapping transcript windows concurrently, then merge the results"""
+        self.window_spans = split_transcript_window_spans(self.full_transcript, window_chars)
+        windows = [self.full_transcript[start:end] for start, end in self.window_spans]
+        prompts = []
+        for i in range(len(windows)):
+            prompt = self.create_annotation_prompt(windows[i], (i, len(windows)))
+            if not prompt:
+                return
+            prompts.append(prompt)
+        
+        self.annotation_stream = None
+        print(f"DEBUG: Splitting {len(self.full_transcript)} character transcript into {len(windows)} windows: "
+              f"{[len(window) for window in windows]}")
+        largest_tokens = max(get_token_estimator().estimate(prompt) for prompt in prompts)
+        self.budget_controls.show_projection(largest_tokens, note=f"per window ({len(windows)} windows)")
+        
+        # Update UI for processing state
+        self.process_button.hide()
+        self.stop_button.show()
+        self.progress_bar.setRange(0, len(windows))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat(f"AI is analyzing {len(windows)} transcript windows... %v/%m")
+        self.progress_bar.show()
+        self.response_display.clear()
+        
+        self.window_group = get_request_engine().submit_group(
+            prompts, self.api_key, self.model_selector.currentText(),
+            thinking_budget=self.thinking_budget.value(),
+            temperature=0.3, top_p=0.8, stream=False,
+            label="Generate Annotations",
+            use_cache=self.use_cache_checkbox.isChecked()
+        )
+        self.window_group.item_finished.connect(self.handle_window_response)
+        self.window_group.item_failed.connect(self.handle_window_error)
+        self.window_group.progress.connect(lambda done, total: self.progress_bar.setValue(done))
+        self.window_group.finished.connect(self.handle_windows_finished)
+        
+    def handle_window_response(self, index, response_text):
+        """Show the annotations found in one transcript window"""
+        block_count = response_text.count('[[ANNOTATION')
+        cursor = self.response_display.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(f"--- Window {index + 1}: {block_count} annotations ---\n{response_text.strip()}\n\n")
+        self.response_display.setTextCursor(cursor)
+        
+    def handle_window_error(self, index, error_message):
+        """Record a failed transcript window; the other windows still count"""
+        print(f"DEBUG: Window {index + 1} failed: {error_message[:200]}")
+        cursor = self.response_display.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(f"--- Window {index + 1} failed ---\n{error_message.splitlines()[0] if error_message else ''}\n\n")
+        self.response_display.setTextCursor(cursor)
+        
+    def handle_windows_finished(self):
+        """Merge the window results and continue as for a single response"""
+        group = self.window_group
+        self.window_group = None
+        self.cleanup_worker()
+        if group is None or group.is_cancelled():
+            return
+        
+        responses = [group.results.get(i) for i in range(len(group))]
+        merged_response = merge_annotation_responses(responses, self.window_spans,
+                                                     get_transcript_index(self.full_transcript))
+        print(f"DEBUG: Merged {sum(r.count('[[ANNOTATION') for r in responses if r)} window annotations "
+              f"into {merged_response.count('[[ANNOTATION')} unique annotations")
+        
+        if not merged_response:
+            first_error = group.errors[min(group.errors)] if group.errors else "AI did not generate any annotations."
+            self.handle_ai_error(first_error)
+            return
+        
+        if group.errors:
+            failed = ", ".join(str(i + 1) for i in sorted(group.errors))
+            QMessageBox.warning(self, "Some Windows Failed",
+                                f"{len(group.errors)} of {len(group)} transcript windows failed (window {failed}).\n\n"
+                                f"Annotations from the remaining windows will be offered.")
+        
+        self.handle_ai_response(merged_response)
         
     def handle_ai_response(self, response_text):
         """Handle AI response and create annotations"""
         try:
-            # Parse AI response
-            annotation_count = self.parse_ai_response(response_text)
+            # Blocks closed while streaming are already parsed; otherwise parse the whole response
+            stream = self.annotation_stream
+            self.annotation_stream = None
+            if stream is not None and stream.text() == response_text:
+                stream.finish()
+                annotation_count = len(self.parsed_annotations)
+                print(f"DEBUG: {annotation_count} annotations parsed while streaming")
+            else:
+                annotation_count = self.parse_ai_response(response_text)
             
             if annotation_count == 0:
                 QMessageBox.warning(self, "No Annotations", "AI did not generate any valid annotations.")
@@ -880,8 +711,17 @@ Only provide annotations in the specified format. No additional text or explanat
     
     def handle_ai_chunk(self, chunk_text):
         """Handle streaming AI response chunks"""
+        # Validate each annotation as soon as its block is complete
+        if self.annotation_stream is not None:
+            for block in self.annotation_stream.feed(chunk_text):
+                annotation_data = self.parse_annotation_block(block)
+                if annotation_data:
+                    self.parsed_annotations.append(annotation_data)
+        
         # Update progress bar to show streaming
-        self.progress_bar.setFormat("AI is generating annotations...")
+        found = len(self.parsed_annotations)
+        self.progress_bar.setFormat(f"AI is generating annotations... {found} valid so far" if found
+                                    else "AI is generating annotations...")
         
         # Append chunk to response display
         cursor = self.response_display.textCursor()
@@ -895,6 +735,8 @@ Only provide annotations in the specified format. No additional text or explanat
             
     def handle_ai_error(self, error_message):
         """Handle AI processing errors with detailed feedback"""
+        self.annotation_stream = None
+        
         # Also display error in the response area for user visibility
         self.response_display.clear()
         error_text = f"❌ AI Processing Error:\n\n{error_message}\n\nPlease check:\n• Your API key is valid\n• You have internet connection\n• The Gemini service is available"
@@ -928,10 +770,12 @@ Only provide annotations in the specified format. No additional text or explanat
         
     def stop_processing(self):
         """Stop the AI processing"""
-        if hasattr(self, 'worker_thread'):
-            self.worker_thread.terminate()
-            self.worker_thread.wait()  # Wait for thread to finish
-            self.worker_thread.deleteLater()
+        if getattr(self, 'ai_job', None):
+            self.ai_job.cancel()  # Engine drops any further output from this job
+        if self.window_group:
+            self.window_group.cancel()
+            self.window_group = None
+        self.annotation_stream = None
         
         # Reset UI
         self.cleanup_worker()
@@ -940,87 +784,95 @@ Only provide annotations in the specified format. No additional text or explanat
         self.response_display.setText("Processing cancelled by user.")
         
     def cleanup_worker(self):
-        """Clean up worker thread and reset UI"""
+        """Reset UI once the AI job is done"""
+        job = self.sender() if isinstance(self.sender(), AIJob) else None
+        # A retry may already have submitted a newer job - leave its UI state alone
+        if job is not None and job is not self.ai_job and self.ai_job is not None and self.ai_job.is_active():
+            return
+            
         self.process_button.show()
         self.stop_button.hide()
         
-        # Hide progress bar
+        # Hide progress bar (back to indeterminate after windowed runs)
         self.progress_bar.hide()
+        self.progress_bar.setRange(0, 0)
         
-        if hasattr(self, 'worker_thread'):
-            self.worker_thread.deleteLater()
+        if job is None or job is self.ai_job:
+            self.ai_job = None
             
     def parse_ai_response(self, response_text):
         """Parse AI response and extract annotation data"""
         self.parsed_annotations = []
         
-        # Find all annotation blocks with new format - handle line breaks and spacing
-        # First normalize the response text to remove problematic line breaks within annotations
-        normalized_text = re.sub(r'\[\[ANNOTATION([^\]]*?)\]\]', 
-                                lambda m: m.group(0).replace('\n', ' ').replace('  ', ' '), 
-                                response_text, flags=re.DOTALL)
-        
-        pattern = r'\[\[ANNOTATION\s*::\s*([^:]+?)\s*::\s*([^:]+?)\s*::\s*(.+?)\s*::\s*([^:]+?)\s*::\s*([^\]]+?)\]\]'
-        matches = re.findall(pattern, normalized_text, re.DOTALL)
+        # Each [[ANNOTATION ...]] block is parsed on its own (line breaks inside it are ignored)
+        blocks = iter_bracket_records(response_text, 'ANNOTATION')
         
         print(f"DEBUG: Original response length: {len(response_text)} chars")
-        print(f"DEBUG: Normalized response length: {len(normalized_text)} chars") 
-        print(f"DEBUG: Regex found {len(matches)} annotation matches")
-        
-        for i, match in enumerate(matches):
-            print(f"DEBUG: Processing annotation {i+1}/{len(matches)}")
-            primary_scene, secondary_scenes_str, text_segment, brief_note, detailed_footnote = match
-            primary_scene = primary_scene.strip()
-            secondary_scenes_str = secondary_scenes_str.strip()
-            text_segment = text_segment.strip()
-            brief_note = brief_note.strip()
-            detailed_footnote = detailed_footnote.strip()
-            
-            print(f"DEBUG: Scene: '{primary_scene}', Text: '{text_segment[:50]}...'")
-            
-            # Validate primary scene exists - try fuzzy matching if exact match fails
-            if primary_scene not in self.scene_styles:
-                # Try fuzzy matching
-                best_match = self.find_best_scene_match(primary_scene, list(self.scene_styles.keys()))
-                if best_match:
-                    print(f"Warning: Primary scene '{primary_scene}' not found, using best match: '{best_match}'")
-                    primary_scene = best_match
-                else:
-                    print(f"Warning: Primary scene '{primary_scene}' not found in available scenes: {list(self.scene_styles.keys())}")
-                    continue
-            
-            # Parse secondary scenes
-            secondary_scenes = []
-            if secondary_scenes_str.lower() != "none":
-                for sec_scene in secondary_scenes_str.split(','):
-                    sec_scene = sec_scene.strip()
-                    if sec_scene and sec_scene in self.scene_styles and sec_scene != primary_scene:
-                        secondary_scenes.append(sec_scene)
-                    elif sec_scene and sec_scene not in self.scene_styles:
-                        # Try fuzzy matching for secondary scenes too
-                        best_match = self.find_best_scene_match(sec_scene, list(self.scene_styles.keys()))
-                        if best_match and best_match != primary_scene:
-                            print(f"Warning: Secondary scene '{sec_scene}' not found, using best match: '{best_match}'")
-                            secondary_scenes.append(best_match)
-                        else:
-                            print(f"Warning: Secondary scene '{sec_scene}' not found in available scenes, ignoring")
-                
-            # Validate text exists in transcript (basic check)
-            if text_segment not in self.full_transcript:
-                print(f"Warning: Text segment not found in transcript: {text_segment[:100]}...")
-                continue
-                
-            self.parsed_annotations.append({
-                'scene': primary_scene,
-                'secondary_scenes': secondary_scenes,
-                'text': text_segment,
-                'brief_note': brief_note,
-                'detailed_footnote': detailed_footnote
-            })
+        print(f"DEBUG: Found {len(blocks)} annotation blocks")
+        
+        for i, block in enumerate(blocks):
+            print(f"DEBUG: Processing annotation {i+1}/{len(blocks)}")
+            annotation_data = self.parse_annotation_block(block)
+            if annotation_data:
+                self.parsed_annotations.append(annotation_data)
         
-        print(f"DEBUG: Successfully parsed {len(self.parsed_annotations)} valid annotations out of {len(matches)} total matches")
+        print(f"DEBUG: Successfully parsed {len(self.parsed_annotations)} valid annotations out of {len(blocks)} total matches")
         return len(self.parsed_annotations)
     
+    def parse_annotation_block(self, block):
+        """Validate one [[ANNOTATION ...]] block against the scenes and transcript; returns the annotation data or None"""
+        fields = parse_annotation_record(block)
+        if fields is None:
+            print(f"Warning: Malformed annotation block: {block[:100]}...")
+            return None
+        primary_scene, secondary_scenes_str, text_segment, brief_note, detailed_footnote = fields
+        
+        print(f"DEBUG: Scene: '{primary_scene}', Text: '{text_segment[:50]}...'")
+        
+        # Validate primary scene exists - try fuzzy matching if exact match fails
+        if primary_scene not in self.scene_styles:
+            # Try fuzzy matching
+            best_match = self.find_best_scene_match(primary_scene, list(self.scene_styles.keys()))
+            if best_match:
+                print(f"Warning: Primary scene '{primary_scene}' not found, using best match: '{best_match}'")
+                primary_scene = best_match
+            else:
+                print(f"Warning: Primary scene '{primary_scene}' not found in available scenes: {list(self.scene_styles.keys())}")
+                return None
+        
+        # Parse secondary scenes
+        secondary_scenes = []
+        if secondary_scenes_str.lower() != "none":
+            for sec_scene in secondary_scenes_str.split(','):
+                sec_scene = sec_scene.strip()
+                if sec_scene and sec_scene in self.scene_styles and sec_scene != primary_scene:
+                    secondary_scenes.append(sec_scene)
+                elif sec_scene and sec_scene not in self.scene_styles:
+                    # Try fuzzy matching for secondary scenes too
+                    best_match = self.find_best_scene_match(sec_scene, list(self.scene_styles.keys()))
+                    if best_match and best_match != primary_scene:
+                        print(f"Warning: Secondary scene '{sec_scene}' not found, using best match: '{best_match}'")
+                        secondary_scenes.append(best_match)
+                    else:
+                        print(f"Warning: Secondary scene '{sec_scene}' not found in available scenes, ignoring")
+            
+        # Locate the segment in the transcript, tolerating whitespace/quote/dash and small wording differences
+        transcript_segment = get_transcript_index(self.full_transcript).extract(text_segment)
+        if transcript_segment is None:
+            print(f"Warning: Text segment not found in transcript: {text_segment[:100]}...")
+            return None
+        if transcript_segment != text_segment:
+            print(f"DEBUG: Matched segment to transcript text: '{transcript_segment[:50]}...'")
+            text_segment = transcript_segment
+            
+        return {
+            'scene': primary_scene,
+            'secondary_scenes': secondary_scenes,
+            'text': text_segment,
+            'brief_note': brief_note,
+            'detailed_footnote': detailed_footnote
+        }
+    
     def find_best_scene_match(self, target_scene, available_scenes):
         """Find the best matching scene name using fuzzy string matching"""
         if not target_scene or not available_scenes:
@@ -1053,73 +905,60 @@ Only provide annotations in the specified format. No additional text or explanat
         return best_match
         
     def create_annotations_sequentially(self):
-        """Create all annotations sequentially with progress dialog"""
+        """Create all parsed annotations one by one, then refresh the theme view once"""
         if not self.parsed_annotations:
             return
             
-        # Create progress dialog
-        progress = QProgressDialog("Creating annotations...", "Cancel", 0, len(self.parsed_annotations), self)
+        annotation_specs = []
+        for annotation_data in self.parsed_annotations:
+            # Create preserved_metadata with the brief note and detailed footnote
+            preserved_metadata = {
+                'notes': annotation_data['brief_note'],
+                'notes_html': annotation_data['detailed_footnote'],
+                'secondary_scenes': annotation_data['secondary_scenes'],
+                'timestamp': datetime.now().isoformat()
+            }
+            annotation_specs.append({
+                'text': annotation_data['text'],
+                'scene': annotation_data['scene'],
+                'selection_info': None,  # Let it find the text automatically
+                'preserved_metadata': preserved_metadata
+            })
+        
+        progress = QProgressDialog("Creating annotations...", "Cancel", 0, len(annotation_specs), self)
         progress.setWindowTitle("AI Annotation Creation")
         progress.setModal(True)
         progress.show()
         
-        successful_count = 0
-        failed_annotations = []
+        def report_progress(done, total):
+            # Called on a timer rather than per annotation, so the event loop is spun a few times a second
+            progress.setLabelText(f"Creating annotation {done + 1}/{total}...")
+            progress.setValue(done)
+            QApplication.processEvents()
         
-        for i, annotation_data in enumerate(self.parsed_annotations):
-            if progress.wasCanceled():
-                break
-                
-            progress.setLabelText(f"Creating annotation {i+1}/{len(self.parsed_annotations)}...")
-            progress.setValue(i)
-            QApplication.processEvents()  # Keep UI responsive
-            
-            try:
-                # Create preserved_metadata with the brief note and detailed footnote
-                preserved_metadata = {
-                    'notes': annotation_data['brief_note'],
-                    'notes_html': annotation_data['detailed_footnote'],
-                    'secondary_scenes': annotation_data['secondary_scenes'],
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                # Use existing infrastructure to create annotation
-                self.web_view.create_new_annotation_and_highlight(
-                    text=annotation_data['text'],
-                    scene=annotation_data['scene'],
-                    selection_info=None,  # Let it find the text automatically
-                    preserved_metadata=preserved_metadata
-                )
-                
-                successful_count += 1
-                print(f"Successfully created annotation {i+1}: {annotation_data['scene']}")
-                
-            except Exception as e:
-                print(f"Failed to create annotation {i+1}: {str(e)}")
-                failed_annotations.append({
-                    'index': i+1,
-                    'text': annotation_data['text'][:50] + "...",
-                    'error': str(e)
-                })
-                
-        progress.setValue(len(self.parsed_annotations))
-        progress.close()
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            # Cancel is checked before every annotation; the theme view is refreshed once at the end
+            created, failures = create_annotations(self.web_view, self.main_window, annotation_specs,
+                                                   progress=report_progress, cancelled=progress.wasCanceled)
+        finally:
+            QApplication.restoreOverrideCursor()
+            progress.setValue(len(annotation_specs))
+            progress.close()
+        
+        failed_annotations = [{
+            'index': i + 1,
+            'text': self.parsed_annotations[i]['text'][:50] + "...",
+            'error': error
+        } for i, error in failures]
+        successful_count = len(created)
         
         # Show results
         self.show_creation_results(successful_count, failed_annotations)
         
-        # Update theme view to show new annotations
         if successful_count > 0:
-            print(f"DEBUG: Refreshing theme view after creating {successful_count} annotations")
-            try:
-                # Trigger theme view refresh to show new annotations immediately
-                if hasattr(self.main_window, 'update_theme_view'):
-                    self.main_window.update_theme_view(show_progress=False)
-                    print("DEBUG: Theme view updated successfully")
-                else:
-                    print("DEBUG: update_theme_view method not found on main window")
-            except Exception as e:
-                print(f"DEBUG: Error updating theme view: {str(e)}")
+            # New highlights changed the transcript DOM
+            get_transcript_cache().invalidate(self.web_view, f"created {successful_count} annotations")
         
         # Close dialog if successful
         if successful_count > 0:
@@ -1169,6 +1008,12 @@ class AINotesGenerator(QDialog):
         self.full_transcript = ""
         self.api_key = ""
         self.target_annotation_ids = None  # For targeted generation from right-click menu
+        self.ai_job = None
+        self.batch_group = None  # AIJobGroup while notes are generated in batches
+        self.notes_stream = None  # Incremental parser for the response being streamed
+        self.id_aliases = AnnotationAliases()  # Short IDs (A1, A2, ...) used in prompts and responses
+        self.batch_applied_count = 0
+        self.batch_parsed_count = 0
         
         self.setWindowTitle("AI Generate Notes for Existing Annotations")
         self.setModal(False)  # Non-modal so users can continue working
@@ -1180,6 +1025,14 @@ class AINotesGenerator(QDialog):
         self.load_transcript_data()
         self.scan_annotations()
         
+        # Live projected prompt size for the (first) request
+        self.budget_controls.set_prompt_source(
+            lambda: self.create_notes_prompt(self.get_notes_batches()[0], quiet=True) if self.get_notes_batches() else None
+        )
+        for checkbox in (self.use_full_context, self.generate_commentary):
+            checkbox.toggled.connect(self.budget_controls.schedule_update)
+        self.batch_size.valueChanged.connect(self.budget_controls.schedule_update)
+        
     def setup_ui(self):
         """Setup the dialog UI with new user-driven design"""
         layout = QVBoxLayout(self)
@@ -1364,6 +1217,32 @@ class AINotesGenerator(QDialog):
         self.use_full_context.setChecked(True)
         ai_layout.addRow("", self.use_full_context)
         
+        # Batching - large sets of annotations are split into concurrent requests
+        self.batch_size = QSpinBox()
+        self.batch_size.setMinimum(1)
+        self.batch_size.setMaximum(100)
+        self.batch_size.setValue(DEFAULT_NOTES_BATCH_SIZE)
+        self.batch_size.setSuffix(" annotations")
+        self.batch_size.setToolTip("Annotations per AI request. Larger sets are split into batches whose notes are applied as each batch completes")
+        ai_layout.addRow("Batch Size:", self.batch_size)
+        
+        self.parallel_requests = QSpinBox()
+        self.parallel_requests.setMinimum(1)
+        self.parallel_requests.setMaximum(DEFAULT_MAX_CONCURRENCY)
+        self.parallel_requests.setValue(DEFAULT_GROUP_PARALLELISM)
+        self.parallel_requests.setToolTip("How many batches are sent to the AI at the same time")
+        ai_layout.addRow("Parallel Requests:", self.parallel_requests)
+        
+        # Response cache opt-out
+        self.use_cache_checkbox = QCheckBox("Reuse cached AI responses")
+        self.use_cache_checkbox.setChecked(True)
+        self.use_cache_checkbox.setToolTip("Answer an identical request (same prompt, model and settings) from the local response cache instead of calling Gemini again")
+        ai_layout.addRow("", self.use_cache_checkbox)
+        
+        # Prompt token budget (per request)
+        self.budget_controls = PromptBudgetControls(self)
+        ai_layout.addRow("Prompt Budget:", self.budget_controls)
+        
         settings_layout.addWidget(ai_group)
         settings_layout.addStretch()
         
@@ -1492,65 +1371,14 @@ class AINotesGenerator(QDialog):
         if not self.web_view:
             return
         
-        # Use the same method as the main AI annotation generator
-        def handle_transcript(html):
-            if html:
-                from bs4 import BeautifulSoup
-                
-                # Parse HTML
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Remove CSS and script elements
-                for element in soup(["style", "script", "head"]):
-                    element.decompose()
-                
-                # Extract text with speech titles included
-                transcript_parts = []
-                
-                # Look for speech headers and content sections
-                speech_headers = soup.find_all('div', class_='speech-header')
+        # Use the same cached transcript as the main AI annotation generator
+        def handle_transcript(transcript_text):
+            self.full_transcript = transcript_text
+            print(f"DEBUG: Loaded transcript with {len(self.full_transcript)} characters for notes generation")
+            if hasattr(self, 'budget_controls'):
+                self.budget_controls.schedule_update()
                 
-                if speech_headers:
-                    # Process each speech header to get title and find corresponding content
-                    for header in speech_headers:
-                        title_elem = header.find(class_='speech-title')
-                        
-                        if title_elem:
-                            title_text = title_elem.get_text(strip=True)
-                            
-                            # Find the corresponding speech content
-                            content_elem = None
-                            next_sibling = header.find_next_sibling()
-                            while next_sibling:
-                                if next_sibling.name == 'div' and 'speech-content' in next_sibling.get('class', []):
-                                    content_elem = next_sibling
-                                    break
-                                next_sibling = next_sibling.find_next_sibling()
-                            
-                            if not content_elem:
-                                parent = header.find_parent()
-                                if parent:
-                                    content_elem = parent.find(class_='speech-content')
-                            
-                            if content_elem:
-                                content_text = content_elem.get_text(separator=' ', strip=True)
-                                if title_text and content_text:
-                                    formatted_entry = f"{title_text}: {content_text}"
-                                    transcript_parts.append(formatted_entry)
-                            elif title_text:
-                                transcript_parts.append(title_text)
-                else:
-                    # Fallback: get text content
-                    text = soup.get_text(separator=' ', strip=True)
-                    import re
-                    text = re.sub(r'\s+', ' ', text).strip()
-                    transcript_parts.append(text)
-                
-                self.full_transcript = '\n\n'.join(transcript_parts)
-                print(f"DEBUG: Loaded transcript with {len(self.full_transcript)} characters for notes generation")
-                
-        # Get the HTML content
-        self.web_view.page().toHtml(handle_transcript)
+        get_transcript_cache().request_transcript(self.web_view, handle_transcript, self.main_window)
         
     def load_api_key(self):
         """Load API key from file"""
@@ -1581,24 +1409,16 @@ class AINotesGenerator(QDialog):
     def load_transcript_data(self):
         """Load persistent transcript data from session file"""
         try:
-            if not hasattr(self.main_window, 'current_session_file') or not self.main_window.current_session_file:
+            session_store = get_main_window_session_store(self.main_window)
+            if not session_store:
                 print("DEBUG: No session file available to load transcript data")
                 return
             
-            session_file = self.main_window.current_session_file
-            if not os.path.exists(session_file):
-                print("DEBUG: Session file does not exist")
-                return
-            
-            # Load session data from file
-            with open(session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-            
-            # Load saved values from session data
-            title = session_data.get('ai_notes_title', '')
-            description = session_data.get('ai_notes_description', '')
-            additional_context = session_data.get('ai_notes_additional_context', '')
-            transcript_type = session_data.get('ai_notes_transcript_type', 'Video Editing Project')
+            # Load saved values from the session with any journaled edits applied
+            title = session_store.get('ai_notes_title', '')
+            description = session_store.get('ai_notes_description', '')
+            additional_context = session_store.get('ai_notes_additional_context', '')
+            transcript_type = session_store.get('ai_notes_transcript_type', 'Video Editing Project')
             
             # Set UI values
             self.transcript_title.setText(title)
@@ -1615,49 +1435,23 @@ class AINotesGenerator(QDialog):
             print(f"Error loading transcript data: {e}")
     
     def save_transcript_data(self):
-        """Save transcript data directly to session file"""
+        """Save transcript data to the session (journaled - the session file is rewritten on compaction)"""
         try:
-            if not hasattr(self.main_window, 'current_session_file') or not self.main_window.current_session_file:
+            session_store = get_main_window_session_store(self.main_window)
+            if not session_store:
                 print("DEBUG: No session file available to save transcript data")
                 return
             
-            session_file = self.main_window.current_session_file
-            if not os.path.exists(session_file):
-                print("DEBUG: Session file does not exist")
-                return
-            
-            # Load current session data
-            with open(session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-            
             # Update AI notes configuration fields
-            session_data['ai_notes_title'] = self.transcript_title.text().strip()
-            session_data['ai_notes_description'] = self.transcript_description.toPlainText().strip()
-            session_data['ai_notes_additional_context'] = self.additional_context.toPlainText().strip()
-            session_data['ai_notes_transcript_type'] = self.transcript_type.currentText()
-            
-            # Atomic write using temporary file for safety (same pattern as other session saves)
-            import tempfile
-            import shutil
+            values = {
+                'ai_notes_title': self.transcript_title.text().strip(),
+                'ai_notes_description': self.transcript_description.toPlainText().strip(),
+                'ai_notes_additional_context': self.additional_context.toPlainText().strip(),
+                'ai_notes_transcript_type': self.transcript_type.currentText(),
+            }
+            session_store.set_values(values)
             
-            temp_file = None
-            try:
-                with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False, 
-                                               dir=os.path.dirname(session_file)) as tf:
-                    temp_file = tf.name
-                    json.dump(session_data, tf, indent=2, ensure_ascii=False)
-                
-                # Atomic replacement
-                if os.path.exists(session_file):
-                    os.remove(session_file)
-                shutil.move(temp_file, session_file)
-                temp_file = None
-                
-                print(f"DEBUG: Saved transcript data to session file - title: '{session_data['ai_notes_title']}', type: '{session_data['ai_notes_transcript_type']}'")
-                
-            finally:
-                if temp_file and os.path.exists(temp_file):
-                    os.remove(temp_file)
+            print(f"DEBUG: Saved transcript data to session journal - title: '{values['ai_notes_title']}', type: '{values['ai_notes_transcript_type']}'")
                 
         except Exception as e:
             print(f"Error saving transcript data: {e}")
@@ -1829,8 +1623,14 @@ class AINotesGenerator(QDialog):
         
         print(f"DEBUG: Found {count_without_notes} annotations without notes")
         
-    def create_notes_prompt(self):
-        """Create the AI prompt for generating notes based on user inputs"""
+    def get_notes_batches(self):
+        """Annotations needing notes, split into request-sized batches"""
+        annotations_to_process = self.annotations_without_notes + self.annotations_with_partial_notes
+        batch_size = self.batch_size.value()
+        return [annotations_to_process[i:i + batch_size] for i in range(0, len(annotations_to_process), batch_size)]
+        
+    def create_notes_prompt(self, annotations_to_process=None, transcript_text=None, quiet=False):
+        """Create the AI prompt for generating notes based on user inputs (for one batch when annotations_to_process is given)"""
         thinking_budget = self.thinking_budget.value()
         use_context = self.use_full_context.isChecked()
         generate_commentary = self.generate_commentary.isChecked()
@@ -1841,26 +1641,15 @@ class AINotesGenerator(QDialog):
         target_filter = self.target_filter.toPlainText().strip()
         commentary_length = self.commentary_length_slider.value()
         
-        # Combine annotations needing processing
-        annotations_to_process = self.annotations_without_notes + self.annotations_with_partial_notes
+        if transcript_text is None:
+            transcript_text = self.full_transcript
         
-        print(f"DEBUG PROMPT CREATION: Combining annotations for AI processing")
-        print(f"  From annotations_without_notes: {len(self.annotations_without_notes)} annotations")
-        for i, ann in enumerate(self.annotations_without_notes):
-            print(f"    {i+1}. {ann.get('id', 'NO_ID')} - '{ann.get('text', '')[:30]}...'")
-        
-        print(f"  From annotations_with_partial_notes: {len(self.annotations_with_partial_notes)} annotations")
-        for i, ann in enumerate(self.annotations_with_partial_notes):
-            missing_notes = ann.get('_missing_notes', False)
-            missing_notes_html = ann.get('_missing_notes_html', False)
-            missing_info = []
-            if missing_notes:
-                missing_info.append("notes")
-            if missing_notes_html:
-                missing_info.append("notes_html")
-            print(f"    {i+1}. {ann.get('id', 'NO_ID')} - '{ann.get('text', '')[:30]}...' (missing: {', '.join(missing_info)})")
+        # Combine annotations needing processing
+        if annotations_to_process is None:
+            annotations_to_process = self.annotations_without_notes + self.annotations_with_partial_notes
         
-        print(f"  Total annotations_to_process: {len(annotations_to_process)}")
+        if not quiet:
+            self.log_notes_prompt_annotations(annotations_to_process)
         
         if not annotations_to_process:
             return None
@@ -1879,18 +1668,17 @@ class AINotesGenerator(QDialog):
                 'tags': tags,
                 'tags_text': tags_text,
                 'theme': annotation.get('theme', ''),
-                'id': annotation.get('id', ''),
+                'id': self.id_aliases.alias(annotation.get('id', '')),
                 'has_notes': bool(annotation.get('notes', '').strip()),
                 'has_notes_html': bool(annotation.get('notes_html', '').strip())
             }
             annotations_data.append(data)
         
         annotations_text = "\n".join([
-            f"ANNOTATION {data['index']}:\n"
+            f"ANNOTATION {data['id']}:\n"
             f"Theme/Scene: {data['scene']}\n"
             f"Tags: {data['tags_text']}\n"
             f"Text: {data['text']}\n"
-            f"ID: {data['id']}\n"
             f"Has existing notes: {'Yes' if data['has_notes'] else 'No'}\n"
             f"Has existing commentary: {'Yes' if data['has_notes_html'] else 'No'}\n"
             for data in annotations_data
@@ -1899,7 +1687,7 @@ class AINotesGenerator(QDialog):
         # Build context section based on user preference
         if use_context:
             context_section = f"""FULL TRANSCRIPT CONTEXT:
-{self.full_transcript}
+{transcript_text}
 
 """
             context_instruction = "Analyze each annotation within the context of the full transcript to understand its narrative purpose and how it connects to the broader story."
@@ -1956,9 +1744,8 @@ Consider:
 - Connections to broader concepts
 - Critical analysis and interpretation"""
 
-        prompt = f"""<thinking>
-Budget: {thinking_budget} tokens for reasoning about content analysis.
-
+        # Stable sections first - instructions, transcript, then this batch of annotations
+        instructions = f"""<thinking>
 TRANSCRIPT INFORMATION:
 Title: {transcript_title if transcript_title else 'Not specified'}
 Description: {transcript_description if transcript_description else 'Not specified'}
@@ -1971,9 +1758,6 @@ Analyze each annotation to generate appropriate notes and {'commentary' if gener
 
 You are generating notes and commentary for annotations in a {transcript_type.lower()}.
 
-{context_section}ANNOTATIONS TO ANALYZE:
-{annotations_text}
-
 INSTRUCTIONS:
 {context_instruction}
 
@@ -1991,7 +1775,7 @@ FORMAT YOUR RESPONSE EXACTLY LIKE THIS:
 {'[[NOTES :: ANNOTATION_ID :: BRIEF_NOTES :: DETAILED_HTML_NOTES]]' if generate_commentary else '[[NOTES :: ANNOTATION_ID :: BRIEF_NOTES :: SKIP]]'}
 
 FIELD EXPLANATIONS:
-- ANNOTATION_ID: The exact ID from the annotation data (copy exactly)
+- ANNOTATION_ID: The exact ID from the annotation's header line, like "A12" (copy exactly)
 - BRIEF_NOTES: {'Brief identifier (3-6 words). Use "SKIP" if annotation already has notes or doesn\'t match targeting criteria.' if generate_commentary else 'Brief identifier (3-6 words). Use "SKIP" if annotation already has notes or doesn\'t match targeting criteria.'}
 - DETAILED_HTML_NOTES: {'Commentary/analysis. Use "SKIP" if annotation already has commentary, doesn\'t match targeting criteria, or if commentary generation is disabled.' if generate_commentary else 'Always use "SKIP" since commentary generation is disabled.'}
 
@@ -2001,13 +1785,40 @@ REQUIREMENTS:
 - {commentary_length_instruction if generate_commentary else 'Commentary generation is disabled - always use "SKIP" for DETAILED_HTML_NOTES'}
 
 Examples:
-[[NOTES :: abc123-def456 :: Character motivation revealed :: {'This segment establishes authentic personality and core motivation.' if generate_commentary else 'SKIP'}]]
-[[NOTES :: xyz789-abc012 :: SKIP :: {'Powerful transformation moment showing growth and vulnerability.' if generate_commentary else 'SKIP'}]] (if notes already exist but commentary doesn't)
+[[NOTES :: A12 :: Character motivation revealed :: {'This segment establishes authentic personality and core motivation.' if generate_commentary else 'SKIP'}]]
+[[NOTES :: A27 :: SKIP :: {'Powerful transformation moment showing growth and vulnerability.' if generate_commentary else 'SKIP'}]] (if notes already exist but commentary doesn't)
 
 Only provide notes in the specified format. No additional text or explanations."""
 
+        request = f"""Budget: {thinking_budget} tokens for reasoning about content analysis.
+
+Generate notes for the annotations listed above, in the specified format."""
+
+        prompt = get_prompt_template('generate_notes').render(
+            instructions, context_section, f"ANNOTATIONS TO ANALYZE:\n{annotations_text}", request)
+
         return prompt
         
+    def log_notes_prompt_annotations(self, annotations_to_process):
+        """Print which annotations go into a notes prompt"""
+        print(f"DEBUG PROMPT CREATION: Combining annotations for AI processing")
+        print(f"  From annotations_without_notes: {len(self.annotations_without_notes)} annotations")
+        for i, ann in enumerate(self.annotations_without_notes):
+            print(f"    {i+1}. {ann.get('id', 'NO_ID')} - '{ann.get('text', '')[:30]}...'")
+        
+        print(f"  From annotations_with_partial_notes: {len(self.annotations_with_partial_notes)} annotations")
+        for i, ann in enumerate(self.annotations_with_partial_notes):
+            missing_notes = ann.get('_missing_notes', False)
+            missing_notes_html = ann.get('_missing_notes_html', False)
+            missing_info = []
+            if missing_notes:
+                missing_info.append("notes")
+            if missing_notes_html:
+                missing_info.append("notes_html")
+            print(f"    {i+1}. {ann.get('id', 'NO_ID')} - '{ann.get('text', '')[:30]}...' (missing: {', '.join(missing_info)})")
+        
+        print(f"  Total annotations_to_process: {len(annotations_to_process)}")
+        
     def process_with_ai(self):
         """Process annotations with AI to generate notes"""
         # Check if we have any annotations to process
@@ -2021,25 +1832,19 @@ Only provide notes in the specified format. No additional text or explanations."
             return
         
         # Validate user inputs (transcript title and description are optional per user feedback)
-        
-        # Check if full transcript context is enabled and transcript is large
         use_context = self.use_full_context.isChecked()
-        if use_context and len(self.full_transcript) > 500000:
-            msg = QMessageBox(self)
-            msg.setWindowTitle("Large Transcript Warning")
-            msg.setText("The transcript is very large (over 500,000 characters).")
-            msg.setInformativeText("Using full transcript context will consume a significant number of tokens. Do you want to continue?")
-            msg.setDetailedText(f"Transcript size: {len(self.full_transcript):,} characters\n\n"
-                               f"This will consume substantial API tokens and may be expensive. "
-                               f"Consider unchecking 'Include full transcript context' for a more economical approach.")
-            msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-            msg.setDefaultButton(QMessageBox.StandardButton.No)
-            msg.setIcon(QMessageBox.Icon.Warning)
-            
-            if msg.exec() == QMessageBox.StandardButton.No:
-                return
         
-        prompt = self.create_notes_prompt()
+        # Larger sets are generated in concurrent batches and applied batch by batch
+        if total_to_process > self.batch_size.value():
+            self.process_in_batches()
+            return
+        
+        # Hold the prompt to the token budget (trimming transcript context if allowed)
+        self.log_notes_prompt_annotations(self.annotations_without_notes + self.annotations_with_partial_notes)
+        prompt = self.budget_controls.apply_budget(
+            lambda context: self.create_notes_prompt(None, context, quiet=True),
+            self.full_transcript if use_context else ""
+        )
         if not prompt:
             return
         print("=" * 80)
@@ -2059,22 +1864,138 @@ Only provide notes in the specified format. No additional text or explanations."
         # Clear response display
         self.response_display.clear()
         
-        # Start AI worker thread
+        # Notes are matched to annotations as their blocks stream in
+        self.start_notes_parsing()
+        self.notes_stream = BracketRecordStream('NOTES')
+        
+        # Submit to the shared AI request engine
         thinking_budget = self.thinking_budget.value()
         selected_model = self.model_selector.currentText()
-        self.worker_thread = AIWorkerThread(prompt, self.api_key, selected_model, thinking_budget)
-        self.worker_thread.response_received.connect(self.handle_ai_response)
-        self.worker_thread.chunk_received.connect(self.handle_ai_chunk)
-        self.worker_thread.error_occurred.connect(self.handle_ai_error)
-        self.worker_thread.retry_suggested.connect(self.handle_retry_suggestion)
-        self.worker_thread.finished.connect(self.cleanup_worker)
-        self.worker_thread.start()
+        self.ai_job = get_request_engine().submit(prompt, self.api_key, selected_model,
+                                                  thinking_budget=thinking_budget,
+                                                  temperature=0.3, top_p=0.8,
+                                                  label="Generate Notes",
+                                                  use_cache=self.use_cache_checkbox.isChecked())
+        self.ai_job.response_received.connect(self.handle_ai_response)
+        self.ai_job.chunk_received.connect(self.handle_ai_chunk)
+        self.ai_job.error_occurred.connect(self.handle_ai_error)
+        self.ai_job.retry_suggested.connect(self.handle_retry_suggestion)
+        self.ai_job.finished.connect(self.cleanup_worker)
+        
+    def process_in_batches(self):
+        """Generate notes for batches of annotations concurrently, applying each batch as it completes"""
+        annotations_to_process = self.annotations_without_notes + self.annotations_with_partial_notes
+        batch_size = self.batch_size.value()
+        batches = self.get_notes_batches()
+        
+        # Every batch shares the transcript context, so fit it to the budget once using the largest batch
+        use_context = self.use_full_context.isChecked()
+        largest_batch = max(batches, key=self.estimate_notes_batch_chars)
+        if not self.budget_controls.apply_budget(
+            lambda context: self.create_notes_prompt(largest_batch, context, quiet=True),
+            self.full_transcript if use_context else ""
+        ):
+            return
+        context = self.budget_controls.fitted_context
+        prompts = [self.create_notes_prompt(batch, context) for batch in batches]
+        self.budget_controls.show_projection(
+            max(get_token_estimator().estimate(prompt) for prompt in prompts),
+            note=f"per batch ({len(batches)} batches)"
+        )
+        
+        print(f"DEBUG: Generating notes for {len(annotations_to_process)} annotations in {len(batches)} batches "
+              f"of up to {batch_size}, {self.parallel_requests.value()} in parallel")
+        
+        self.notes_stream = None
+        self.batch_applied_count = 0
+        self.batch_parsed_count = 0
+        
+        # Update UI for processing state
+        self.process_button.hide()
+        self.stop_button.show()
+        self.progress_bar.setRange(0, len(batches))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("📝 AI is generating notes... batch %v/%m")
+        self.progress_bar.show()
+        self.response_display.clear()
+        
+        self.batch_group = get_request_engine().submit_group(
+            prompts, self.api_key, self.model_selector.currentText(),
+            max_parallel=self.parallel_requests.value(),
+            thinking_budget=self.thinking_budget.value(),
+            temperature=0.3, top_p=0.8, stream=False,
+            label="Generate Notes",
+            use_cache=self.use_cache_checkbox.isChecked()
+        )
+        self.batch_group.item_finished.connect(self.handle_batch_response)
+        self.batch_group.item_failed.connect(self.handle_batch_error)
+        self.batch_group.progress.connect(lambda done, total: self.progress_bar.setValue(done))
+        self.batch_group.finished.connect(self.handle_batches_finished)
+        
+    def estimate_notes_batch_chars(self, batch):
+        """Characters a batch adds to the notes prompt - the rest of the prompt is the same for every batch"""
+        return sum(len(annotation.get('text', '')) + len(annotation.get('scene', '')) +
+                   len(', '.join(annotation.get('tags', []))) + NOTES_PROMPT_CHARS_PER_ANNOTATION
+                   for annotation in batch)
+        
+    def handle_batch_response(self, index, response_text):
+        """Apply the notes from one completed batch right away"""
+        notes_count = self.parse_notes_response(response_text)
+        applied_count = self.apply_parsed_notes(self.parsed_notes) if notes_count else 0
+        self.batch_parsed_count += notes_count
+        self.batch_applied_count += applied_count
+        
+        self.append_batch_status(f"Batch {index + 1}: {applied_count}/{notes_count} notes applied")
+        
+    def handle_batch_error(self, index, error_message):
+        """Record a failed batch; the remaining batches keep going"""
+        print(f"DEBUG: Notes batch {index + 1} failed: {error_message[:200]}")
+        first_line = error_message.splitlines()[0] if error_message else "unknown error"
+        self.append_batch_status(f"Batch {index + 1} failed: {first_line}")
+        
+    def append_batch_status(self, line):
+        """Add a line to the batch log in the response area"""
+        cursor = self.response_display.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(line + "\n")
+        self.response_display.setTextCursor(cursor)
+        scrollbar = self.response_display.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+        
+    def handle_batches_finished(self):
+        """Refresh once after the last batch and report the overall result"""
+        group = self.batch_group
+        self.batch_group = None
+        self.cleanup_worker()
+        if group is None or group.is_cancelled():
+            return
+        
+        if group.errors:
+            failed = ", ".join(str(i + 1) for i in sorted(group.errors))
+            QMessageBox.warning(self, "Some Batches Failed",
+                                f"{len(group.errors)} of {len(group)} batches failed (batch {failed}).\n\n"
+                                f"Notes from the other batches have been applied. Run Generate Notes again "
+                                f"to fill in the remaining annotations.")
+        
+        if self.batch_parsed_count == 0:
+            if not group.errors:
+                QMessageBox.warning(self, "No Notes Generated", "AI did not generate any valid notes. Check the AI response area for details.")
+            return
+        
+        self.finish_notes_application(self.batch_applied_count, self.batch_parsed_count)
         
     def handle_ai_response(self, response_text):
         """Handle AI response and update annotations with notes"""
         try:
-            # Parse AI response
-            notes_count = self.parse_notes_response(response_text)
+            # Blocks closed while streaming are already matched; otherwise parse the whole response
+            stream = self.notes_stream
+            self.notes_stream = None
+            if stream is not None and stream.text() == response_text:
+                stream.finish()
+                self.report_notes_parsing()
+                notes_count = len(self.parsed_notes)
+            else:
+                notes_count = self.parse_notes_response(response_text)
             
             if notes_count == 0:
                 # Show detailed error in response area
@@ -2106,7 +2027,16 @@ Only provide notes in the specified format. No additional text or explanations."
     
     def handle_ai_chunk(self, chunk_text):
         """Handle streaming AI response chunks"""
-        self.progress_bar.setFormat("📝 AI is generating notes...")
+        # Match each notes block to its annotation as soon as it is complete
+        if self.notes_stream is not None:
+            for block in self.notes_stream.feed(chunk_text):
+                notes_data = self.parse_notes_block(block)
+                if notes_data:
+                    self.parsed_notes.append(notes_data)
+        
+        found = len(self.parsed_notes) if self.notes_stream is not None else 0
+        self.progress_bar.setFormat(f"📝 AI is generating notes... {found} matched so far" if found
+                                    else "📝 AI is generating notes...")
         
         # Append chunk to response display
         cursor = self.response_display.textCursor()
@@ -2120,6 +2050,8 @@ Only provide notes in the specified format. No additional text or explanations."
             
     def handle_ai_error(self, error_message):
         """Handle AI processing errors with detailed feedback"""
+        self.notes_stream = None
+        
         # Also display error in the response area for user visibility
         self.response_display.clear()
         error_text = f"❌ AI Processing Error:\n\n{error_message}\n\nPlease check:\n• Your API key is valid\n• You have internet connection\n• The Gemini service is available"
@@ -2153,108 +2085,146 @@ Only provide notes in the specified format. No additional text or explanations."
         
     def stop_processing(self):
         """Stop the AI processing"""
-        if hasattr(self, 'worker_thread'):
-            self.worker_thread.terminate()
-            self.worker_thread.wait()
-            self.worker_thread.deleteLater()
+        if getattr(self, 'ai_job', None):
+            self.ai_job.cancel()
+        self.notes_stream = None
+        
+        if self.batch_group:
+            self.batch_group.cancel()
+            self.batch_group = None
+            self.cleanup_worker()
+            # Notes from batches that already landed stay applied - refresh for them, but keep the dialog open
+            if self.batch_applied_count > 0:
+                self.refresh_after_notes(self.batch_applied_count)
+                self.append_batch_status(f"Processing cancelled — {self.batch_applied_count} notes applied.")
+            else:
+                self.response_display.setText("Processing cancelled by user.")
+            return
         
         self.cleanup_worker()
         self.response_display.setText("Processing cancelled by user.")
         
     def cleanup_worker(self):
-        """Clean up worker thread and reset UI"""
+        """Reset UI once the AI job is done"""
+        job = self.sender() if isinstance(self.sender(), AIJob) else None
+        # A retry may already have submitted a newer job - leave its UI state alone
+        if job is not None and job is not self.ai_job and self.ai_job is not None and self.ai_job.is_active():
+            return
+            
         self.process_button.show()
         self.stop_button.hide()
         self.progress_bar.hide()
+        self.progress_bar.setRange(0, 0)
         
-        if hasattr(self, 'worker_thread'):
-            self.worker_thread.deleteLater()
+        if job is None or job is self.ai_job:
+            self.ai_job = None
             
     def parse_notes_response(self, response_text):
         """Parse AI response and extract notes data"""
-        self.parsed_notes = []
+        self.start_notes_parsing()
         
         # Find all notes blocks
-        pattern = r'\[\[NOTES\s*::\s*([^:]+?)\s*::\s*([^:]+?)\s*::\s*([^\]]+?)\]\]'
-        matches = re.findall(pattern, response_text, re.DOTALL)
+        blocks = iter_bracket_records(response_text, 'NOTES')
         
-        print(f"DEBUG: Found {len(matches)} notes matches in AI response")
+        print(f"DEBUG: Found {len(blocks)} notes blocks in AI response")
         
-        if len(matches) == 0:
+        if len(blocks) == 0:
             print(f"DEBUG: No matches found. Looking for pattern in response:")
             print(f"DEBUG: Response starts with: '{response_text[:200]}...'")
             print(f"DEBUG: Expected pattern: [[NOTES :: ANNOTATION_ID :: BRIEF_NOTES :: DETAILED_HTML_NOTES]]")
         
-        failed_matches = []
-        
-        for i, match in enumerate(matches):
-            annotation_id, brief_notes, detailed_notes = match
-            annotation_id = annotation_id.strip()
-            brief_notes = brief_notes.strip()
-            detailed_notes = detailed_notes.strip()
-            
-            print(f"DEBUG: Processing notes {i+1}/{len(matches)}: ID='{annotation_id}'")
-            print(f"DEBUG: Brief notes: '{brief_notes}'")
-            print(f"DEBUG: Detailed notes ({len(detailed_notes)} chars): '{detailed_notes[:100]}{'...' if len(detailed_notes) > 100 else ''}'")
-            
-            # Find the corresponding annotation in both lists
-            found_annotation = None
-            found_in_list = None
-            
-            # First check annotations_without_notes
-            for annotation in self.annotations_without_notes:
-                if annotation.get('id') == annotation_id:
-                    found_annotation = annotation
-                    found_in_list = "annotations_without_notes"
-                    break
-            
-            # If not found, check annotations_with_partial_notes
-            if not found_annotation:
-                for annotation in self.annotations_with_partial_notes:
-                    if annotation.get('id') == annotation_id:
-                        found_annotation = annotation
-                        found_in_list = "annotations_with_partial_notes"
-                        break
-            
+        for block in blocks:
+            notes_data = self.parse_notes_block(block)
+            if notes_data:
+                self.parsed_notes.append(notes_data)
+        
+        self.report_notes_parsing()
+        return len(self.parsed_notes)
+    
+    def start_notes_parsing(self):
+        """Reset parsed notes and index the candidate lists once instead of scanning both per note"""
+        self.parsed_notes = []
+        self.failed_notes_matches = []
+        self.notes_indexes = (AnnotationIndex(self.annotations_without_notes),
+                              AnnotationIndex(self.annotations_with_partial_notes))
+    
+    def parse_notes_block(self, block):
+        """Match one [[NOTES ...]] block to its annotation; returns the notes data or None"""
+        fields = parse_notes_record(block)
+        if fields is None:
+            print(f"DEBUG: Malformed notes block: '{block[:100]}'")
+            return None
+        annotation_id, brief_notes, detailed_notes = fields
+        # Prompts list short aliases - map them back to real IDs
+        annotation_id = self.id_aliases.resolve(annotation_id)
+        
+        print(f"DEBUG: Processing notes for ID='{annotation_id}'")
+        print(f"DEBUG: Brief notes: '{brief_notes}'")
+        print(f"DEBUG: Detailed notes ({len(detailed_notes)} chars): '{detailed_notes[:100]}{'...' if len(detailed_notes) > 100 else ''}'")
+        
+        # Find the corresponding annotation in both lists
+        found_annotation = None
+        found_in_list = None
+        
+        # First check annotations_without_notes
+        found_annotation = self.notes_indexes[0].get(annotation_id)
+        if found_annotation:
+            found_in_list = "annotations_without_notes"
+        
+        # If not found, check annotations_with_partial_notes
+        if not found_annotation:
+            found_annotation = self.notes_indexes[1].get(annotation_id)
             if found_annotation:
-                # Add debug info about current state
-                current_notes = found_annotation.get('notes', '').strip()
-                current_notes_html = found_annotation.get('notes_html', '').strip()
-                
-                self.parsed_notes.append({
-                    'annotation_id': annotation_id,
-                    'annotation': found_annotation,
-                    'brief_notes': brief_notes,
-                    'detailed_notes': detailed_notes
-                })
-                print(f"DEBUG: ✅ Successfully matched annotation {annotation_id} from {found_in_list}")
-                print(f"DEBUG:    Current state - notes: {'EXISTS' if current_notes else 'MISSING'}, notes_html: {'EXISTS' if current_notes_html else 'MISSING'}")
-                print(f"DEBUG:    Will add - notes: {'YES' if brief_notes != 'SKIP' and not current_notes else 'NO'}, notes_html: {'YES' if detailed_notes != 'SKIP' and not current_notes_html else 'NO'}")
-            else:
-                error_detail = f"Could not find annotation with ID '{annotation_id}'"
-                failed_matches.append(error_detail)
-                print(f"DEBUG: ❌ {error_detail}")
-                print(f"DEBUG:    Searched {len(self.annotations_without_notes)} annotations_without_notes")
-                print(f"DEBUG:    Searched {len(self.annotations_with_partial_notes)} annotations_with_partial_notes")
-                
-        if failed_matches:
-            print(f"DEBUG: Failed to match {len(failed_matches)} annotations:")
-            for error in failed_matches:
+                found_in_list = "annotations_with_partial_notes"
+        
+        if found_annotation:
+            # Add debug info about current state
+            current_notes = found_annotation.get('notes', '').strip()
+            current_notes_html = found_annotation.get('notes_html', '').strip()
+            
+            notes_data = {
+                'annotation_id': annotation_id,
+                'annotation': found_annotation,
+                'brief_notes': brief_notes,
+                'detailed_notes': detailed_notes
+            }
+            print(f"DEBUG: ✅ Successfully matched annotation {annotation_id} from {found_in_list}")
+            print(f"DEBUG:    Current state - notes: {'EXISTS' if current_notes else 'MISSING'}, notes_html: {'EXISTS' if current_notes_html else 'MISSING'}")
+            print(f"DEBUG:    Will add - notes: {'YES' if brief_notes != 'SKIP' and not current_notes else 'NO'}, notes_html: {'YES' if detailed_notes != 'SKIP' and not current_notes_html else 'NO'}")
+        else:
+            error_detail = f"Could not find annotation with ID '{annotation_id}'"
+            self.failed_notes_matches.append(error_detail)
+            print(f"DEBUG: ❌ {error_detail}")
+            print(f"DEBUG:    Searched {len(self.annotations_without_notes)} annotations_without_notes")
+            print(f"DEBUG:    Searched {len(self.annotations_with_partial_notes)} annotations_with_partial_notes")
+            return None
+        return notes_data
+    
+    def report_notes_parsing(self):
+        """Print a summary of the notes parsed from a response"""
+        if self.failed_notes_matches:
+            print(f"DEBUG: Failed to match {len(self.failed_notes_matches)} annotations:")
+            for error in self.failed_notes_matches:
                 print(f"DEBUG:   - {error}")
             print(f"DEBUG: Available annotation IDs in annotations_without_notes: {[a.get('id') for a in self.annotations_without_notes]}")
             print(f"DEBUG: Available annotation IDs in annotations_with_partial_notes: {[a.get('id') for a in self.annotations_with_partial_notes]}")
         
         print(f"DEBUG: Successfully parsed {len(self.parsed_notes)} valid notes")
-        return len(self.parsed_notes)
-    
+        
     def apply_notes_to_annotations(self):
         """Apply the generated notes to the annotations"""
         if not self.parsed_notes:
             return
         
+        successful_count = self.apply_parsed_notes(self.parsed_notes)
+        self.finish_notes_application(successful_count, len(self.parsed_notes))
+        
+    def apply_parsed_notes(self, parsed_notes):
+        """Write parsed notes into the annotations and theme view widgets; returns how many were applied"""
         successful_count = 0
+        main_index = AnnotationIndex(self.web_view.annotations) if hasattr(self.web_view, 'annotations') else None
         
-        for note_data in self.parsed_notes:
+        for note_data in parsed_notes:
             try:
                 annotation = note_data['annotation']
                 annotation_id = note_data['annotation_id']
@@ -2305,16 +2275,15 @@ Only provide notes in the specified format. No additional text or explanations."
                     print(f"DEBUG: Skipped notes_html for {annotation_id} (already exists or SKIP)")
                 
                 # Also update the main web_view.annotations list
-                if hasattr(self.web_view, 'annotations'):
-                    for main_annotation in self.web_view.annotations:
-                        if main_annotation.get('id') == annotation_id:
-                            # Only update missing fields
-                            if not original_notes and note_data['brief_notes'] != "SKIP":
-                                main_annotation['notes'] = note_data['brief_notes']
-                            if not original_notes_html and note_data['detailed_notes'] != "SKIP":
-                                main_annotation['notes_html'] = note_data['detailed_notes']
-                            print(f"DEBUG: Updated main annotation data for {annotation_id}")
-                            break
+                if main_index is not None:
+                    main_annotation = main_index.get(annotation_id)
+                    if main_annotation:
+                        # Only update missing fields
+                        if not original_notes and note_data['brief_notes'] != "SKIP":
+                            main_annotation['notes'] = note_data['brief_notes']
+                        if not original_notes_html and note_data['detailed_notes'] != "SKIP":
+                            main_annotation['notes_html'] = note_data['detailed_notes']
+                        print(f"DEBUG: Updated main annotation data for {annotation_id}")
                 
                 # Update the theme view widget directly to show new notes immediately (only for non-SKIP values)
                 notes_to_show = note_data['brief_notes'] if note_data['brief_notes'] != "SKIP" else None
@@ -2378,8 +2347,14 @@ Only provide notes in the specified format. No additional text or explanations."
                 import traceback
                 traceback.print_exc()
         
+        return successful_count
+        
+    def refresh_after_notes(self, successful_count):
+        """Refresh the theme view once and mark the session changed after notes were applied"""
         # Final theme view refresh to ensure all changes are visible
         if successful_count > 0:
+            get_transcript_cache().invalidate(self.web_view, f"notes added to {successful_count} annotations")
+            
             try:
                 print(f"DEBUG: Final theme view refresh after updating {successful_count} annotations with notes")
                 
@@ -2402,13 +2377,17 @@ Only provide notes in the specified format. No additional text or explanations."
                 print(f"DEBUG: Error in final theme view update: {str(e)}")
                 import traceback
                 traceback.print_exc()
+    
+    def finish_notes_application(self, successful_count, attempted_count):
+        """Refresh the theme view once, report the results and close on success"""
+        self.refresh_after_notes(successful_count)
         
         # Show results with detailed feedback
         if successful_count > 0:
             success_msg = f"Successfully generated notes for {successful_count} annotations! 📝\n\nThe notes are now visible in your Theme View and annotation tooltips."
             
-            if successful_count < len(self.parsed_notes):
-                failed_count = len(self.parsed_notes) - successful_count
+            if successful_count < attempted_count:
+                failed_count = attempted_count - successful_count
                 success_msg += f"\n\nNote: {failed_count} annotations had update errors (check console for details)."
             
             # Also show success in response area
@@ -2418,7 +2397,7 @@ Only provide notes in the specified format. No additional text or explanations."
             QMessageBox.information(self, "Success!", success_msg)
         else:
             # All failed
-            error_msg = f"Failed to update any annotations with notes.\n\nGenerated {len(self.parsed_notes)} notes but could not apply them.\n\nCheck the console output for detailed error information."
+            error_msg = f"Failed to update any annotations with notes.\n\nGenerated {attempted_count} notes but could not apply them.\n\nCheck the console output for detailed error information."
             
             self.response_display.clear()
             self.response_display.setPlainText(f"❌ Update Failed\n\n{error_msg}")
@@ -2432,6 +2411,11 @@ Only provide notes in the specified format. No additional text or explanations."
     def closeEvent(self, event):
         """Handle dialog close event"""
         super().closeEvent(event)
+    
+    def done(self, result):
+        """Write journaled session edits into the session file once the dialog is accepted, rejected or closed"""
+        compact_main_window_session(self.main_window)
+        super().done(result)
             
     def update_annotation_notes_in_theme_view(self, annotation_id, brief_notes, detailed_notes):
         """Update notes display for a specific annotation in theme view"""
@@ -2439,100 +2423,96 @@ Only provide notes in the specified format. No additional text or explanations."
             print(f"DEBUG: No scene_tabs found, cannot update annotation {annotation_id}")
             return
             
+        # Cached item lookup instead of scanning every item in every tab
+        item_cache = get_theme_view_item_cache(self.main_window.scene_tabs)
         updated = False
-        for i in range(self.main_window.scene_tabs.count()):
-            list_widget = self.main_window.scene_tabs.widget(i)
-            if hasattr(list_widget, 'count'):
-                # Find the specific annotation item and update its notes display
-                for j in range(list_widget.count()):
-                    item = list_widget.item(j)
-                    if item and item.data(Qt.ItemDataRole.UserRole) == annotation_id:
-                        item_widget = list_widget.itemWidget(item)
-                        if item_widget:
-                            # Update notes field (brief notes in the QLabel)
-                            from PyQt6.QtWidgets import QLabel
-                            notes_edit = item_widget.findChild(QLabel, "notes_edit")
-                            if notes_edit and hasattr(notes_edit, 'property'):
-                                # Use the set_notes_text method that was defined in add_item_with_checkbox
-                                notes_edit.setProperty('notes_text', brief_notes)
-                                
-                                # Convert markdown to plain text for display (same logic as add_item_with_checkbox)
-                                def markdown_to_display_text(text):
-                                    if not text:
-                                        return "Double-click to add footnote..."
-                                    import re
-                                    display_text = text
-                                    display_text = re.sub(r'\*\*(.*?)\*\*', r'\1', display_text)
-                                    display_text = re.sub(r'\*(.*?)\*', r'\1', display_text)
-                                    display_text = re.sub(r'`(.*?)`', r'\1', display_text)
-                                    return display_text
-                                
-                                display_text = markdown_to_display_text(brief_notes)
-                                notes_edit.setText(display_text)
-                                
-                                # Update styling based on content
-                                if not brief_notes:
-                                    notes_edit.setStyleSheet("""
-                                        QLabel {
-                                            border: 1px solid #e0e0e0;
-                                            background-color: white;
-                                            padding: 6px;
-                                            border-radius: 4px;
-                                            color: #aaa;
-                                            font-style: italic;
-                                        }
-                                        QLabel:hover {
-                                            border: 1px solid #ccc;
-                                            background-color: #f9f9f9;
-                                        }
-                                    """)
-                                else:
-                                    notes_edit.setStyleSheet("""
-                                        QLabel {
-                                            border: 1px solid #e0e0e0;
-                                            background-color: white;
-                                            padding: 6px;
-                                            border-radius: 4px;
-                                        }
-                                        QLabel:hover {
-                                            border: 1px solid #ccc;
-                                            background-color: #f9f9f9;
-                                        }
-                                    """)
-                                
-                                print(f"DEBUG: Updated notes QLabel to: '{brief_notes}'")
-                            
-                            # Update widget properties for notes_html
-                            item_widget.setProperty('notes_html', detailed_notes)
-                            item_widget.setProperty('notes', brief_notes)
-                            print(f"DEBUG: Updated widget properties for {annotation_id}")
-                            
-                            # Update the book icon to active state since we now have notes_html
-                            from PyQt6.QtWidgets import QPushButton
-                            edit_notes_btn = item_widget.findChild(QPushButton, "editNotesButton")
-                            if edit_notes_btn and hasattr(list_widget, '_cached_icons'):
-                                # Use the same logic as add_item_with_checkbox to determine icon state
-                                def is_notes_empty(notes_html_str):
-                                    if not notes_html_str:
-                                        return True
-                                    from PyQt6.QtGui import QTextDocument
-                                    doc = QTextDocument()
-                                    doc.setHtml(notes_html_str)
-                                    return doc.toPlainText().strip() == ""
-                                
-                                # Check if we have notes_html content
-                                if detailed_notes and not is_notes_empty(detailed_notes):
-                                    edit_notes_btn.setIcon(list_widget._cached_icons['notes']['active'])
-                                    print(f"DEBUG: Set book icon to ACTIVE state for {annotation_id}")
-                                else:
-                                    edit_notes_btn.setIcon(list_widget._cached_icons['notes']['normal'])
-                                    print(f"DEBUG: Set book icon to normal state for {annotation_id}")
-                            else:
-                                print(f"DEBUG: Could not find edit notes button or cached icons for {annotation_id}")
-                            
-                            updated = True
-                            print(f"DEBUG: Successfully updated annotation {annotation_id} display in tab {i}")
-                            break
+        for i, list_widget, item, item_widget in item_cache.entries(annotation_id):
+            if not item_widget:
+                continue
+            
+            # Update notes field (brief notes in the QLabel)
+            from PyQt6.QtWidgets import QLabel
+            notes_edit = item_widget.findChild(QLabel, "notes_edit")
+            if notes_edit and hasattr(notes_edit, 'property'):
+                # Use the set_notes_text method that was defined in add_item_with_checkbox
+                notes_edit.setProperty('notes_text', brief_notes)
+                
+                # Convert markdown to plain text for display (same logic as add_item_with_checkbox)
+                def markdown_to_display_text(text):
+                    if not text:
+                        return "Double-click to add footnote..."
+                    import re
+                    display_text = text
+                    display_text = re.sub(r'\*\*(.*?)\*\*', r'\1', display_text)
+                    display_text = re.sub(r'\*(.*?)\*', r'\1', display_text)
+                    display_text = re.sub(r'`(.*?)`', r'\1', display_text)
+                    return display_text
+                
+                display_text = markdown_to_display_text(brief_notes)
+                notes_edit.setText(display_text)
+                
+                # Update styling based on content
+                if not brief_notes:
+                    notes_edit.setStyleSheet("""
+                        QLabel {
+                            border: 1px solid #e0e0e0;
+                            background-color: white;
+                            padding: 6px;
+                            border-radius: 4px;
+                            color: #aaa;
+                            font-style: italic;
+                        }
+                        QLabel:hover {
+                            border: 1px solid #ccc;
+                            background-color: #f9f9f9;
+                        }
+                    """)
+                else:
+                    notes_edit.setStyleSheet("""
+                        QLabel {
+                            border: 1px solid #e0e0e0;
+                            background-color: white;
+                            padding: 6px;
+                            border-radius: 4px;
+                        }
+                        QLabel:hover {
+                            border: 1px solid #ccc;
+                            background-color: #f9f9f9;
+                        }
+                    """)
+                
+                print(f"DEBUG: Updated notes QLabel to: '{brief_notes}'")
+            
+            # Update widget properties for notes_html
+            item_widget.setProperty('notes_html', detailed_notes)
+            item_widget.setProperty('notes', brief_notes)
+            print(f"DEBUG: Updated widget properties for {annotation_id}")
+            
+            # Update the book icon to active state since we now have notes_html
+            from PyQt6.QtWidgets import QPushButton
+            edit_notes_btn = item_widget.findChild(QPushButton, "editNotesButton")
+            if edit_notes_btn and hasattr(list_widget, '_cached_icons'):
+                # Use the same logic as add_item_with_checkbox to determine icon state
+                def is_notes_empty(notes_html_str):
+                    if not notes_html_str:
+                        return True
+                    from PyQt6.QtGui import QTextDocument
+                    doc = QTextDocument()
+                    doc.setHtml(notes_html_str)
+                    return doc.toPlainText().strip() == ""
+                
+                # Check if we have notes_html content
+                if detailed_notes and not is_notes_empty(detailed_notes):
+                    edit_notes_btn.setIcon(list_widget._cached_icons['notes']['active'])
+                    print(f"DEBUG: Set book icon to ACTIVE state for {annotation_id}")
+                else:
+                    edit_notes_btn.setIcon(list_widget._cached_icons['notes']['normal'])
+                    print(f"DEBUG: Set book icon to normal state for {annotation_id}")
+            else:
+                print(f"DEBUG: Could not find edit notes button or cached icons for {annotation_id}")
+            
+            updated = True
+            print(f"DEBUG: Successfully updated annotation {annotation_id} display in tab {i}")
         
         if not updated:
             print(f"DEBUG: Could not find annotation {annotation_id} in any theme view tab")
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+AI Client Pool for Scriptoria
+
+Provides a single process-wide manager for Gemini API clients so every AI dialog
+(Generate Annotations, Generate Notes, Ask Gemini, AI Generate Script) reuses the
+same client - and its persistent HTTP connections - across requests, retries and
+follow-up questions instead of rebuilding it each time.
+"""
+
+import threading
+
+try:
+    from google import genai
+    import google.genai.types as genai_types
+    NEW_API = True
+except ImportError:
+    genai = None
+    genai_types = None
+    NEW_API = False
+
+try:
+    import google.generativeai as legacy_genai
+except ImportError:
+    legacy_genai = None
+
+# True when at least one Gemini SDK is installed
+SDK_AVAILABLE = genai is not None or legacy_genai is not None
+
+
+class GeminiClientPool:
+    """
+    Thread-safe cache of Gemini clients.
+
+    google.genai clients are not bound to a model, so one client is kept per API key
+    (and base URL, when pointed at a non-default endpoint) and shared by every model.
+    The legacy google.generativeai GenerativeModel objects are model-specific and are
+    cached per (api_key, model, generation_config).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._legacy_models = {}
+        self._legacy_configured_key = None
+
+    def get_client(self, api_key, model=None, base_url=None):
+        """Return the shared google.genai client for this API key (created on first use)"""
+        if genai is None:
+            raise RuntimeError("google.genai is not installed")
+
+        cache_key = (api_key, base_url)
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is None:
+                print(f"[AI CLIENT POOL] Creating google.genai client{f' (first requested for {model})' if model else ''}{f' at {base_url}' if base_url else ''}")
+                if base_url:
+                    client = genai.Client(api_key=api_key, http_options=genai_types.HttpOptions(base_url=base_url))
+                else:
+                    client = genai.Client(api_key=api_key)
+                self._clients[cache_key] = client
+            return client
+
+    def get_legacy_model(self, api_key, model, generation_config=None):
+        """Return a cached google.generativeai GenerativeModel for this key, model and config"""
+        if legacy_genai is None:
+            raise RuntimeError("google.generativeai is not installed")
+
+        config_key = tuple(sorted(generation_config.items())) if generation_config else ()
+        cache_key = (api_key, model, config_key)
+
+        with self._lock:
+            # The legacy SDK keeps its API key in global state - only reconfigure on change
+            if self._legacy_configured_key != api_key:
+                legacy_genai.configure(api_key=api_key)
+                self._legacy_configured_key = api_key
+
+            legacy_model = self._legacy_models.get(cache_key)
+            if legacy_model is None:
+                print(f"[AI CLIENT POOL] Creating legacy GenerativeModel for {model}")
+                if generation_config:
+                    legacy_model = legacy_genai.GenerativeModel(model_name=model, generation_config=generation_config)
+                else:
+                    legacy_model = legacy_genai.GenerativeModel(model_name=model)
+                self._legacy_models[cache_key] = legacy_model
+            return legacy_model
+
+    def clear(self):
+        """Drop all cached clients (e.g. after the API key file changes)"""
+        with self._lock:
+            for client in self._clients.values():
+                try:
+                    client.close()
+                except Exception as e:
+                    print(f"[AI CLIENT POOL] Error closing client: {e}")
+            self._clients.clear()
+            self._legacy_models.clear()
+            self._legacy_configured_key = None
+
+
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool():
+    """Get the process-wide GeminiClientPool instance"""
+    global _client_pool
+    with _client_pool_lock:
+        if _client_pool is None:
+            _client_pool = GeminiClientPool()
+        return _client_pool
@@ -0,0 +1,659 @@
+"""
+AI Request Engine for Scriptoria
+
+Single executor that every AI dialog submits Gemini requests to. It owns retry and
+backoff, error classification, streaming and cancellation, runs jobs on a bounded
+thread pool, and talks to Gemini through a pluggable transport so the whole stack
+can be exercised against a local fake Gemini server.
+"""
+
+import os
+import threading
+import traceback
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+try:
+    from .ai_client_pool import get_client_pool, genai, genai_types, legacy_genai, NEW_API
+    from .context_cache import get_context_cache
+    from .response_cache import get_response_cache
+    from .token_budget import get_token_estimator
+except ImportError:
+    from ai_client_pool import get_client_pool, genai, genai_types, legacy_genai, NEW_API
+    from context_cache import get_context_cache
+    from response_cache import get_response_cache
+    from token_budget import get_token_estimator
+
+
+# Point the google.genai transport at another endpoint (e.g. a local fake server)
+BASE_URL_ENV_VAR = "SCRIPTORIA_GEMINI_BASE_URL"
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Leave a pool thread free for other dialogs while a group of requests runs
+DEFAULT_GROUP_PARALLELISM = 3
+
+RETRYABLE_ERRORS = [
+    '500 internal', 'internal server error', 'service unavailable', '503',
+    'timeout', 'timed out', 'connection error', 'connection reset', 'network error',
+    'temporarily unavailable'
+]
+
+# google.generativeai reports finish reasons as bare integers
+LEGACY_FINISH_REASONS = {
+    1: 'STOP',
+    2: 'MAX_TOKENS',
+    3: 'SAFETY',
+    4: 'RECITATION',
+    5: 'OTHER'
+}
+
+
+def is_retryable_error(error):
+    """Check whether an exception (or error text) looks like a transient service problem"""
+    error_str = str(error).lower()
+    return any(err in error_str for err in RETRYABLE_ERRORS)
+
+
+def describe_error(error):
+    """Add a user-facing hint to common non-retryable API errors"""
+    error_msg = str(error).strip()
+    if not error_msg:
+        return f"Unknown error occurred (Exception type: {type(error).__name__})"
+
+    upper = error_msg.upper()
+    if "API_KEY" in upper or "API KEY" in upper:
+        return f"API Key Error: {error_msg}\nPlease check your API key in data/api_key.txt"
+    elif "PERMISSION" in upper:
+        return f"Permission Error: {error_msg}\nYour API key may not have access to this model"
+    elif "QUOTA" in upper or "RESOURCE_EXHAUSTED" in upper or "429" in upper:
+        return f"Quota/Rate Limit: {error_msg}\nYou may have exceeded your API limits"
+    elif "SAFETY" in upper:
+        return f"Safety Filter: {error_msg}\nContent may have been blocked by AI safety systems"
+    elif "MODEL" in upper and "NOT_FOUND" in upper:
+        return f"Model Not Found: {error_msg}\nThe AI model may not be available or accessible"
+    return error_msg
+
+
+def finish_reason_name(finish_reason):
+    """Normalize finish reasons from either SDK to an upper-case name such as 'MAX_TOKENS'"""
+    if finish_reason is None:
+        return None
+    if isinstance(finish_reason, int) and not hasattr(finish_reason, 'name'):
+        return LEGACY_FINISH_REASONS.get(finish_reason, str(finish_reason))
+    name = getattr(finish_reason, 'name', None) or str(finish_reason)
+    return name.split('.')[-1].upper()
+
+
+def _usage_to_dict(usage_metadata):
+    """Convert SDK usage metadata into a plain dict"""
+    if not usage_metadata:
+        return None
+    return {
+        'prompt_tokens': getattr(usage_metadata, 'prompt_token_count', 0) or 0,
+        'candidates_tokens': getattr(usage_metadata, 'candidates_token_count', 0) or 0,
+        'thoughts_tokens': getattr(usage_metadata, 'thoughts_token_count', 0) or 0,
+        'cached_tokens': getattr(usage_metadata, 'cached_content_token_count', 0) or 0,
+        'total_tokens': getattr(usage_metadata, 'total_token_count', 0) or 0
+    }
+
+
+def _chunk_to_dict(chunk):
+    """Convert an SDK response (or stream chunk) into the engine's chunk dict"""
+    try:
+        text = chunk.text or ""
+    except Exception:
+        # The legacy SDK raises when a chunk has no valid parts (e.g. safety blocks)
+        text = ""
+
+    finish_reason = None
+    safety_ratings = None
+    candidates = getattr(chunk, 'candidates', None)
+    if candidates:
+        candidate = candidates[0]
+        finish_reason = finish_reason_name(getattr(candidate, 'finish_reason', None))
+        safety_ratings = getattr(candidate, 'safety_ratings', None)
+
+    return {
+        'text': text,
+        'finish_reason': finish_reason,
+        'safety_ratings': safety_ratings,
+        'usage': _usage_to_dict(getattr(chunk, 'usage_metadata', None))
+    }
+
+
+class AIRequest:
+    """Parameters for a single Gemini generation request"""
+
+    def __init__(self, prompt, api_key, model="gemini-2.5-pro", thinking_budget=None,
+                 temperature=0.3, top_p=0.8, stream=True, max_retries=2, label="AI request",
+                 use_cache=False, context_cache=False, cache_owner=None):
+        self.prompt = prompt
+        self.api_key = api_key
+        self.model = model
+        self.thinking_budget = thinking_budget
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stream = stream
+        self.max_retries = max_retries
+        self.label = label
+        self.use_cache = use_cache  # Answer identical requests from the on-disk response cache
+        self.context_cache = context_cache  # Send the stable prompt prefix as server-side cached content
+        self.cache_owner = cache_owner  # Tag (one per dialog) under which server-side caches are released
+
+
+class GenAITransport:
+    """
+    Transport built on the google.genai SDK (supports thinking budgets).
+
+    base_url overrides the Gemini endpoint, which is how a local fake Gemini
+    server is plugged in for testing.
+    """
+
+    name = "google.genai"
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+
+    def generate(self, request):
+        """Yield chunk dicts for the request"""
+        client = get_client_pool().get_client(request.api_key, request.model, base_url=self.base_url)
+
+        config = genai_types.GenerateContentConfig(
+            temperature=request.temperature,
+            top_p=request.top_p,
+        )
+        if request.thinking_budget is not None:
+            config.thinking_config = genai_types.ThinkingConfig(
+                thinking_budget=request.thinking_budget
+            )
+
+        contents = str(request.prompt)  # The SDK drops str subclasses such as RenderedPrompt
+        if request.context_cache:
+            contents, config.cached_content = self._split_cached_prefix(client, request)
+        if not config.cached_content:
+            yield from self._generate(client, request, contents, config)
+            return
+
+        produced = False
+        try:
+            for chunk in self._generate(client, request, contents, config):
+                produced = True
+                yield chunk
+        except Exception as e:
+            if produced:
+                raise
+            # The cache may have expired or been deleted - retry once with the whole prompt
+            print(f"[AI ENGINE] Cached context {config.cached_content} rejected ({e}) - resending full prompt")
+            get_context_cache().invalidate(config.cached_content)
+            config.cached_content = None
+            yield from self._generate(client, request, str(request.prompt), config)
+
+    def _split_cached_prefix(self, client, request):
+        """(contents, cached content name) - just the request section when the prefix is cached"""
+        prompt = request.prompt
+        prefix_length = getattr(prompt, 'prefix_length', 0)  # Set on prompts rendered from a PromptTemplate
+        suffix = str(prompt[prefix_length:]).lstrip('\n')
+        if not prefix_length or not suffix:
+            # Nothing outside the prefix to send alongside a cache (Gemini rejects empty contents)
+            return str(prompt), None
+        name = get_context_cache().get_or_create(client, request.api_key, request.model, prompt.prefix(),
+                                                 base_url=self.base_url, label=request.label,
+                                                 owner=request.cache_owner)
+        if not name:
+            return str(prompt), None
+        return suffix, name
+
+    def _generate(self, client, request, contents, config):
+        if request.stream:
+            for chunk in client.models.generate_content_stream(
+                model=request.model,
+                contents=contents,
+                config=config
+            ):
+                yield _chunk_to_dict(chunk)
+        else:
+            response = client.models.generate_content(
+                model=request.model,
+                contents=contents,
+                config=config
+            )
+            yield _chunk_to_dict(response)
+
+
+class LegacyGenAITransport:
+    """Transport built on the deprecated google.generativeai SDK (no thinking budget or context cache support)"""
+
+    name = "google.generativeai"
+
+    def generate(self, request):
+        """Yield chunk dicts for the request"""
+        model = get_client_pool().get_legacy_model(request.api_key, request.model, {
+            "temperature": request.temperature,
+            "top_p": request.top_p,
+        })
+
+        if request.stream:
+            for chunk in model.generate_content(str(request.prompt), stream=True):
+                yield _chunk_to_dict(chunk)
+        else:
+            yield _chunk_to_dict(model.generate_content(str(request.prompt)))
+
+
+def default_transport():
+    """Pick the transport for the installed SDK, honouring the base URL override"""
+    base_url = os.environ.get(BASE_URL_ENV_VAR) or None
+    if NEW_API and genai is not None:
+        return GenAITransport(base_url=base_url)
+    if legacy_genai is not None:
+        return LegacyGenAITransport()
+    return None
+
+
+class AIJob(QObject):
+    """
+    Handle for a submitted request. Signals are emitted from the pool thread and
+    delivered to receivers on the GUI thread.
+    """
+
+    started = pyqtSignal()
+    chunk_received = pyqtSignal(str)
+    response_received = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+    retry_suggested = pyqtSignal(str)  # Retryable error persisted after all attempts
+    finished = pyqtSignal()
+
+    def __init__(self, request, transport):
+        super().__init__()
+        self.request = request
+        self.transport = transport
+        self.usage = None  # Usage metadata from the final chunk, when reported
+        self.cache_hit = False  # True when the response was replayed from the response cache
+        self._cancel_event = threading.Event()
+        self._finished = False
+
+    @property
+    def label(self):
+        return self.request.label
+
+    def cancel(self):
+        """Request cancellation - no further results are emitted for this job"""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def is_active(self):
+        """True while the job is queued or running and has not been cancelled"""
+        return not self._finished and not self._cancel_event.is_set()
+
+
+class _AIJobRunnable(QRunnable):
+    """QRunnable that executes one AIJob on the engine's thread pool"""
+
+    def __init__(self, engine, job):
+        super().__init__()
+        self.engine = engine
+        self.job = job
+        self.setAutoDelete(True)
+
+    def run(self):
+        self.engine._execute(self.job)
+
+
+class AIRequestEngine(QObject):
+    """
+    Process-wide executor for Gemini requests with bounded concurrency.
+
+    Dialogs call submit() and connect to the returned AIJob's signals instead of
+    running their own worker threads.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, transport=None):
+        super().__init__()
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(max_concurrency)
+        self._transport = transport
+        self._jobs = set()
+        self._jobs_lock = threading.Lock()
+        get_token_estimator()  # Load the calibration here rather than racing on a pool thread
+
+    def set_transport(self, transport):
+        """Replace the transport used for new jobs (None = default for installed SDK)"""
+        self._transport = transport
+
+    def get_transport(self):
+        return self._transport or default_transport()
+
+    def set_max_concurrency(self, max_concurrency):
+        """Change how many jobs may run at the same time"""
+        self._pool.setMaxThreadCount(max(1, int(max_concurrency)))
+
+    def max_concurrency(self):
+        return self._pool.maxThreadCount()
+
+    def submit(self, prompt, api_key, model="gemini-2.5-pro", thinking_budget=None,
+               temperature=0.3, top_p=0.8, stream=True, max_retries=2, label="AI request",
+               use_cache=False, context_cache=False, cache_owner=None):
+        """Queue a generation request and return its AIJob"""
+        request = AIRequest(prompt, api_key, model, thinking_budget=thinking_budget,
+                            temperature=temperature, top_p=top_p, stream=stream,
+                            max_retries=max_retries, label=label, use_cache=use_cache,
+                            context_cache=context_cache, cache_owner=cache_owner)
+        job = AIJob(request, self.get_transport())
+
+        with self._jobs_lock:
+            self._jobs.add(job)
+
+        prefix_bytes = getattr(prompt, 'prefix_bytes', None)  # Set on prompts rendered from a PromptTemplate
+        prefix_note = f", stable prefix {prefix_bytes:,} bytes" if prefix_bytes is not None else ""
+        print(f"[AI ENGINE] Queued '{label}' ({model}, {len(prompt)} chars{prefix_note}, stream={stream})")
+        self._pool.start(_AIJobRunnable(self, job))
+        return job
+
+    def submit_group(self, prompts, api_key, model="gemini-2.5-pro", max_parallel=DEFAULT_GROUP_PARALLELISM,
+                     label="AI request", **request_options):
+        """Run several prompts with at most max_parallel in flight; returns the started AIJobGroup"""
+        group = AIJobGroup(self, prompts, api_key, model, max_parallel=max_parallel,
+                           label=label, **request_options)
+        group.start()
+        return group
+
+    def active_jobs(self):
+        """Jobs that are queued or running"""
+        with self._jobs_lock:
+            return [job for job in self._jobs if job.is_active()]
+
+    def cancel_all(self):
+        """Cancel every queued or running job"""
+        for job in self.active_jobs():
+            job.cancel()
+
+    def wait_for_done(self, msecs=-1):
+        """Block until all jobs have finished (for shutdown and scripted use)"""
+        return self._pool.waitForDone(msecs)
+
+    def _execute(self, job):
+        """Run a job with retry/backoff - called on a pool thread"""
+        try:
+            if job.is_cancelled():
+                return
+            job.started.emit()
+            self._run_with_retries(job)
+        finally:
+            job._finished = True
+            with self._jobs_lock:
+                self._jobs.discard(job)
+            job.finished.emit()
+
+    def _run_with_retries(self, job):
+        request = job.request
+        transport = job.transport
+
+        if request.use_cache and self._replay_cached(job):
+            return
+
+        if transport is None:
+            job.error_occurred.emit("No Gemini SDK installed. Install google-genai to enable AI features.")
+            return
+
+        for attempt in range(request.max_retries + 1):
+            if job.is_cancelled():
+                return
+
+            if attempt > 0:
+                delay = 2 ** attempt  # Exponential backoff: 2s, 4s, 8s...
+                print(f"[AI ENGINE] '{request.label}' attempt {attempt + 1}/{request.max_retries + 1} in {delay}s")
+                # Wait on the cancel event so Stop takes effect during backoff
+                if job._cancel_event.wait(delay):
+                    return
+
+            # A retry after partial output would duplicate text already shown in the UI
+            streamed_any = False
+            try:
+                full_response = ""
+                last_chunk = None
+                finish_reason = None
+                chunk_count = 0
+
+                for chunk in transport.generate(request):
+                    if job.is_cancelled():
+                        print(f"[AI ENGINE] '{request.label}' cancelled after {chunk_count} chunks")
+                        return
+                    chunk_count += 1
+                    last_chunk = chunk
+                    if chunk['finish_reason']:
+                        finish_reason = chunk['finish_reason']
+                    if chunk['usage']:
+                        job.usage = chunk['usage']
+                    if chunk['text']:
+                        full_response += chunk['text']
+                        streamed_any = True
+                        job.chunk_received.emit(chunk['text'])
+
+                if job.is_cancelled():
+                    return
+
+                print(f"[AI ENGINE] '{request.label}' completed: {chunk_count} chunks, {len(full_response)} chars via {transport.name}")
+
+                if job.usage and job.usage.get('prompt_tokens'):
+                    # Real token counts keep the local prompt-size estimates honest
+                    get_token_estimator().record_usage(len(request.prompt), job.usage['prompt_tokens'])
+
+                if full_response:
+                    # Only complete answers - a MAX_TOKENS or SAFETY cut would be replayed every time
+                    if request.use_cache and finish_reason == 'STOP':
+                        get_response_cache().put(request, full_response, job.usage)
+                    elif request.use_cache:
+                        print(f"[AI ENGINE] '{request.label}' not cached (finish reason {finish_reason or 'UNKNOWN'})")
+                    job.response_received.emit(full_response)
+                else:
+                    job.error_occurred.emit(self._empty_response_message(last_chunk, chunk_count))
+                return
+
+            except Exception as e:
+                if job.is_cancelled():
+                    return
+
+                error_traceback = traceback.format_exc()
+                print(f"[AI ENGINE] '{request.label}' attempt {attempt + 1} failed: {type(e).__name__}: {e}")
+                print(error_traceback)
+
+                retryable = is_retryable_error(e) and not streamed_any
+                if retryable and attempt < request.max_retries:
+                    continue
+
+                if retryable:
+                    job.retry_suggested.emit(
+                        f"AI service temporarily unavailable after {request.max_retries + 1} attempts.\n\n"
+                        f"This appears to be a temporary issue with the Gemini API service. "
+                        f"Please try again in a few moments.\n\n"
+                        f"Original error: {str(e)}"
+                    )
+                else:
+                    job.error_occurred.emit(
+                        f"AI request failed: {describe_error(e)}\n\n"
+                        f"Error type: {type(e).__name__}\n"
+                        f"API: {transport.name}\n"
+                        f"Attempt: {attempt + 1}/{request.max_retries + 1}\n\n"
+                        f"Full traceback:\n{error_traceback}"
+                    )
+                return
+
+    def _replay_cached(self, job):
+        """Answer the job from the response cache through the normal signals; False on a miss"""
+        try:
+            entry = get_response_cache().get(job.request)
+        except Exception as e:
+            print(f"[AI ENGINE] Response cache lookup failed: {e}")
+            return False
+        if not entry or not entry.get('response'):
+            return False
+
+        response_text = entry['response']
+        print(f"[AI ENGINE] '{job.request.label}' answered from response cache ({len(response_text)} chars)")
+        job.cache_hit = True
+        job.usage = entry.get('usage')
+        if job.request.stream:
+            job.chunk_received.emit(response_text)
+        job.response_received.emit(response_text)
+        return True
+
+    def _empty_response_message(self, last_chunk, chunk_count):
+        """Explain why a request finished without any text"""
+        if not last_chunk:
+            return "No response candidates received from AI API"
+
+        finish_reason = last_chunk['finish_reason']
+        details = f"Finish reason: {finish_reason or 'UNKNOWN'}"
+        if last_chunk['safety_ratings']:
+            details += f", Safety ratings: {last_chunk['safety_ratings']}"
+        usage = last_chunk['usage']
+        if usage:
+            details += (f" (Prompt: {usage['prompt_tokens']}, Total: {usage['total_tokens']}, "
+                        f"Thoughts: {usage['thoughts_tokens']} tokens)")
+
+        if finish_reason == 'SAFETY':
+            return (
+                "AI response blocked by safety filters. This may be due to:\n"
+                "• Content in your transcript triggering safety systems\n"
+                "• Try simplifying your prompt or filtering sensitive content\n"
+                f"• Technical details: {details}"
+            )
+        elif finish_reason == 'MAX_TOKENS':
+            return (
+                "AI response truncated due to token limits. Try:\n"
+                "• Reducing transcript length\n"
+                "• Processing fewer annotations at once\n"
+                "• Using a lower thinking budget\n"
+                f"• Technical details: {details}"
+            )
+        elif finish_reason == 'STOP':
+            return (
+                "AI completed processing but returned no content. This may be due to:\n\n"
+                "LIKELY CAUSES:\n"
+                "• Content filtering or safety restrictions\n"
+                "• Prompt too complex or confusing for the AI\n"
+                "• Annotation format issues (missing IDs, malformed text)\n\n"
+                "TRY THESE SOLUTIONS:\n"
+                "• Process fewer annotations per request\n"
+                "• Disable full transcript context to reduce complexity\n"
+                "• Lower the thinking budget\n"
+                "• Check for unusual characters or content in annotations\n\n"
+                f"Technical details: {details}"
+            )
+        return f"No response generated from AI - processed {chunk_count} chunks but no text content\n{details}"
+
+
+class AIJobGroup(QObject):
+    """
+    Fan-out of related prompts (transcript windows, annotation batches) through the engine.
+
+    At most max_parallel jobs are in flight; the next prompt is submitted as soon as one
+    finishes. Results and errors are reported per item by index, in completion order.
+    """
+
+    item_finished = pyqtSignal(int, str)   # index, response text
+    item_failed = pyqtSignal(int, str)     # index, error message
+    progress = pyqtSignal(int, int)        # completed items, total items
+    finished = pyqtSignal()
+
+    def __init__(self, engine, prompts, api_key, model, max_parallel=DEFAULT_GROUP_PARALLELISM,
+                 label="AI request", **request_options):
+        super().__init__()
+        self.engine = engine
+        self.prompts = list(prompts)
+        self.api_key = api_key
+        self.model = model
+        self.max_parallel = max(1, int(max_parallel))
+        self.label = label
+        self.request_options = request_options
+        self.results = {}   # index -> response text
+        self.errors = {}    # index -> error message
+        self._next_index = 0
+        self._jobs = {}     # AIJob -> index, while in flight
+        self._completed = 0
+        self._cancelled = False
+        self._done = False
+
+    def __len__(self):
+        return len(self.prompts)
+
+    def start(self):
+        """Submit the first max_parallel prompts"""
+        print(f"[AI ENGINE] Group '{self.label}': {len(self.prompts)} requests, {self.max_parallel} in parallel")
+        if not self.prompts:
+            self._finish()
+            return
+        while len(self._jobs) < self.max_parallel and self._next_index < len(self.prompts):
+            self._submit_next()
+
+    def _submit_next(self):
+        index = self._next_index
+        self._next_index += 1
+        job = self.engine.submit(self.prompts[index], self.api_key, self.model,
+                                 label=f"{self.label} [{index + 1}/{len(self.prompts)}]",
+                                 **self.request_options)
+        self._jobs[job] = index
+        job.response_received.connect(self._on_response)
+        job.error_occurred.connect(self._on_error)
+        job.retry_suggested.connect(self._on_error)
+        job.finished.connect(self._on_job_finished)
+
+    def _on_response(self, response_text):
+        index = self._jobs.get(self.sender())
+        if index is None or self._cancelled:
+            return
+        self.results[index] = response_text
+        self.item_finished.emit(index, response_text)
+
+    def _on_error(self, error_message):
+        index = self._jobs.get(self.sender())
+        if index is None or self._cancelled:
+            return
+        self.errors[index] = error_message
+        self.item_failed.emit(index, error_message)
+
+    def _on_job_finished(self):
+        job = self.sender()
+        if self._jobs.pop(job, None) is None or self._cancelled:
+            return
+
+        self._completed += 1
+        self.progress.emit(self._completed, len(self.prompts))
+
+        if self._next_index < len(self.prompts):
+            self._submit_next()
+        elif not self._jobs:
+            self._finish()
+
+    def _finish(self):
+        if self._done:
+            return
+        self._done = True
+        print(f"[AI ENGINE] Group '{self.label}' done: {len(self.results)} succeeded, {len(self.errors)} failed")
+        self.finished.emit()
+
+    def cancel(self):
+        """Cancel in-flight jobs and submit nothing further"""
+        self._cancelled = True
+        for job in list(self._jobs):
+            job.cancel()
+        self._jobs = {}
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def is_active(self):
+        """True until every item has completed or the group was cancelled"""
+        return not self._done and not self._cancelled
+
+
+_request_engine = None
+
+
+def get_request_engine():
+    """Get the process-wide AIRequestEngine (create it from the GUI thread)"""
+    global _request_engine
+    if _request_engine is None:
+        _request_engine = AIRequestEngine()
+    return _request_engine
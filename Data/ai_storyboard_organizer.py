@@ -4,257 +4,43 @@ Provides AI-powered organization of annotations into a logical storyboard struct
 """
 
 import os
-import json
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QTextEdit, QPushButton, 
     QLabel, QProgressBar, QMessageBox, QSplitter, QListWidgetItem, QWidget,
     QCheckBox, QSpinBox, QGroupBox, QFormLayout, QComboBox, QTabWidget
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont
 
 try:
-    import google.generativeai as genai
+    from .ai_client_pool import SDK_AVAILABLE
+    from .ai_request_engine import get_request_engine
+    from .context_cache import get_context_cache
+    from .transcript_cache import get_transcript_cache, load_session_input_text
+    from .annotation_store import AnnotationIndex
+    from .annotation_aliases import AnnotationAliases
+    from .prompt_templates import get_prompt_template
+    from .dom_batch_updates import apply_bulk_attribute_update
+    from .streaming_text_sink import StreamingTextSink
+    from .prompt_budget_controls import PromptBudgetControls
+    from .word_count_service import get_word_count_service, duration_from_words, words_for_duration
+    from .response_records import LineRecordStream, iter_line_records, parse_order_line
 except ImportError:
-    genai = None
-    print("Warning: google.generativeai not available. AI features will be disabled.")
+    from ai_client_pool import SDK_AVAILABLE
+    from ai_request_engine import get_request_engine
+    from context_cache import get_context_cache
+    from transcript_cache import get_transcript_cache, load_session_input_text
+    from annotation_store import AnnotationIndex
+    from annotation_aliases import AnnotationAliases
+    from prompt_templates import get_prompt_template
+    from dom_batch_updates import apply_bulk_attribute_update
+    from streaming_text_sink import StreamingTextSink
+    from prompt_budget_controls import PromptBudgetControls
+    from word_count_service import get_word_count_service, duration_from_words, words_for_duration
+    from response_records import LineRecordStream, iter_line_records, parse_order_line
 
-
-class AIWorkerThread(QThread):
-    """Worker thread for AI processing to avoid blocking UI"""
-    response_received = pyqtSignal(str)
-    response_chunk = pyqtSignal(str)  # For streaming chunks
-    error_occurred = pyqtSignal(str)
-    
-    def __init__(self, model, prompt, stream=False):
-        super().__init__()
-        self.model = model
-        self.prompt = prompt
-        self.stream = stream
-    
-    def run(self):
-        try:
-            print(f"[AI WORKER] Starting AI request with model: {self.model._model_name if hasattr(self.model, '_model_name') else 'unknown'}")
-            print(f"[AI WORKER] Streaming enabled: {self.stream}")
-            print(f"[AI WORKER] Prompt length: {len(self.prompt)} characters")
-            
-            # Debug: Show first 500 and last 500 characters of prompt to identify potential issues
-            if len(self.prompt) > 1000:
-                print(f"[AI WORKER] Prompt preview (first 500 chars): {self.prompt[:500]}...")
-                print(f"[AI WORKER] Prompt preview (last 500 chars): ...{self.prompt[-500:]}")
-            else:
-                print(f"[AI WORKER] Full prompt: {self.prompt}")
-            
-            # Check for potential problematic content in prompt
-            problematic_indicators = [
-                "personal information", "private", "confidential", "password", "secret",
-                "hack", "illegal", "violence", "harm", "dangerous", "explicit"
-            ]
-            found_indicators = [indicator for indicator in problematic_indicators if indicator.lower() in self.prompt.lower()]
-            if found_indicators:
-                print(f"[AI WORKER] WARNING: Potentially problematic content indicators found: {found_indicators}")
-            else:
-                print(f"[AI WORKER] No obvious problematic content indicators detected")
-            
-            if self.stream:
-                # Streaming response
-                print(f"[AI WORKER] Sending streaming request...")
-                response = self.model.generate_content(self.prompt, stream=True)
-                print(f"[AI WORKER] Stream response object created: {type(response)}")
-                
-                full_response = ""
-                chunk_count = 0
-                try:
-                    blocked_reasons = []
-                    safety_issues = []
-                    
-                    try:
-                        for chunk in response:
-                            # Check for text content first
-                            try:
-                                if hasattr(chunk, 'text') and chunk.text:
-                                    print(f"[AI WORKER] Received chunk {chunk_count + 1}: {len(chunk.text)} chars")
-                                    full_response += chunk.text
-                                    self.response_chunk.emit(chunk.text)
-                                    chunk_count += 1
-                                    continue
-                            except Exception as text_error:
-                                print(f"[AI WORKER] Error accessing chunk.text: {text_error}")
-                            
-                            # If no text, check candidates for finish_reason and safety info
-                            if hasattr(chunk, 'candidates') and chunk.candidates:
-                                for candidate in chunk.candidates:
-                                    if hasattr(candidate, 'finish_reason'):
-                                        finish_reason = candidate.finish_reason
-                                        print(f"[AI WORKER] Chunk finish_reason: {finish_reason}")
-                                        
-                                        # Map finish reasons to user-friendly messages
-                                        if finish_reason == 1:  # STOP
-                                            blocked_reasons.append("Content generation was stopped (finish_reason: STOP)")
-                                        elif finish_reason == 2:  # MAX_TOKENS
-                                            blocked_reasons.append("Maximum token limit reached")
-                                        elif finish_reason == 3:  # SAFETY
-                                            blocked_reasons.append("Content blocked by safety filters")
-                                        elif finish_reason == 4:  # RECITATION
-                                            blocked_reasons.append("Content blocked due to recitation concerns")
-                                        elif finish_reason == 5:  # OTHER
-                                            blocked_reasons.append("Content blocked for other reasons")
-                                    
-                                    if hasattr(candidate, 'safety_ratings'):
-                                        safety_ratings = candidate.safety_ratings
-                                        print(f"[AI WORKER] Safety ratings: {safety_ratings}")
-                                        for rating in safety_ratings:
-                                            if hasattr(rating, 'category') and hasattr(rating, 'probability'):
-                                                if rating.probability in [3, 4]:  # MEDIUM or HIGH probability
-                                                    safety_issues.append(f"{rating.category.name}: {rating.probability}")
-                    
-                    except StopIteration:
-                        print(f"[AI WORKER] Stream ended (StopIteration) - this is normal behavior")
-                        # StopIteration is normal when the stream ends, not an error
-                        pass
-                    except Exception as iteration_error:
-                        print(f"[AI WORKER] Error during stream iteration: {iteration_error}")
-                        # Only treat non-StopIteration exceptions as errors
-                        error_msg = f"Streaming error: {iteration_error}"
-                        if blocked_reasons:
-                            error_msg += f"\n\nBlocked reasons: {'; '.join(blocked_reasons)}"
-                        if safety_issues:
-                            error_msg += f"\n\nSafety concerns: {'; '.join(safety_issues)}"
-                        
-                        self.error_occurred.emit(error_msg)
-                        return
-                
-                except Exception as stream_e:
-                    print(f"[AI WORKER] Outer streaming error: {stream_e}")
-                    
-                    # Create a more helpful error message
-                    error_msg = f"Streaming setup error: {stream_e}"
-                    if blocked_reasons:
-                        error_msg += f"\n\nBlocked reasons: {'; '.join(blocked_reasons)}"
-                    if safety_issues:
-                        error_msg += f"\n\nSafety concerns: {'; '.join(safety_issues)}"
-                    
-                    self.error_occurred.emit(error_msg)
-                    return
-                
-                print(f"[AI WORKER] Streaming complete. Total chunks: {chunk_count}, Total length: {len(full_response)}")
-                print(f"[AI WORKER] Blocked reasons found: {blocked_reasons}")
-                print(f"[AI WORKER] Safety issues found: {safety_issues}")
-                
-                if chunk_count == 0:
-                    # No content was generated - provide detailed feedback
-                    error_msg = "No response received from AI - the response was empty or blocked"
-                    if blocked_reasons:
-                        error_msg += f"\n\nBlocked reasons: {'; '.join(blocked_reasons)}"
-                    if safety_issues:
-                        error_msg += f"\n\nSafety concerns: {'; '.join(safety_issues)}"
-                    
-                    if blocked_reasons or safety_issues:
-                        error_msg += "\n\nSuggestions:\n• Try rephrasing your request\n• Check if your content violates AI safety guidelines\n• Consider using a different approach or topic\n• Try using gemini-2.5-flash instead of gemini-2.5-pro\n• Reduce the thinking budget or simplify your prompt"
-                    else:
-                        error_msg += "\n\nSuggestions:\n• Check your API key and credits\n• Verify network connectivity\n• Try with a simpler request\n• Try using gemini-2.5-flash instead of gemini-2.5-pro\n• Reduce the transcript context or thinking budget"
-                    
-                    print(f"[AI WORKER] Emitting detailed error: {error_msg}")
-                    self.error_occurred.emit(error_msg)
-                else:
-                    self.response_received.emit(full_response)
-            else:
-                # Single response
-                print(f"[AI WORKER] Sending single request...")
-                response = self.model.generate_content(self.prompt)
-                print(f"[AI WORKER] Single response received: {type(response)}")
-                
-                try:
-                    if hasattr(response, 'text') and response.text:
-                        print(f"[AI WORKER] Response text length: {len(response.text)}")
-                        self.response_received.emit(response.text)
-                    else:
-                        # Check for detailed response info
-                        blocked_reasons = []
-                        safety_issues = []
-                        
-                        if hasattr(response, 'candidates'):
-                            for i, candidate in enumerate(response.candidates):
-                                if hasattr(candidate, 'finish_reason'):
-                                    finish_reason = candidate.finish_reason
-                                    print(f"[AI WORKER] Candidate {i} finish_reason: {finish_reason}")
-                                    
-                                    # Map finish reasons to user-friendly messages
-                                    if finish_reason == 1:  # STOP
-                                        blocked_reasons.append("Content generation was stopped (finish_reason: STOP)")
-                                    elif finish_reason == 2:  # MAX_TOKENS
-                                        blocked_reasons.append("Maximum token limit reached")
-                                    elif finish_reason == 3:  # SAFETY
-                                        blocked_reasons.append("Content blocked by safety filters")
-                                    elif finish_reason == 4:  # RECITATION
-                                        blocked_reasons.append("Content blocked due to recitation concerns")
-                                    elif finish_reason == 5:  # OTHER
-                                        blocked_reasons.append("Content blocked for other reasons")
-                                
-                                if hasattr(candidate, 'safety_ratings'):
-                                    safety_ratings = candidate.safety_ratings
-                                    print(f"[AI WORKER] Safety ratings: {safety_ratings}")
-                                    for rating in safety_ratings:
-                                        if hasattr(rating, 'category') and hasattr(rating, 'probability'):
-                                            if rating.probability in [3, 4]:  # MEDIUM or HIGH probability
-                                                safety_issues.append(f"{rating.category.name}: {rating.probability}")
-                        
-                        # Create user-friendly error message
-                        error_msg = "AI response was empty or blocked"
-                        if blocked_reasons:
-                            error_msg += f"\n\nBlocked reasons: {'; '.join(blocked_reasons)}"
-                        if safety_issues:
-                            error_msg += f"\n\nSafety concerns: {'; '.join(safety_issues)}"
-                        
-                        if blocked_reasons or safety_issues:
-                            error_msg += "\n\nSuggestions:\n• Try rephrasing your request\n• Check if your content violates AI safety guidelines\n• Consider using a different approach or topic"
-                        else:
-                            error_msg += "\n\nSuggestions:\n• Check your API key and credits\n• Verify network connectivity\n• Try with a simpler request"
-                        
-                        print(f"[AI WORKER] {error_msg}")
-                        self.error_occurred.emit(error_msg)
-                        
-                except Exception as response_error:
-                    print(f"[AI WORKER] Error processing response: {response_error}")
-                    self.error_occurred.emit(f"Error processing AI response: {response_error}")
-                    
-        except Exception as e:
-            error_msg = str(e)
-            print(f"[AI WORKER] Exception occurred: {error_msg}")
-            print(f"[AI WORKER] Exception type: {type(e)}")
-            
-            # Handle empty error messages
-            if not error_msg or error_msg.strip() == "":
-                error_msg = f"Unknown error occurred (Exception type: {type(e).__name__})"
-                print(f"[AI WORKER] Empty error message detected, using fallback: {error_msg}")
-            
-            # Add more context to common errors
-            if "API_KEY" in error_msg.upper():
-                error_msg = f"API Key Error: {error_msg}\nPlease check your API key in Data/api_key.txt"
-            elif "PERMISSION" in error_msg.upper():
-                error_msg = f"Permission Error: {error_msg}\nYour API key may not have access to this model"
-            elif "QUOTA" in error_msg.upper() or "LIMIT" in error_msg.upper():
-                error_msg = f"Quota/Rate Limit: {error_msg}\nYou may have exceeded your API limits"
-            elif "NETWORK" in error_msg.upper() or "CONNECTION" in error_msg.upper():
-                error_msg = f"Network Error: {error_msg}\nPlease check your internet connection"
-            elif "SAFETY" in error_msg.upper():
-                error_msg = f"Safety Filter: {error_msg}\nContent may have been blocked by AI safety systems"
-            elif "MODEL" in error_msg.upper() and "NOT_FOUND" in error_msg.upper():
-                error_msg = f"Model Not Found: {error_msg}\nThe AI model may not be available or accessible"
-            elif "INVALID OPERATION" in error_msg.upper() or "RESPONSE.TEXT" in error_msg.upper():
-                error_msg = f"Content Blocked: {error_msg}\nThe AI response was blocked by safety filters or other restrictions"
-            elif "STOPITERATION" in error_msg.upper() or type(e).__name__ == "StopIteration":
-                error_msg = f"Stream Ended Unexpectedly: The AI response stream ended without providing content\nThis may indicate content was blocked or the request was too complex"
-            
-            import traceback
-            traceback.print_exc()
-            
-            # Ensure we never emit an empty error message
-            if not error_msg or error_msg.strip() == "":
-                error_msg = "An unknown error occurred during AI processing. Check the console for details."
-            
-            print(f"[AI WORKER] Final error message being emitted: '{error_msg}'")
-            self.error_occurred.emit(error_msg)
+if not SDK_AVAILABLE:
+    print("Warning: no Gemini SDK available. AI features will be disabled.")
 
 
 class AIStoryboardOrganizer(QDialog):
@@ -269,8 +55,10 @@ class AIStoryboardOrganizer(QDialog):
         self.main_window = main_window
         self.annotations = web_view.annotations if web_view else []
         self.parsed_updates = []
-        self.ai_model = None
-        self.worker_thread = None
+        self.ai_job = None
+        self.context_cache_owner = f"{type(self).__name__}:{id(self)}"  # Server-side caches released on close
+        self.order_stream = None  # Incremental parser for the response being streamed
+        self.id_aliases = AnnotationAliases()  # Short IDs (A1, A2, ...) used in prompts and responses
         self.conversation_history = []
         self.last_response = ""
         
@@ -281,6 +69,16 @@ class AIStoryboardOrganizer(QDialog):
         self.setup_ui()
         self.load_api_key()
         
+        # Live projected prompt size (transcript only counted once it has been extracted)
+        self.budget_controls.set_prompt_source(lambda: self.create_script_prompt(
+            (get_transcript_cache().get_cached(self.web_view) or "") if self.full_transcript_checkbox.isChecked() else "",
+            self.format_annotations_for_ai()
+        ))
+        for checkbox in (self.full_transcript_checkbox, self.custom_prompt_checkbox, self.dividers_checkbox,
+                         self.headers_checkbox, self.length_limit_checkbox):
+            checkbox.toggled.connect(self.budget_controls.schedule_update)
+        self.user_notes.textChanged.connect(self.budget_controls.schedule_update)
+        
     def setup_ui(self):
         """Setup the dialog UI"""
         layout = QVBoxLayout(self)
@@ -333,6 +131,10 @@ class AIStoryboardOrganizer(QDialog):
         self.full_transcript_checkbox.setChecked(True)
         self.full_transcript_checkbox.setToolTip("Sends complete transcript for better context. Uncheck to use only annotation content without any transcript text.")
         context_layout.addWidget(self.full_transcript_checkbox)
+        self.context_cache_checkbox = QCheckBox("Cache context on server")
+        self.context_cache_checkbox.setChecked(False)
+        self.context_cache_checkbox.setToolTip("Upload the transcript and annotation context to Gemini once (kept for 10 minutes) so follow-up requests only send the new instructions")
+        context_layout.addWidget(self.context_cache_checkbox)
         context_layout.addStretch()
         goals_layout.addLayout(context_layout)
         
@@ -374,6 +176,10 @@ class AIStoryboardOrganizer(QDialog):
         self.thinking_budget.setToolTip("Higher values allow more complex reasoning but take longer")
         ai_layout.addRow("Thinking Budget:", self.thinking_budget)
         
+        # Prompt token budget
+        self.budget_controls = PromptBudgetControls(self)
+        ai_layout.addRow("Prompt Budget:", self.budget_controls)
+        
         # Structure options
         structure_group = QGroupBox("Narrative Structure")
         structure_layout = QVBoxLayout(structure_group)
@@ -500,6 +306,9 @@ class AIStoryboardOrganizer(QDialog):
             }
         """)
         ai_response_layout.addWidget(self.debug_display)
+        
+        # Streamed chunks are appended incrementally rather than re-setting the whole text
+        self.debug_sink = StreamingTextSink(self.debug_display)
         self.results_tabs.addTab(ai_response_tab, "🤖 AI Response")
         
         # Organization Tab (secondary - switched to after AI completes)
@@ -520,6 +329,8 @@ class AIStoryboardOrganizer(QDialog):
             }
         """)
         parsed_layout.addWidget(self.parsed_display)
+        self.parsed_sink = StreamingTextSink(self.parsed_display)  # Parsed lines are appended, not re-set
+        self.parsed_lines_shown = 0
         self.results_tabs.addTab(parsed_tab, "📋 Organization")
         
         layout.addWidget(self.results_tabs, 2)  # Give tabs more stretch factor for more height
@@ -643,11 +454,9 @@ class AIStoryboardOrganizer(QDialog):
             if os.path.exists(api_key_path):
                 with open(api_key_path, 'r', encoding='utf-8') as f:
                     api_key = f.read().strip()
-                    if api_key and genai:
-                        genai.configure(api_key=api_key)
-                        # Store API key for dynamic model reconfiguration
+                    if api_key and SDK_AVAILABLE:
+                        # Store API key - the shared client pool configures the SDK on first use
                         self.api_key = api_key
-                        self.ai_model = None  # Will be created dynamically
                         self.status_label.setText("API key loaded successfully")
                     else:
                         self.status_label.setText("No API key found")
@@ -682,185 +491,31 @@ class AIStoryboardOrganizer(QDialog):
             # Fallback to current working directory if path fails (less ideal)
             return os.path.join(os.getcwd(), "api_key.txt")
     
-    def get_full_transcript(self):
-        """Extract full transcript text from HTML with speech titles preserved"""
-        try:
-            # First try the new HTML method
-            if hasattr(self, 'web_view') and self.web_view:
-                # Use QEventLoop to make the async toHtml call synchronous
-                from PyQt6.QtCore import QEventLoop
-                
-                transcript_text = ""
-                loop = QEventLoop()
-                
-                def handle_transcript(html):
-                    nonlocal transcript_text
-                    if html:
-                        from bs4 import BeautifulSoup
-                        
-                        # Parse HTML
-                        soup = BeautifulSoup(html, 'html.parser')
-                        
-                        # Remove CSS and script elements
-                        for element in soup(["style", "script", "head"]):
-                            element.decompose()
-                        
-                        # Extract text with speech titles included
-                        transcript_parts = []
-                        
-                        # Look for speech headers and content sections
-                        speech_headers = soup.find_all('div', class_='speech-header')
-                        
-                        if speech_headers:
-                            # Process each speech header to get title and find corresponding content
-                            for header in speech_headers:
-                                title_elem = header.find(class_='speech-title')
-                                
-                                if title_elem:
-                                    title_text = title_elem.get_text(strip=True)
-                                    
-                                    # Find the corresponding speech content (usually follows the header)
-                                    content_elem = None
-                                    next_sibling = header.find_next_sibling()
-                                    while next_sibling:
-                                        if next_sibling.name == 'div' and 'speech-content' in next_sibling.get('class', []):
-                                            content_elem = next_sibling
-                                            break
-                                        next_sibling = next_sibling.find_next_sibling()
-                                    
-                                    # If no sibling found, look for speech-content within the same parent
-                                    if not content_elem:
-                                        parent = header.find_parent()
-                                        if parent:
-                                            content_elem = parent.find(class_='speech-content')
-                                    
-                                    if content_elem:
-                                        content_text = content_elem.get_text(separator=' ', strip=True)
-                                        if title_text and content_text:
-                                            # Format as "Speaker: content"
-                                            transcript_parts.append(f"{title_text}: {content_text}")
-                                    elif title_text:
-                                        # Just title without content
-                                        transcript_parts.append(title_text)
-                        
-                        # Fallback: Look for speech sections (original logic)
-                        elif soup.find_all('div', class_='speech-section'):
-                            speech_sections = soup.find_all('div', class_='speech-section')
-                            for section in speech_sections:
-                                # Get speech title if available
-                                title_elem = section.find(class_='speech-title')
-                                content_elem = section.find(class_='speech-content')
-                                
-                                if title_elem and content_elem:
-                                    title_text = title_elem.get_text(strip=True)
-                                    content_text = content_elem.get_text(separator=' ', strip=True)
-                                    
-                                    if title_text and content_text:
-                                        # Format as "Speaker: content"
-                                        transcript_parts.append(f"{title_text}: {content_text}")
-                                elif content_elem:
-                                    # Just content without title
-                                    content_text = content_elem.get_text(separator=' ', strip=True)
-                                    if content_text:
-                                        transcript_parts.append(content_text)
-                        else:
-                            # Fallback: look for speech content areas only
-                            speech_contents = soup.find_all(class_="speech-content")
-                            if speech_contents:
-                                for content in speech_contents:
-                                    text = content.get_text(separator=' ', strip=True)
-                                    if text:
-                                        transcript_parts.append(text)
-                            else:
-                                # Final fallback: get all text but clean it up
-                                text = soup.get_text(separator=' ', strip=True)
-                                # Remove extra whitespace
-                                import re
-                                text = re.sub(r'\s+', ' ', text).strip()
-                                transcript_parts.append(text)
-                        
-                        transcript_text = '\n\n'.join(transcript_parts)
-                        
-                        # Debug output
-                        print(f"DEBUG: HTML transcript extraction:")
-                        print(f"  - Found {len(speech_headers)} speech-header divs")
-                        print(f"  - Total transcript parts: {len(transcript_parts)}")
-                        print(f"  - Final transcript length: {len(transcript_text)} characters")
-                        print(f"  - First 500 characters:")
-                        print(transcript_text[:500] + "..." if len(transcript_text) > 500 else transcript_text)
-                    
-                    loop.quit()  # Exit the event loop
-                
-                # Get the HTML content and wait for it
-                self.web_view.page().toHtml(handle_transcript)
-                loop.exec()  # Wait for the callback to complete
-                
-                if transcript_text:
-                    return transcript_text
-            
-            # Fallback to original method if HTML extraction fails or returns empty
-            if hasattr(self.main_window, 'current_session_file') and self.main_window.current_session_file:
-                import json
-                with open(self.main_window.current_session_file, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                    return session_data.get('input', {}).get('text', '')
-                    
-        except Exception as e:
-            print(f"Error getting transcript: {e}")
+    def request_full_transcript(self, callback):
+        """Call callback(transcript_text) once the full transcript with speech titles is available"""
+        def handle_transcript(transcript_text):
+            # Debug output
+            print(f"DEBUG: Transcript extraction:")
+            print(f"  - Final transcript length: {len(transcript_text)} characters")
+            print(f"  - First 500 characters:")
+            print(transcript_text[:500] + "..." if len(transcript_text) > 500 else transcript_text)
             
-        return ""
+            if not transcript_text:
+                # Fallback to the raw session input text if no speech headers were found
+                transcript_text = load_session_input_text(self.main_window)
+            callback(transcript_text)
+        
+        # Cached until the document revision changes; otherwise one async toHtml extraction
+        get_transcript_cache().request_transcript(getattr(self, 'web_view', None), handle_transcript, self.main_window)
     
     def calculate_annotation_word_count(self, annotations_list):
         """Calculate total word count for a list of annotations, excluding headers and strikethrough"""
-        import re
-        total_words = 0
-        
-        for anno in annotations_list:
-            # Skip dividers
-            if anno.get('divider'):
-                continue
-                
-            # Get text from storyboard if available, otherwise use original text
-            if 'storyboard' in anno and 'text' in anno['storyboard']:
-                html_text = anno['storyboard']['text']
-            else:
-                html_text = anno.get('text', '').replace('\n', '<br>')
-            
-            # Extract and remove header text (same patterns as WordCountTimer)
-            header_patterns = [
-                r'<div><b[^>]*>(.*?)</b></div>',                 # <div><b>Header</b></div>
-                r'<p[^>]*><b[^>]*>(.*?)</b></p>',                # <p><b>Header</b></p>
-                r'<b[^>]*>(.*?)</b>',                            # <b>Header</b>
-                r'<span[^>]*style=[\'"][^"\']*font-weight:700[^"\']*[\'"]>(.*?)</span>',  # styled span with font-weight:700
-                r'<h[1-6][^>]*>(.*?)</h[1-6]>'                   # <h1>-<h6> tags
-            ]
-            
-            # Remove headers from text
-            html_without_headers = html_text
-            for pattern in header_patterns:
-                html_without_headers = re.sub(pattern, '', html_without_headers)
-            
-            # Get all words by removing HTML tags
-            plain_text = re.sub(r'<[^>]+>', '', html_without_headers)
-            all_words = len(re.findall(r'\b\w+\b', plain_text))
-            
-            # Get strikethrough words to subtract
-            strikethrough_words = 0
-            strikethrough_segments = re.findall(r'<s style="color:#FF9999;">(.*?)</s>', html_without_headers)
-            for segment in strikethrough_segments:
-                clean_segment = re.sub(r'<[^>]+>', '', segment)
-                words_in_segment = len(re.findall(r'\b\w+\b', clean_segment))
-                strikethrough_words += words_in_segment
-            
-            # Calculate net words (excluding headers and strikethrough)
-            words_in_annotation = all_words - strikethrough_words
-            total_words += words_in_annotation
-        
-        return total_words
+        # Cached per annotation until its storyboard text changes
+        return get_word_count_service().total(annotations_list)
     
     def calculate_duration_from_words(self, word_count):
         """Calculate average speech duration from word count (uses 200 WPM like WordCountTimer)"""
-        return (word_count / 200) * 60  # seconds
+        return duration_from_words(word_count)
     
     def format_duration(self, seconds):
         """Format seconds into m:ss format"""
@@ -886,7 +541,7 @@ class AIStoryboardOrganizer(QDialog):
                     text = text[:200] + "..."
                 
                 # Start with basic annotation entry
-                entry = f"{anno['id']}: \"{text}\""
+                entry = f"{self.id_aliases.alias(anno['id'])}: \"{text}\""
                 
                 # Add metadata in structured format
                 metadata = []
@@ -925,38 +580,32 @@ class AIStoryboardOrganizer(QDialog):
         print(f"🚧🚧🚧 [AI STORYBOARD] Filtered out {divider_count} dividers from AI context 🚧🚧🚧")
         return "\n".join(formatted)
     
-    def create_ai_model(self):
-        """Create AI model with current settings"""
+    def submit_ai_request(self, prompt, label):
+        """Submit a prompt to the shared AI request engine with current settings"""
         if not hasattr(self, 'api_key') or not self.api_key:
             print("[AI MODEL] No API key available")
             return None
             
         selected_model = self.model_selector.currentText()
         thinking_budget = self.thinking_budget.value()
+        use_streaming = self.streaming_checkbox.isChecked()
         
-        print(f"[AI MODEL] Creating model: {selected_model}")
+        print(f"[AI MODEL] Model: {selected_model}")
         print(f"[AI MODEL] Thinking budget: {thinking_budget}")
-        
-        try:
-            generation_config = {
-                "temperature": 0.3,
-                "top_p": 0.8,
-                # Remove max_output_tokens limit - let Gemini use its full capacity
-            }
-            print(f"[AI MODEL] Generation config: {generation_config}")
-            
-            model = genai.GenerativeModel(
-                model_name=selected_model,
-                generation_config=generation_config
-            )
-            print(f"[AI MODEL] Model created successfully: {type(model)}")
-            return model
-        except Exception as e:
-            print(f"[AI MODEL] Error creating model: {e}")
-            print(f"[AI MODEL] Error type: {type(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
+        print(f"[AI MODEL] Streaming enabled: {use_streaming}")
+        context_cache = self.context_cache_checkbox.isChecked()
+        
+        # Any previous request's output is no longer wanted
+        if self.ai_job:
+            self.ai_job.cancel()
+        
+        self.ai_job = get_request_engine().submit(prompt, self.api_key, selected_model,
+                                                  thinking_budget=thinking_budget,
+                                                  temperature=0.3, top_p=0.8,
+                                                  stream=use_streaming, label=label,
+                                                  context_cache=context_cache,
+                                                  cache_owner=self.context_cache_owner)
+        return self.ai_job
     
     def process_with_ai(self):
         """Send the request to AI for processing"""
@@ -1008,43 +657,38 @@ class AIStoryboardOrganizer(QDialog):
             
             self.status_label.setText("Initializing AI...")
             
-            # Create AI model with current settings
-            self.ai_model = self.create_ai_model()
-            if not self.ai_model:
+            if not getattr(self, 'api_key', None) or not SDK_AVAILABLE:
                 error_msg = "AI model not configured. Please check your API key file."
                 self.status_label.setText(f"❌ {error_msg}")
                 self.status_label.setStyleSheet("color: #EF4444;")
                 QMessageBox.warning(self, "Configuration Error", error_msg)
                 return
             
+        except Exception as e:
+            error_msg = f"Initialization failed: {str(e)}"
+            self.status_label.setText(f"❌ {error_msg}")
+            self.status_label.setStyleSheet("color: #EF4444;")
+            QMessageBox.critical(self, "Initialization Error", error_msg)
+            return
+        
+        # Get full transcript only if checkbox is checked
+        if self.full_transcript_checkbox.isChecked():
             self.status_label.setText("Loading transcript...")
-            
-            # Get full transcript only if checkbox is checked
-            full_text = ""
-            if self.full_transcript_checkbox.isChecked():
-                full_text = self.get_full_transcript()
-                if not full_text:
-                    error_msg = "No transcript text found in current session. Please load a transcript file first."
-                    self.status_label.setText(f"❌ {error_msg}")
-                    self.status_label.setStyleSheet("color: #EF4444;")
-                    QMessageBox.warning(self, "Data Error", error_msg)
-                    return
-                
-                # Check if transcript is large and warn user
-                if len(full_text) > 500000:
-                    msg = QMessageBox(self)
-                    msg.setWindowTitle("Large Transcript Warning")
-                    msg.setText("The transcript is very large (over 500,000 characters).")
-                    msg.setInformativeText("Including full transcript will consume a significant number of tokens. Do you want to continue?")
-                    msg.setDetailedText(f"Transcript size: {len(full_text):,} characters\n\n"
-                                       f"This will consume substantial API tokens and may be expensive. "
-                                       f"Consider unchecking 'Include full transcript' for a more economical approach.")
-                    msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-                    msg.setDefaultButton(QMessageBox.StandardButton.No)
-                    msg.setIcon(QMessageBox.Icon.Warning)
-                    
-                    if msg.exec() == QMessageBox.StandardButton.No:
-                        return
+            self.process_btn.setEnabled(False)  # Until the transcript arrives
+            self.request_full_transcript(self.process_with_transcript)
+        else:
+            self.process_with_transcript("")
+    
+    def process_with_transcript(self, full_text):
+        """Continue processing once the transcript context (or "" when it is not included) is available"""
+        self.process_btn.setEnabled(True)
+        try:
+            if self.full_transcript_checkbox.isChecked() and not full_text:
+                error_msg = "No transcript text found in current session. Please load a transcript file first."
+                self.status_label.setText(f"❌ {error_msg}")
+                self.status_label.setStyleSheet("color: #EF4444;")
+                QMessageBox.warning(self, "Data Error", error_msg)
+                return
             
             self.status_label.setText("Formatting annotations...")
             
@@ -1069,63 +713,104 @@ class AIStoryboardOrganizer(QDialog):
         try:
             self.status_label.setText("Preparing AI prompt...")
             
-            # Get user notes
-            user_notes = self.user_notes.toPlainText().strip()
+            # Build the prompt, holding it to the token budget (trimming transcript context if allowed)
+            prompt = self.budget_controls.apply_budget(
+                lambda context: self.create_script_prompt(context, annotations_list), full_text)
+            if not prompt:
+                self.status_label.setText("Cancelled - prompt over token budget")
+                self.status_label.setStyleSheet("color: #666;")
+                return
+
+            # Show progress bar and update status
+            self.progress_bar.show()
+            self.progress_bar.setFormat("AI is analyzing annotations...")
+            self.process_btn.setEnabled(False)
+            self.status_label.setText("Sending request to AI...")
+            self.debug_sink.clear()
+            self.order_stream = None
+            self.parsed_display.clear()
+            
+            # Submit to the shared AI request engine (streaming per checkbox)
+            job = self.submit_ai_request(prompt, "AI Generate Script")
+            job.response_received.connect(self.on_ai_response)
+            job.chunk_received.connect(self.on_ai_response_chunk)
+            job.error_occurred.connect(self.on_ai_error)
+            job.retry_suggested.connect(self.on_ai_error)
             
-            # Get AI configuration settings
-            use_full_transcript = self.full_transcript_checkbox.isChecked()
-            thinking_budget = self.thinking_budget.value()
-            use_dividers = self.dividers_checkbox.isChecked()
-            use_headers = self.headers_checkbox.isChecked()
-            use_length_limit = self.length_limit_checkbox.isChecked()
-            target_minutes = self.length_minutes.value()
-            target_seconds = self.length_seconds.value()
-            total_target_seconds = (target_minutes * 60) + target_seconds
+        except Exception as e:
+            error_msg = f"Failed to start AI processing: {str(e)}"
+            self.status_label.setText(f"❌ {error_msg}")
+            self.status_label.setStyleSheet("color: #EF4444;")
+            self.progress_bar.setVisible(False)
+            self.process_btn.setEnabled(True)
+            QMessageBox.critical(self, "Processing Error", f"{error_msg}\n\nPlease check your API key and network connection.")
+            print(f"[AI STORYBOARD ERROR] {error_msg}")
+            import traceback
+            traceback.print_exc()
+    
+    def create_script_prompt(self, transcript_context, annotations_list):
+        """Build the Generate Script prompt from the current settings"""
+        # Get user notes
+        user_notes = self.user_notes.toPlainText().strip()
+        
+        # Get AI configuration settings
+        use_full_transcript = self.full_transcript_checkbox.isChecked()
+        thinking_budget = self.thinking_budget.value()
+        use_dividers = self.dividers_checkbox.isChecked()
+        use_headers = self.headers_checkbox.isChecked()
+        use_length_limit = self.length_limit_checkbox.isChecked()
+        target_minutes = self.length_minutes.value()
+        target_seconds = self.length_seconds.value()
+        total_target_seconds = (target_minutes * 60) + target_seconds
+        
+        # Prepare transcript context
+        if use_full_transcript and transcript_context:
+            context_note = "(complete transcript provided for full context)"
+        else:
+            transcript_context = ""
+            context_note = "(transcript context disabled - only using annotation content)"
+        
+        # Calculate current word count and duration info for length limit
+        length_constraint_info = ""
+        if use_length_limit:
+            # Calculate word count of all available annotations
+            total_word_count = self.calculate_annotation_word_count(self.annotations)
+            current_duration_seconds = self.calculate_duration_from_words(total_word_count)
+            current_duration_formatted = self.format_duration(current_duration_seconds)
+            target_duration_formatted = self.format_duration(total_target_seconds)
             
-            # Prepare transcript context
-            if use_full_transcript:
-                transcript_context = full_text
-                context_note = "(complete transcript provided for full context)"
-            else:
-                transcript_context = ""
-                context_note = "(transcript context disabled - only using annotation content)"
+            # Calculate target word count
+            target_word_count = words_for_duration(total_target_seconds)
             
-            # Calculate current word count and duration info for length limit
-            length_constraint_info = ""
-            if use_length_limit:
-                # Calculate word count of all available annotations
-                total_word_count = self.calculate_annotation_word_count(self.annotations)
-                current_duration_seconds = self.calculate_duration_from_words(total_word_count)
-                current_duration_formatted = self.format_duration(current_duration_seconds)
-                target_duration_formatted = self.format_duration(total_target_seconds)
-                
-                # Calculate target word count
-                target_word_count = int((total_target_seconds / 60) * 200)  # 200 WPM
-                
-                length_constraint_info = f"""
+            length_constraint_info = f"""
 SCRIPT LENGTH TARGET: {target_duration_formatted} (approximately {target_word_count} words)
 Current available content: {total_word_count} words ({current_duration_formatted})
 
 IMPORTANT: Select annotations to match the target duration. You can use fewer annotations than available to meet the length requirement.
 """
-            
-            # Check if using custom prompt mode
-            use_custom_prompt = self.custom_prompt_checkbox.isChecked()
-            
-            if use_custom_prompt:
-                # Custom prompt mode - just use user's instructions with minimal structure
-                prompt = f"""<thinking>
-The user wants you to organize annotations according to their custom instructions. Follow their specific requirements exactly.
+        
+        # Check if using custom prompt mode
+        use_custom_prompt = self.custom_prompt_checkbox.isChecked()
+        
+        # Stable sections first (instructions, transcript, annotations) so follow-ups and
+        # re-runs share a cacheable prefix; goals, length targets and budget go last
+        transcript_section = f"CONTEXT - Full transcript for reference {context_note}:\n{transcript_context}" if transcript_context else ""
+        annotations_section = f"""AVAILABLE ANNOTATIONS TO ORGANIZE:
+Each annotation includes: ID, quoted text, and metadata (notes, favorite status, tags, themes).
+- note: User's explanatory comment about why this section was highlighted
+- favorite: Whether user marked this as particularly important (true/false)
+- tags: User-assigned categories for this content
+- theme/secondary-theme: User-assigned thematic categories
 
-Budget: {thinking_budget} tokens for reasoning about how to best fulfill their request.
+{annotations_list}"""
+        
+        if use_custom_prompt:
+            # Custom prompt mode - just use user's instructions with minimal structure
+            instructions = f"""<thinking>
+The user wants you to organize annotations according to their custom instructions. Follow their specific requirements exactly.
 </thinking>
 
-{user_notes if user_notes else "Organize the annotations as requested."}
-
-{f"CONTEXT - Full transcript for reference {context_note}:\n{transcript_context}\n\n" if transcript_context else ""}AVAILABLE ANNOTATIONS TO ORGANIZE:
-Each annotation includes: ID, quoted text, and metadata (notes, favorite status, tags, themes).
-
-{annotations_list}
+The user's instructions are given at the end, after the annotations.
 
 OPTIONAL ORGANIZATIONAL TOOLS:
 
@@ -1134,27 +819,29 @@ DIVIDER :: "Section Name" :: Order#X :: #color
 Available colors: #fff4c9 (yellow), #d7ffb8 (green), #ffcccb (red), #e6ccff (purple), #ccf2ff (blue)
 
 HEADERS: Add quick couple-word notes on why an annotation was selected. Use sparingly:
-complete-annotation-id-here :: Order#X :: HEADER :: "Brief note"
+annotation-id-here :: Order#X :: HEADER :: "Brief note"
 
 RESPONSE FORMAT:
 Respond with annotation IDs and order numbers, one per line:
 
 For annotations (most common):
-complete-annotation-id-here :: Order#0
+annotation-id-here :: Order#0
 
 For annotations with headers (use sparingly):
-complete-annotation-id-here :: Order#1 :: HEADER :: "Brief note"
+annotation-id-here :: Order#1 :: HEADER :: "Brief note"
 
 For dividers:
 DIVIDER :: "Section Name" :: Order#X :: #color
 
-CRITICAL: You MUST use the complete annotation ID exactly as provided in the list above. Do NOT truncate, shorten, or modify the IDs in any way."""
-            else:
-                # Standard video script prompt
-                prompt = f"""<thinking>
-You are organizing interview/transcript annotations into a coherent video script. Take time to analyze the content deeply and consider multiple narrative approaches.
+CRITICAL: You MUST use the annotation IDs (short codes like A12) exactly as provided in the annotation list. Do NOT invent or modify the IDs in any way."""
 
-Budget: {thinking_budget} tokens for reasoning about the best narrative structure.
+            request = f"""{user_notes if user_notes else "Organize the annotations as requested."}
+
+Budget: {thinking_budget} tokens for reasoning about how to best fulfill the request."""
+        else:
+            # Standard video script prompt
+            instructions = f"""<thinking>
+You are organizing interview/transcript annotations into a coherent video script. Take time to analyze the content deeply and consider multiple narrative approaches.
 
 Consider:
 1. What are the key themes and emotional beats in this content?
@@ -1162,25 +849,11 @@ Consider:
 3. What logical progression will build engagement and lead to a satisfying conclusion?
 4. How do the user's annotations (with their notes, tags, favorites, and themes) guide the narrative?
 5. What story arc will resonate most with the intended audience?
-{f"6. How can we select the most impactful content to meet the target duration of {self.format_duration(total_target_seconds)}?" if use_length_limit else ""}
 
 Think through multiple possible organizations before settling on the best one.
 </thinking>
 
 You are organizing interview/transcript annotations into a coherent video script.
-{length_constraint_info}
-
-{f"CONTEXT - Full transcript for reference {context_note}:\n{transcript_context}\n\n" if transcript_context else ""}AVAILABLE ANNOTATIONS TO ORGANIZE:
-Each annotation includes: ID, quoted text, and metadata (notes, favorite status, tags, themes).
-- note: User's explanatory comment about why this section was highlighted
-- favorite: Whether user marked this as particularly important (true/false)
-- tags: User-assigned categories for this content
-- theme/secondary-theme: User-assigned thematic categories
-
-{annotations_list}
-
-USER'S VIDEO GOALS AND NOTES:
-{user_notes if user_notes else "No specific goals provided - create a logical narrative flow"}
 
 TASK: Create a logical narrative flow for a video. Consider:
 - Opening hooks and context setting
@@ -1192,7 +865,7 @@ TASK: Create a logical narrative flow for a video. Consider:
 - Pay special attention to favorited annotations (favorite: true) as key moments
 - Use theme information to group related content
 - User notes provide context about why each section was highlighted
-{f"- CRITICAL: Select annotations that will result in approximately {target_word_count} words total to meet the {target_duration_formatted} target duration" if use_length_limit else ""}
+- The user's video goals and any length target are given at the end, after the annotations
 
 {f'''
 ADVANCED FEATURES ENABLED:
@@ -1215,68 +888,116 @@ Examples:
 RESPONSE FORMAT:
 You can mix annotations, headers, and dividers. Respond with one of these per line:
 
-CRITICAL: You MUST use the complete annotation ID exactly as provided in the list above. Do NOT truncate, shorten, or modify the IDs in any way.
+CRITICAL: You MUST use the annotation IDs (short codes like A12) exactly as provided in the annotation list. Do NOT invent or modify the IDs in any way.
 
 For annotations (MOST COMMON):
-complete-annotation-id-here :: Order#0
+annotation-id-here :: Order#0
 
 {f"""
 For annotations with headers (use sparingly):
-complete-annotation-id-here :: Order#1 :: HEADER :: "Production Note"
+annotation-id-here :: Order#1 :: HEADER :: "Production Note"
 """ if use_headers else ""}
 {f"""
 For dividers:
 DIVIDER :: "Section Name" :: Order#X :: #color
 """ if use_dividers else ""}
 
-{f"Remember: Use headers sparingly - only when they add genuine production value." if use_headers else ""}
+{f"Remember: Use headers sparingly - only when they add genuine production value." if use_headers else ""}"""
+
+            request = f"""USER'S VIDEO GOALS AND NOTES:
+{user_notes if user_notes else "No specific goals provided - create a logical narrative flow"}
+{length_constraint_info}
+{f"- CRITICAL: Select annotations that will result in approximately {target_word_count} words total to meet the {target_duration_formatted} target duration" if use_length_limit else ""}
+
+Budget: {thinking_budget} tokens for reasoning about the best narrative structure.
 
 Use actual annotation IDs from the list above. You don't need to use all annotations - only include the ones that fit the narrative.
 Do not include any explanations, comments, or other text."""
-
-            # Show progress bar and update status
-            self.progress_bar.show()
-            self.progress_bar.setFormat("AI is analyzing annotations...")
-            self.process_btn.setEnabled(False)
-            self.status_label.setText("Sending request to AI...")
-            self.debug_display.clear()
-            self.parsed_display.clear()
-            
-            # Create and start worker thread with streaming option
-            use_streaming = self.streaming_checkbox.isChecked()
-            self.worker_thread = AIWorkerThread(self.ai_model, prompt, stream=use_streaming)
-            self.worker_thread.response_received.connect(self.on_ai_response)
-            self.worker_thread.response_chunk.connect(self.on_ai_response_chunk)
-            self.worker_thread.error_occurred.connect(self.on_ai_error)
-            self.worker_thread.start()
-            
-        except Exception as e:
-            error_msg = f"Failed to start AI processing: {str(e)}"
-            self.status_label.setText(f"❌ {error_msg}")
-            self.status_label.setStyleSheet("color: #EF4444;")
-            self.progress_bar.setVisible(False)
-            self.process_btn.setEnabled(True)
-            QMessageBox.critical(self, "Processing Error", f"{error_msg}\n\nPlease check your API key and network connection.")
-            print(f"[AI STORYBOARD ERROR] {error_msg}")
-            import traceback
-            traceback.print_exc()
+        
+        prompt = get_prompt_template('generate_script').render(instructions, transcript_section, annotations_section, request)
+        
+        return prompt
     
     def on_ai_response_chunk(self, chunk_text):
         """Handle streaming AI response chunks"""
-        # Update progress bar to show AI is generating
-        self.progress_bar.setFormat("AI is generating script organization...")
+        # Append chunk to debug display (painted on the sink's next tick)
+        self.debug_sink.append(chunk_text)
         
-        # Append chunk to debug display
-        current_text = self.debug_display.toPlainText()
-        self.debug_display.setPlainText(current_text + chunk_text)
+        # Parse each ordering line as soon as it is complete and preview it live
+        if self.order_stream is None:
+            self.order_stream = LineRecordStream()
+            self.reset_parsed_results()
+        for line in self.order_stream.feed(chunk_text):
+            self.add_order_record(line)
+        self.show_new_parsed_lines()
         
-        # Auto-scroll to bottom
-        cursor = self.debug_display.textCursor()
-        cursor.movePosition(cursor.MoveOperation.End)
-        self.debug_display.setTextCursor(cursor)
+        # Update progress bar to show AI is generating
+        found = len(self.parsed_updates) + len(self.parsed_dividers)
+        self.progress_bar.setFormat(f"AI is generating script organization... {found} items so far" if found
+                                    else "AI is generating script organization...")
+    
+    def reset_parsed_results(self):
+        """Clear parsed orderings, headers and dividers before parsing a new response"""
+        self.parsed_updates = []
+        self.parsed_headers = {}  # annotation_id -> header_text
+        self.parsed_dividers = []  # (order, title, color)
+        self.parsed_lines = []
+        self.annotation_index = AnnotationIndex(self.annotations)  # Lookups while this response is parsed
+        self.parsed_lines_shown = 0
+        self.parsed_sink.clear()
+    
+    def show_new_parsed_lines(self):
+        """Append the parsed lines not shown yet to the organization preview"""
+        new_lines = self.parsed_lines[self.parsed_lines_shown:]
+        if new_lines:
+            self.parsed_sink.append(("\n" if self.parsed_lines_shown else "") + "\n".join(new_lines))
+            self.parsed_lines_shown = len(self.parsed_lines)
+    
+    def add_order_record(self, line):
+        """Parse one ordering line into the parsed results and the preview lines"""
+        try:
+            record = parse_order_line(line)
+            if record is None:
+                return
+            
+            if record['type'] == 'divider':
+                self.parsed_dividers.append((record['order'], record['title'], record['color']))
+                self.parsed_lines.append(f"📁 Divider #{record['order']}: {record['title']}")
+                return
+            
+            anno_id = self.id_aliases.resolve(record['id'])  # Prompts list short aliases
+            order_num = record['order']
+            header_text = record['header']
+            
+            # Validate annotation ID exists, correcting truncated or mistyped IDs
+            matching_anno = self.annotation_index.get(anno_id)
+            corrected_note = ""
+            if not matching_anno and not self.id_aliases.is_alias(anno_id):  # An unknown alias is not a typo
+                corrected_id = self.annotation_index.resolver().resolve(anno_id)
+                if corrected_id:
+                    print(f"DEBUG: Corrected unknown ID '{anno_id}' to '{corrected_id}'")
+                    corrected_note = f" (corrected from {anno_id})"
+                    anno_id = corrected_id
+                    matching_anno = self.annotation_index.get(anno_id)
+            
+            if header_text:
+                self.parsed_headers[anno_id] = header_text
+            
+            if matching_anno:
+                self.parsed_updates.append((anno_id, order_num))
+                # Show preview with truncated text
+                preview_text = matching_anno['text'][:100] + "..." if len(matching_anno['text']) > 100 else matching_anno['text']
+                header_preview = f" [{header_text}]" if header_text else ""
+                self.parsed_lines.append(f"Order #{order_num}: {preview_text}{header_preview}{corrected_note}")
+            else:
+                self.parsed_lines.append(f"Warning - Unknown ID: {anno_id}")
+        except Exception as e:
+            self.parsed_lines.append(f"Warning - Parse error on line: {line}")
     
     def on_ai_response(self, response_text):
         """Handle AI response"""
+        self.debug_sink.flush()
+        
         # Hide progress bar
         self.progress_bar.hide()
         self.process_btn.setEnabled(True)
@@ -1292,67 +1013,21 @@ Do not include any explanations, comments, or other text."""
             "content": response_text
         })
         
-        # Parse the response
-        self.parsed_updates = []
-        self.parsed_headers = {}  # annotation_id -> header_text
-        self.parsed_dividers = []  # (order, title, color)
-        parsed_lines = []
-        
-        for line in response_text.strip().split('\n'):
-            if '::' in line:
-                try:
-                    parts = [p.strip() for p in line.split('::')]
-                    
-                    # Handle dividers: DIVIDER :: "Section Name" :: Order#X :: #color
-                    if parts[0] == 'DIVIDER' and len(parts) >= 4:
-                        section_name = parts[1].strip('"')
-                        order_str = parts[2].strip()
-                        color = parts[3].strip()
-                        order_num = int(order_str.replace('Order#', ''))
-                        
-                        self.parsed_dividers.append((order_num, section_name, color))
-                        parsed_lines.append(f"📁 Divider #{order_num}: {section_name}")
-                    
-                    # Handle annotations with optional headers
-                    elif len(parts) >= 2:
-                        anno_id = parts[0].strip()
-                        order_str = parts[1].strip()
-                        order_num = int(order_str.replace('Order#', ''))
-                        
-                        # Check for header
-                        header_text = None
-                        if len(parts) >= 4 and parts[2].strip() == 'HEADER':
-                            header_text = parts[3].strip('"')
-                            # Handle case where AI incorrectly included HTML
-                            if header_text.startswith('<div>') and header_text.endswith('</div>'):
-                                # Extract text from <div><b style='background-color: #ffff7f;'>Text</b></div>
-                                import re
-                                match = re.search(r'<b[^>]*>([^<]+)</b>', header_text)
-                                if match:
-                                    header_text = match.group(1)
-                            self.parsed_headers[anno_id] = header_text
-                        
-                        # Validate annotation ID exists
-                        matching_anno = None
-                        for anno in self.annotations:
-                            if anno['id'] == anno_id:
-                                matching_anno = anno
-                                break
-                        
-                        if matching_anno:
-                            self.parsed_updates.append((anno_id, order_num))
-                            # Show preview with truncated text
-                            preview_text = matching_anno['text'][:100] + "..." if len(matching_anno['text']) > 100 else matching_anno['text']
-                            header_preview = f" [{header_text}]" if header_text else ""
-                            parsed_lines.append(f"Order #{order_num}: {preview_text}{header_preview}")
-                        else:
-                            parsed_lines.append(f"Warning - Unknown ID: {anno_id}")
-                except Exception as e:
-                    parsed_lines.append(f"Warning - Parse error on line: {line}")
+        # Records closed while streaming are already parsed - only the tail remains
+        stream = self.order_stream
+        self.order_stream = None
+        if stream is not None and stream.text() == response_text:
+            for line in stream.finish():
+                self.add_order_record(line)
+        else:
+            self.reset_parsed_results()
+            for line in iter_line_records(response_text.strip()):
+                self.add_order_record(line)
+        parsed_lines = self.parsed_lines
         
-        # Display parsed results
-        if parsed_lines:
-            self.parsed_display.setPlainText("\n".join(parsed_lines))
+        # Display parsed results (lines already shown while streaming stay in place)
+        self.show_new_parsed_lines()
+        self.parsed_sink.flush()
         
         # Update status and enable Create Script button
         total_items = len(self.parsed_updates) + len(self.parsed_dividers)
@@ -1379,6 +1054,9 @@ Do not include any explanations, comments, or other text."""
     
     def on_ai_error(self, error_message):
         """Handle AI processing error"""
+        self.debug_sink.discard()
+        self.order_stream = None
+        
         # Hide progress bar on error
         self.progress_bar.hide()
         self.process_btn.setEnabled(True)
@@ -1533,98 +1211,75 @@ Do not include any explanations, comments, or other text."""
                 print(f"[AI STORYBOARD] Warning: Cannot access main window annotations")
                 main_annotations = None
             
-            # Update DOM attributes
+            # Update DOM attributes - all orders in one script, verified in the same pass
             print(f"🚀🚀🚀 [AI STORYBOARD] Starting DOM updates... 🚀🚀🚀")
-            for anno_id, order_num in self.parsed_updates:
-                js_code = f'''
-                (function() {{
-                    const spans = document.querySelectorAll('[data-annotation-id="{anno_id}"]');
-                    let updated_count = 0;
-                    spans.forEach(span => {{
-                        const old_order = span.getAttribute('data-order');
-                        span.setAttribute('data-order', '{order_num}');
-                        updated_count++;
-                        console.log('🎯 AI STORYBOARD: Set order {order_num} for annotation {anno_id} (was: ' + old_order + ')');
-                    }});
-                    return {{
-                        spans_found: spans.length,
-                        updated_count: updated_count,
-                        annotation_id: "{anno_id}",
-                        new_order: "{order_num}"
-                    }};
-                }})();
-                '''
-                
-                def handle_dom_result(result):
-                    if result:
-                        print(f"🔍🔍🔍 [AI STORYBOARD] DOM UPDATE RESULT: {result} 🔍🔍🔍")
-                        if result.get('spans_found', 0) > 0:
-                            print(f"✅✅✅ [AI STORYBOARD] Successfully updated {result['spans_found']} DOM spans for {result['annotation_id']} -> order {result['new_order']} ✅✅✅")
-                        else:
-                            print(f"❌❌❌ [AI STORYBOARD] NO DOM SPANS FOUND for {result['annotation_id']} ❌❌❌")
-                    else:
-                        print(f"❌❌❌ [AI STORYBOARD] DOM update returned None for {anno_id} ❌❌❌")
-                
-                self.web_view.page().runJavaScript(js_code, handle_dom_result)
-                print(f"📤📤📤 [AI STORYBOARD] DOM update sent: {anno_id} -> order {order_num} 📤📤📤")
             
-            # Add a verification step to check that all DOM updates actually took effect
-            print(f"🔍🔍🔍 [AI STORYBOARD] Verifying all DOM updates took effect... 🔍🔍🔍")
-            verification_js = f'''
-            (function() {{
-                const updates = {json.dumps(self.parsed_updates)};
-                const results = [];
-                
-                updates.forEach(([anno_id, expected_order]) => {{
-                    const spans = document.querySelectorAll('[data-annotation-id="' + anno_id + '"]');
-                    spans.forEach(span => {{
-                        const actual_order = span.getAttribute('data-order');
-                        results.push({{
-                            annotation_id: anno_id,
-                            expected_order: expected_order,
-                            actual_order: actual_order,
-                            matches: actual_order == expected_order,
-                            span_text: span.textContent.substring(0, 50) + '...'
-                        }});
-                    }});
-                }});
-                
-                return results;
-            }})();
-            '''
-            
-            def handle_verification_result(results):
-                if results:
-                    print(f"📊📊📊 [AI STORYBOARD] DOM VERIFICATION RESULTS ({len(results)} spans checked): 📊📊📊")
-                    matches = 0
-                    mismatches = 0
-                    for result in results:
-                        if result['matches']:
-                            matches += 1
-                            print(f"✅ {result['annotation_id']}: order {result['actual_order']} ✓ - {result['span_text']}")
-                        else:
-                            mismatches += 1
-                            print(f"❌ {result['annotation_id']}: expected {result['expected_order']}, got {result['actual_order']} - {result['span_text']}")
-                    
-                    print(f"📈📈📈 [AI STORYBOARD] DOM VERIFICATION SUMMARY: {matches} matches, {mismatches} mismatches 📈📈📈")
-                else:
-                    print(f"❌❌❌ [AI STORYBOARD] DOM verification returned no results ❌❌❌")
+            def handle_dom_summary(summary):
+                if not summary:
+                    print(f"❌❌❌ [AI STORYBOARD] Bulk DOM update returned no summary ❌❌❌")
+                    return
+                print(f"📈📈📈 [AI STORYBOARD] DOM UPDATE SUMMARY: {summary['updated_annotations']}/{summary['requested']} annotations, "
+                      f"{summary['updated_spans']} spans, {len(summary['mismatches'])} mismatches 📈📈📈")
+                for missing_id in summary['missing_ids']:
+                    print(f"❌❌❌ [AI STORYBOARD] NO DOM SPANS FOUND for {missing_id} ❌❌❌")
+                for mismatch_id in summary['mismatches']:
+                    print(f"❌ {mismatch_id}: data-order did not take effect")
             
-            self.web_view.page().runJavaScript(verification_js, handle_verification_result)
+            apply_bulk_attribute_update(self.web_view, 'data-order', self.parsed_updates, handle_dom_summary)
             
             # Update Python model - try both annotation lists
             print(f"📝📝📝 [AI STORYBOARD] Starting Python model updates... 📝📝📝")
             updated_count = 0
             
             # First try self.annotations
+            self_index = AnnotationIndex(self.annotations)
+            main_index = AnnotationIndex(main_annotations) if main_annotations else None
             for anno_id, order_num in self.parsed_updates:
                 found_in_self = False
-                for anno in self.annotations:
-                    if anno['id'] == anno_id:
-                        print(f"🎯🎯🎯 [AI STORYBOARD] Found {anno_id} in self.annotations 🎯🎯🎯")
+                anno = self_index.get(anno_id)
+                if anno:
+                    print(f"🎯🎯🎯 [AI STORYBOARD] Found {anno_id} in self.annotations 🎯🎯🎯")
+                    if 'storyboard' not in anno:
+                        anno['storyboard'] = {}
+                        print(f"🆕🆕🆕 [AI STORYBOARD] Created new storyboard dict for {anno_id} 🆕🆕🆕")
+                    
+                    old_order = anno['storyboard'].get('order', 'None')
+                    anno['storyboard']['order'] = order_num
+                    
+                    # Add header if specified (following make_header pattern)
+                    if anno_id in self.parsed_headers:
+                        header_html = f"<div><b style='background-color: #ffff7f;'>{self.parsed_headers[anno_id]}</b></div>"
+                        original_text = anno.get('text', '')
+                        
+                        # Check if storyboard already has text, use that as base
+                        base_text = anno['storyboard'].get('text', original_text)
+                        
+                        # Remove any existing header from base text (prevent duplicates)
+                        import re
+                        clean_text = re.sub(r'^<div><b[^>]*>.*?</b></div>\s*', '', base_text, flags=re.DOTALL)
+                        
+                        # Add new header with clean text (following make_header pattern)
+                        anno['storyboard']['text'] = f"{header_html}{clean_text}"
+                        print(f"📝📝📝 [AI STORYBOARD] Added header to {anno_id}: {self.parsed_headers[anno_id]} 📝📝📝")
+                    
+                    updated_count += 1
+                    found_in_self = True
+                    print(f"✨✨✨ [AI STORYBOARD] Updated {anno_id}: order {old_order} -> {order_num} ✨✨✨")
+                
+                if not found_in_self:
+                    print(f"❌❌❌ [AI STORYBOARD] {anno_id} NOT FOUND in self.annotations ❌❌❌")
+            
+            # Also try main window annotations if available
+            if main_annotations:
+                print(f"🔄🔄🔄 [AI STORYBOARD] Also updating main window annotations... 🔄🔄🔄")
+                for anno_id, order_num in self.parsed_updates:
+                    found_in_main = False
+                    anno = main_index.get(anno_id)
+                    if anno:
+                        print(f"🎯🎯🎯 [AI STORYBOARD] Found {anno_id} in main window annotations 🎯🎯🎯")
                         if 'storyboard' not in anno:
                             anno['storyboard'] = {}
-                            print(f"🆕🆕🆕 [AI STORYBOARD] Created new storyboard dict for {anno_id} 🆕🆕🆕")
+                            print(f"🆕🆕🆕 [AI STORYBOARD] Created new storyboard dict in main for {anno_id} 🆕🆕🆕")
                         
                         old_order = anno['storyboard'].get('order', 'None')
                         anno['storyboard']['order'] = order_num
@@ -1643,50 +1298,10 @@ Do not include any explanations, comments, or other text."""
                             
                             # Add new header with clean text (following make_header pattern)
                             anno['storyboard']['text'] = f"{header_html}{clean_text}"
-                            print(f"📝📝📝 [AI STORYBOARD] Added header to {anno_id}: {self.parsed_headers[anno_id]} 📝📝📝")
+                            print(f"📝📝📝 [AI STORYBOARD] Added header to main {anno_id}: {self.parsed_headers[anno_id]} 📝📝📝")
                         
-                        updated_count += 1
-                        found_in_self = True
-                        print(f"✨✨✨ [AI STORYBOARD] Updated {anno_id}: order {old_order} -> {order_num} ✨✨✨")
-                        break
-                
-                if not found_in_self:
-                    print(f"❌❌❌ [AI STORYBOARD] {anno_id} NOT FOUND in self.annotations ❌❌❌")
-            
-            # Also try main window annotations if available
-            if main_annotations:
-                print(f"🔄🔄🔄 [AI STORYBOARD] Also updating main window annotations... 🔄🔄🔄")
-                for anno_id, order_num in self.parsed_updates:
-                    found_in_main = False
-                    for anno in main_annotations:
-                        if anno['id'] == anno_id:
-                            print(f"🎯🎯🎯 [AI STORYBOARD] Found {anno_id} in main window annotations 🎯🎯🎯")
-                            if 'storyboard' not in anno:
-                                anno['storyboard'] = {}
-                                print(f"🆕🆕🆕 [AI STORYBOARD] Created new storyboard dict in main for {anno_id} 🆕🆕🆕")
-                            
-                            old_order = anno['storyboard'].get('order', 'None')
-                            anno['storyboard']['order'] = order_num
-                            
-                            # Add header if specified (following make_header pattern)
-                            if anno_id in self.parsed_headers:
-                                header_html = f"<div><b style='background-color: #ffff7f;'>{self.parsed_headers[anno_id]}</b></div>"
-                                original_text = anno.get('text', '')
-                                
-                                # Check if storyboard already has text, use that as base
-                                base_text = anno['storyboard'].get('text', original_text)
-                                
-                                # Remove any existing header from base text (prevent duplicates)
-                                import re
-                                clean_text = re.sub(r'^<div><b[^>]*>.*?</b></div>\s*', '', base_text, flags=re.DOTALL)
-                                
-                                # Add new header with clean text (following make_header pattern)
-                                anno['storyboard']['text'] = f"{header_html}{clean_text}"
-                                print(f"📝📝📝 [AI STORYBOARD] Added header to main {anno_id}: {self.parsed_headers[anno_id]} 📝📝📝")
-                            
-                            found_in_main = True
-                            print(f"💫💫💫 [AI STORYBOARD] Updated in main {anno_id}: order {old_order} -> {order_num} 💫💫💫")
-                            break
+                        found_in_main = True
+                        print(f"💫💫💫 [AI STORYBOARD] Updated in main {anno_id}: order {old_order} -> {order_num} 💫💫💫")
                     
                     if not found_in_main:
                         print(f"❌❌❌ [AI STORYBOARD] {anno_id} NOT FOUND in main window annotations ❌❌❌")
@@ -1787,9 +1402,11 @@ Do not include any explanations, comments, or other text."""
                         # Add to annotation lists
                         print(f"📝 [AI STORYBOARD DIVIDER DEBUG] Adding divider to self.annotations...")
                         self.annotations.append(divider_obj)
+                        self_index.invalidate()
                         if main_annotations:
                             print(f"📝 [AI STORYBOARD DIVIDER DEBUG] Adding divider to main_annotations...")
                             main_annotations.append(divider_obj)
+                            main_index.invalidate()
                         else:
                             print(f"📝 [AI STORYBOARD DIVIDER DEBUG] main_annotations is None, not adding there")
                         
@@ -1814,11 +1431,10 @@ Do not include any explanations, comments, or other text."""
             # Debug: Show final state of some annotations
             print(f"🔍🔍🔍 [AI STORYBOARD] Final state check... 🔍🔍🔍")
             for anno_id, order_num in self.parsed_updates[:3]:  # Check first 3
-                for anno in self.annotations:
-                    if anno['id'] == anno_id:
-                        current_order = anno.get('storyboard', {}).get('order', 'MISSING')
-                        print(f"🔍 Final check {anno_id}: order = {current_order}")
-                        break
+                anno = self_index.get(anno_id)
+                if anno:
+                    current_order = anno.get('storyboard', {}).get('order', 'MISSING')
+                    print(f"🔍 Final check {anno_id}: order = {current_order}")
             
             # DEBUG: Check what ALL annotations look like after AI updates
             print(f"🕵️🕵️🕵️ [AI STORYBOARD] COMPREHENSIVE DEBUG - ALL ANNOTATIONS AFTER AI UPDATES: 🕵️🕵️🕵️")
@@ -1974,6 +1590,9 @@ Do not include any explanations, comments, or other text."""
             else:
                 print(f"❌❌❌ [AI STORYBOARD] Storyboard dialog not available for refresh ❌❌❌")
             
+            # Storyboard attributes on the annotation spans changed
+            get_transcript_cache().invalidate(self.web_view, "storyboard updates applied")
+            
             # Trigger changes pending indicator
             print(f"💾💾💾 [AI STORYBOARD] Triggering changes pending indicator... 💾💾💾")
             if hasattr(self.main_window, 'mark_changes_pending'):
@@ -2023,33 +1642,36 @@ Do not include any explanations, comments, or other text."""
         length_constraint_followup = ""
         if use_length_limit:
             target_duration_formatted = self.format_duration(total_target_seconds)
-            target_word_count = int((total_target_seconds / 60) * 200)
+            target_word_count = words_for_duration(total_target_seconds)
             length_constraint_followup = f"\nSCRIPT LENGTH TARGET: {target_duration_formatted} (approximately {target_word_count} words)"
         
-        followup_prompt = f"""Continue our conversation about organizing video script annotations.{length_constraint_followup}
+        # Instructions and annotation data stay identical across follow-ups; the conversation goes last
+        instructions = f"""Continue our conversation about organizing video script annotations.
+
+{f'''
+ADVANCED FEATURES AVAILABLE:
+{f"- Headers: annotation-id :: Order#X :: HEADER :: \"Title\" (use sparingly)" if use_headers else ""}
+{f"- Dividers: DIVIDER :: \"Section Name\" :: Order#X :: #color" if use_dividers else ""}
+''' if use_headers or use_dividers else ''}
+
+Please provide a new organization based on the user's feedback. You can use the same annotation IDs{f", add headers," if use_headers else ""}{f" or create dividers" if use_dividers else ""} as needed."""
+
+        request = f"""{length_constraint_followup.strip()}
 
 PREVIOUS CONVERSATION:
 {conversation_context}
 
-CURRENT ANNOTATION DATA:
-{self.format_annotations_for_ai()}
-
 CURRENT ORGANIZATION:
 {self.last_response}
 
 USER'S NEW REQUEST:
 {followup_text}
 
-{f'''
-ADVANCED FEATURES AVAILABLE:
-{f"- Headers: annotation-id :: Order#X :: HEADER :: \"Title\" (use sparingly)" if use_headers else ""}
-{f"- Dividers: DIVIDER :: \"Section Name\" :: Order#X :: #color" if use_dividers else ""}
-''' if use_headers or use_dividers else ''}
-
-Please provide a new organization based on the user's feedback. You can use the same annotation IDs{f", add headers," if use_headers else ""}{f" or create dividers" if use_dividers else ""} as needed.
-
 Only provide the new ordering, no explanations."""
         
+        followup_prompt = get_prompt_template('generate_script_followup').render(
+            instructions, annotations=f"CURRENT ANNOTATION DATA:\n{self.format_annotations_for_ai()}", request=request)
+        
         # Clear followup input
         self.followup_input.clear()
         
@@ -2058,24 +1680,26 @@ Only provide the new ordering, no explanations."""
         self.progress_bar.setFormat("AI is processing followup question...")
         self.ask_followup_btn.setEnabled(False)
         self.status_label.setText("Processing followup question...")
+        self.debug_sink.reset()
+        self.order_stream = None
         
-        # Create fresh AI model and start processing
-        self.ai_model = self.create_ai_model()
-        if not self.ai_model:
+        # Submit the followup to the shared AI request engine
+        job = self.submit_ai_request(followup_prompt, "AI Generate Script followup")
+        if not job:
             self.progress_bar.hide()
+            self.ask_followup_btn.setEnabled(True)
             QMessageBox.warning(self, "Error", "AI model not configured.")
             return
             
-        # Create and start worker thread
-        use_streaming = self.streaming_checkbox.isChecked()
-        self.worker_thread = AIWorkerThread(self.ai_model, followup_prompt, stream=use_streaming)
-        self.worker_thread.response_received.connect(self.on_followup_response)
-        self.worker_thread.response_chunk.connect(self.on_ai_response_chunk)
-        self.worker_thread.error_occurred.connect(self.on_followup_error)
-        self.worker_thread.start()
+        job.response_received.connect(self.on_followup_response)
+        job.chunk_received.connect(self.on_ai_response_chunk)
+        job.error_occurred.connect(self.on_followup_error)
+        job.retry_suggested.connect(self.on_followup_error)
     
     def on_followup_response(self, response_text):
         """Handle followup AI response"""
+        self.debug_sink.flush()
+        
         # Hide progress bar and re-enable controls
         self.progress_bar.hide()
         self.ask_followup_btn.setEnabled(True)
@@ -2096,6 +1720,9 @@ Only provide the new ordering, no explanations."""
     
     def on_followup_error(self, error_message):
         """Handle followup AI error"""
+        self.debug_sink.discard()
+        self.order_stream = None
+        
         # Hide progress bar and re-enable controls
         self.progress_bar.hide()
         self.ask_followup_btn.setEnabled(True)
@@ -2103,4 +1730,9 @@ Only provide the new ordering, no explanations."""
         self.status_label.setStyleSheet("color: #EF4444;")
         QMessageBox.critical(self, "AI Error", f"Error: {error_message}")
 
+    def done(self, result):
+        """Delete the server-side context this dialog uploaded (off the GUI thread) when it is accepted, rejected or closed"""
+        get_context_cache().release_in_background(self.context_cache_owner)
+        super().done(result)
+
 
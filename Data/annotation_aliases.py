@@ -0,0 +1,54 @@
+"""
+Annotation Aliases for Scriptoria
+
+Short stand-ins (A1, A2, ...) for the 36-character annotation UUIDs in AI prompts. The IDs
+are a large share of every prompt and of every response that echoes them back, and models
+copy a short token far more reliably than a UUID. A dialog keeps one alias table for its
+lifetime - follow-up prompts and earlier responses keep referring to the same aliases - and
+its response parser maps aliases back to real IDs. References that are not aliases pass
+through unchanged, so real IDs in a response still work. An alias-shaped reference missing
+from the table (a model inventing "A99") is unknown, not a mistyped ID: callers check
+is_alias() and reject it rather than fuzzy-matching it against the real IDs.
+"""
+
+import re
+
+
+ALIAS_PREFIX = "A"
+ALIAS_REFERENCE = re.compile(r'\[*\s*' + ALIAS_PREFIX + r'\s*-?\s*(\d+)\s*\]*', re.IGNORECASE)
+
+
+class AnnotationAliases:
+    """Stable alias <-> annotation ID table for one dialog's prompts"""
+
+    def __init__(self):
+        self._alias_by_id = {}
+        self._id_by_number = {}
+
+    def alias(self, annotation_id):
+        """Alias for an annotation ID, assigning the next number the first time it is seen"""
+        alias = self._alias_by_id.get(annotation_id)
+        if alias is None:
+            number = len(self._id_by_number) + 1
+            alias = f"{ALIAS_PREFIX}{number}"
+            self._alias_by_id[annotation_id] = alias
+            self._id_by_number[number] = annotation_id
+        return alias
+
+    def is_alias(self, reference):
+        """Whether a reference has the shape of an alias, whether or not it is in the table"""
+        return bool(reference) and ALIAS_REFERENCE.fullmatch(reference.strip()) is not None
+
+    def resolve(self, reference):
+        """Annotation ID for an alias reference like "A17" or "[a17]"; anything else is returned unchanged"""
+        if not reference:
+            return reference
+        match = ALIAS_REFERENCE.fullmatch(reference.strip())
+        if match:
+            annotation_id = self._id_by_number.get(int(match.group(1)))
+            if annotation_id:
+                return annotation_id
+        return reference
+
+    def __len__(self):
+        return len(self._id_by_number)
@@ -0,0 +1,63 @@
+"""
+Annotation Creation with Throttled Progress for Scriptoria
+
+Creates a list of AI annotations one at a time through web_view.create_new_annotation_and_highlight.
+Nothing is batched or deferred: each annotation's signals, DOM highlight and pending-change mark
+happen as it is created, because those hooks belong to the main window and web view, which are
+outside these dialogs. What this module changes is the progress handling: cancellation is checked
+before every annotation, while the progress callback (which spins the event loop) runs at most
+once per PROGRESS_INTERVAL seconds instead of after every annotation. The theme view is refreshed
+once at the end, as before.
+"""
+
+from time import monotonic
+
+# Seconds between progress callbacks (each callback may spin the event loop)
+PROGRESS_INTERVAL = 0.05
+
+
+def refresh_theme_view(main_window, created_count):
+    """One full theme view refresh for everything that was created"""
+    if not created_count or not hasattr(main_window, 'update_theme_view'):
+        return
+    try:
+        main_window.update_theme_view(show_progress=False)
+        print(f"[ANNOTATION CREATION] Theme view refreshed once for {created_count} annotations")
+    except Exception as e:
+        print(f"[ANNOTATION CREATION] Error updating theme view: {e}")
+
+
+def create_annotations(web_view, main_window, annotation_specs, progress=None, cancelled=None):
+    """
+    Create annotations from dicts of create_new_annotation_and_highlight keyword arguments.
+    progress(done, total) is called before the first annotation and then at most once per
+    PROGRESS_INTERVAL seconds; cancelled() is checked before every annotation and stops the
+    run when it returns True. Returns (created, failures): the indexes of the specs that were
+    created, and a list of (index, error message) for those that raised.
+    """
+    annotation_specs = list(annotation_specs)
+    if not web_view or not annotation_specs:
+        return [], []
+
+    created = []
+    failures = []
+    last_progress = None
+    for i, spec in enumerate(annotation_specs):
+        if progress:
+            now = monotonic()
+            if last_progress is None or now - last_progress >= PROGRESS_INTERVAL:
+                progress(i, len(annotation_specs))
+                last_progress = now
+        if cancelled and cancelled():
+            print(f"[ANNOTATION CREATION] Cancelled after {i} of {len(annotation_specs)} annotations")
+            break
+        try:
+            web_view.create_new_annotation_and_highlight(**spec)
+            created.append(i)
+        except Exception as e:
+            print(f"[ANNOTATION CREATION] Failed to create annotation {i + 1}: {e}")
+            failures.append((i, str(e)))
+
+    print(f"[ANNOTATION CREATION] Created {len(created)} annotations ({len(failures)} failed) from {len(annotation_specs)} requests")
+    refresh_theme_view(main_window, len(created))
+    return created, failures
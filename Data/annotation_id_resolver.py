@@ -0,0 +1,128 @@
+"""
+Annotation ID Resolver for Scriptoria
+
+Maps annotation IDs that an AI response got slightly wrong - truncated, mistyped, with a
+character dropped or doubled - back to the real ID. Truncated references are answered from a
+sorted prefix index (a binary search instead of a scan). Everything else goes through an
+index of each ID's non-overlapping 3-grams: an edit can break at most one of them, so an ID
+within k edits of the reference has all but k of its grams in the reference, and only the few
+IDs that pass that count are checked with a banded edit distance. The reference may match the
+whole ID or just its start. Ambiguous references - two IDs equally
+close - are left unresolved rather than guessed.
+"""
+
+import bisect
+
+
+MIN_REFERENCE_LENGTH = 6   # Shorter references are too ambiguous to correct
+MAX_EDITS = 3              # Upper bound on the edits allowed for a long reference
+GRAM = 3
+
+
+def normalize_reference(reference):
+    """Strip the wrapping an AI tends to add around an ID and fold case"""
+    return reference.strip().strip('[]()<>"\'`').strip().lower()
+
+
+def allowed_edits(reference):
+    """Edits tolerated for a reference - roughly one per ten characters"""
+    return min(MAX_EDITS, max(1, len(reference) // 10))
+
+
+def prefix_edit_distance(query, candidate, max_edits):
+    """Edit distance from query to the closest prefix of candidate, or None if above max_edits"""
+    # Only cells within max_edits of the diagonal can stay within the bound
+    inf = max_edits + 1
+    width = len(candidate)
+    previous_row = [j if j <= max_edits else inf for j in range(width + 1)]
+    for i, query_ch in enumerate(query, 1):
+        low, high = max(1, i - max_edits), min(width, i + max_edits)
+        row = [i if i <= max_edits else inf] + [inf] * width
+        for j in range(low, high + 1):
+            cost = 0 if query_ch == candidate[j - 1] else 1
+            row[j] = min(row[j - 1] + 1, previous_row[j] + 1, previous_row[j - 1] + cost, inf)
+        if min(row[max(0, low - 1):high + 1]) > max_edits:
+            return None
+        previous_row = row
+    distance = min(previous_row)
+    return distance if distance <= max_edits else None
+
+
+class AnnotationIdResolver:
+    """Fuzzy annotation ID lookup built once over a set of IDs"""
+
+    def __init__(self, annotation_ids):
+        self._exact = {}  # lowercased ID -> ID
+        for annotation_id in annotation_ids:
+            if annotation_id:
+                self._exact.setdefault(annotation_id.lower(), annotation_id)
+        self._sorted_keys = sorted(self._exact)
+        self._grams = None  # 3-gram -> [(lowercased ID, gram number)], built on first fuzzy lookup
+
+    def __len__(self):
+        return len(self._exact)
+
+    def resolve(self, reference):
+        """The real ID a reference most likely means, or None if there is no unambiguous match"""
+        if not reference:
+            return None
+        query = normalize_reference(reference)
+        exact = self._exact.get(query)
+        if exact:
+            return exact
+        if len(query) < MIN_REFERENCE_LENGTH:
+            return None
+
+        prefixed = self._prefixed(query)
+        if prefixed:
+            if len(prefixed) == 1:
+                return self._exact[prefixed[0]]
+            print(f"[ID RESOLVER] '{reference}' is a prefix of {len(prefixed)}+ IDs - not resolving")
+            return None
+
+        distance, matches = self._nearest(query, allowed_edits(query))
+        if len(matches) != 1:
+            if matches:
+                print(f"[ID RESOLVER] '{reference}' is ambiguous ({len(matches)} IDs within {distance} edits)")
+            return None
+        return self._exact[matches[0]]
+
+    def _prefixed(self, query):
+        """Up to two IDs starting with query"""
+        start = bisect.bisect_left(self._sorted_keys, query)
+        return [key for key in self._sorted_keys[start:start + 2] if key.startswith(query)]
+
+    def _gram_index(self):
+        if self._grams is None:
+            self._grams = {}
+            for key in self._sorted_keys:
+                for number, i in enumerate(range(0, len(key) - GRAM + 1, GRAM)):
+                    self._grams.setdefault(key[i:i + GRAM], []).append((key, number))
+        return self._grams
+
+    def _nearest(self, query, max_edits):
+        """(best distance, IDs at that distance) among IDs within max_edits of query or of their prefix"""
+        # The ID's matched prefix has at least this many whole grams, all but max_edits intact
+        required = (len(query) - max_edits) // GRAM - max_edits
+        if required < 1:
+            return max_edits + 1, []
+
+        grams = self._gram_index()
+        found = {}  # lowercased ID -> bitmask of its grams seen in the query
+        for i in range(len(query) - GRAM + 1):
+            for key, number in grams.get(query[i:i + GRAM], ()):
+                found[key] = found.get(key, 0) | (1 << number)
+
+        best_distance, best = max_edits + 1, []
+        for key, mask in found.items():
+            if bin(mask).count('1') < required:
+                continue
+            distance = prefix_edit_distance(query, key, min(max_edits, best_distance))
+            if distance is None:
+                continue
+            if distance < best_distance:
+                best_distance, best = distance, [key]
+            elif distance == best_distance:
+                best.append(key)
+        return best_distance, best
+
@@ -0,0 +1,141 @@
+"""
+Annotation Store for Scriptoria
+
+Hashed indexes over an annotation list (web_view.annotations or a dialog's working copy):
+id -> annotation plus scene and tag secondary indexes, and a fuzzy ID resolver built on
+demand. The list itself stays the source of truth and is shared with the rest of the app.
+An index belongs to whoever builds it: add()/remove()/update() keep list and index in step,
+and after any other change to the list - appends, deletes, edits to ids, scenes or tags made
+elsewhere - the owner calls invalidate() and the next lookup rebuilds. Like the scans it
+replaces, lookups return the first annotation in list order when an ID is duplicated.
+
+Indexes are scoped to one operation (a parsed response, an apply, a dialog's working copy)
+and are not kept on web_view between them: annotations are created and deleted by the main
+window, whose code does not go through this index, so a long-lived one would go stale.
+"""
+
+try:
+    from .annotation_id_resolver import AnnotationIdResolver
+except ImportError:
+    from annotation_id_resolver import AnnotationIdResolver
+
+
+class AnnotationIndex:
+    """O(1) annotation lookup by ID with scene and tag secondary indexes"""
+
+    def __init__(self, annotations):
+        self.annotations = annotations
+        self._by_id = {}
+        self._by_scene = {}
+        self._by_tag = {}
+        self._resolver = None
+        self._stale = True
+
+    def rebuild(self):
+        """Rebuild all indexes from the annotation list"""
+        self._by_id = {}
+        self._by_scene = {}
+        self._by_tag = {}
+        self._resolver = None
+        for annotation in self.annotations:
+            self._index(annotation)
+        self._stale = False
+
+    def invalidate(self):
+        """Rebuild on next access - call after changing the list other than through this index"""
+        self._stale = True
+        self._resolver = None
+
+    def _ensure_current(self):
+        if self._stale:
+            print(f"[ANNOTATION STORE] Indexing {len(self.annotations)} annotations")
+            self.rebuild()
+
+    def _index(self, annotation):
+        annotation_id = annotation.get('id')
+        if annotation_id:
+            if annotation_id in self._by_id:
+                return  # Duplicate ID - the first one in the list wins
+            self._by_id[annotation_id] = annotation
+
+        scenes = [annotation.get('scene')] + list(annotation.get('secondary_scenes') or [])
+        for scene in scenes:
+            if scene:
+                self._by_scene.setdefault(scene, {}).setdefault(annotation_id, annotation)
+
+        for tag in annotation.get('tags') or []:
+            if tag:
+                self._by_tag.setdefault(tag, {}).setdefault(annotation_id, annotation)
+
+    def _unindex(self, annotation):
+        annotation_id = annotation.get('id')
+        self._by_id.pop(annotation_id, None)
+        for index in (self._by_scene, self._by_tag):
+            for key in list(index):
+                index[key].pop(annotation_id, None)
+                if not index[key]:
+                    del index[key]
+
+    def get(self, annotation_id):
+        """Return the annotation with this ID, or None"""
+        self._ensure_current()
+        return self._by_id.get(annotation_id)
+
+    def __contains__(self, annotation_id):
+        return self.get(annotation_id) is not None
+
+    def __len__(self):
+        self._ensure_current()
+        return len(self._by_id)
+
+    def ids(self):
+        """All indexed annotation IDs"""
+        self._ensure_current()
+        return list(self._by_id)
+
+    def by_scene(self, scene):
+        """Annotations with this primary or secondary scene, in list order"""
+        self._ensure_current()
+        return list(self._by_scene.get(scene, {}).values())
+
+    def by_tag(self, tag):
+        """Annotations carrying this tag, in list order"""
+        self._ensure_current()
+        return list(self._by_tag.get(tag, {}).values())
+
+    def resolver(self):
+        """AnnotationIdResolver over the indexed IDs, built on first use and dropped on any change"""
+        self._ensure_current()
+        if self._resolver is None:
+            self._resolver = AnnotationIdResolver(self._by_id)
+        return self._resolver
+
+    def add(self, annotation):
+        """Append an annotation to the list and index it (no-op if its ID is already present)"""
+        self._ensure_current()
+        annotation_id = annotation.get('id')
+        if annotation_id and annotation_id in self._by_id:
+            return False
+        self.annotations.append(annotation)
+        self._index(annotation)
+        self._resolver = None
+        return True
+
+    def remove(self, annotation_id):
+        """Remove the annotation with this ID from the list and the indexes"""
+        annotation = self.get(annotation_id)
+        if annotation is None:
+            return None
+        self.annotations.remove(annotation)
+        # A later duplicate of the ID becomes the one the index returns
+        self.invalidate()
+        return annotation
+
+    def update(self, annotation):
+        """Re-index an annotation after its scene, secondary scenes or tags changed"""
+        self._ensure_current()
+        if self._by_id.get(annotation.get('id')) is not annotation:
+            self.invalidate()
+            return
+        self._unindex(annotation)
+        self._index(annotation)
@@ -0,0 +1,132 @@
+"""
+Windowed Annotation Generation for Scriptoria
+
+Map-reduce support for transcripts that are too long for one Generate Annotations call.
+The transcript text ("Speaker: content" blocks separated by blank lines) is split on speech
+boundaries into windows that overlap by a few speech blocks, each window is annotated by
+its own request, and the [[ANNOTATION ...]] blocks from all windows are merged - a moment
+picked by both windows on either side of an overlap is kept once.
+"""
+
+import re
+
+
+# ~15k tokens of transcript per request leaves ample room for the prompt and the answer
+DEFAULT_WINDOW_CHARS = 60000
+DEFAULT_OVERLAP_BLOCKS = 2
+
+ANNOTATION_BLOCK = re.compile(r'\[\[ANNOTATION.*?\]\]', re.DOTALL)
+
+
+def split_transcript_window_spans(transcript, max_chars=DEFAULT_WINDOW_CHARS, overlap_blocks=DEFAULT_OVERLAP_BLOCKS):
+    """(start, end) offsets in the transcript of overlapping windows of whole speech blocks"""
+    block_spans = []
+    position = 0
+    for block in transcript.split('\n\n'):
+        if block.strip():
+            block_spans.append((position, position + len(block)))
+        position += len(block) + 2
+    if not block_spans:
+        return []
+    if len(transcript) <= max_chars:
+        return [(0, len(transcript))]
+
+    spans = []
+    start = 0
+    while start < len(block_spans):
+        end = start
+        size = 0
+        # Always take at least one block, even if a single speech exceeds max_chars
+        while end < len(block_spans) and (end == start or size + block_spans[end][1] - block_spans[end][0] + 2 <= max_chars):
+            size += block_spans[end][1] - block_spans[end][0] + 2
+            end += 1
+
+        spans.append((block_spans[start][0], block_spans[end - 1][1]))
+        if end >= len(block_spans):
+            break
+        # Step back so context around the boundary appears in both windows
+        start = max(end - overlap_blocks, start + 1)
+
+    return spans
+
+
+def split_transcript_windows(transcript, max_chars=DEFAULT_WINDOW_CHARS, overlap_blocks=DEFAULT_OVERLAP_BLOCKS):
+    """Split transcript text into overlapping windows of whole speech blocks"""
+    return [transcript[start:end] for start, end in split_transcript_window_spans(transcript, max_chars, overlap_blocks)]
+
+
+def _annotation_fields(block):
+    """Split an [[ANNOTATION :: ...]] block into its fields (None if it is malformed)"""
+    inner = re.sub(r'\s+', ' ', block[2:-2]).strip()
+    fields = [field.strip() for field in inner.split('::')]
+    if len(fields) < 6 or fields[0].upper() != 'ANNOTATION':
+        return None
+    return fields
+
+
+def _normalize_segment(text):
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def _shared_region(window_spans, number):
+    """Transcript offsets covered by both window number-1 and window number, or None"""
+    if not window_spans or number == 0 or number >= len(window_spans):
+        return None
+    start, end = window_spans[number][0], window_spans[number - 1][1]
+    return (start, end) if start < end else None
+
+
+def _same_stretch(span, other, shared):
+    """Whether two located segments cover mostly the same text inside a window overlap"""
+    start, end = max(span[0], other[0]), min(span[1], other[1])
+    if end <= start or start < shared[0] or end > shared[1]:
+        return False
+    return end - start >= min(span[1] - span[0], other[1] - other[0]) / 2
+
+
+def merge_annotation_responses(responses, window_spans=None, transcript_index=None):
+    """
+    Merge window responses (one per window, None for a failed window) into one response of
+    [[ANNOTATION ...]] blocks, in window order. A block is dropped only as a repeat of a block
+    the previous window kept for the same stretch of their shared overlap - compared by
+    transcript span when transcript_index can locate both, otherwise by identical text.
+    """
+    kept = []      # [normalized segment, span, block]
+    previous = []  # entries from the previous window
+
+    for number, response in enumerate(responses):
+        current = []
+        shared = _shared_region(window_spans, number)
+        for block in ANNOTATION_BLOCK.findall(response or ""):
+            fields = _annotation_fields(block)
+            # The text segment may itself contain "::", so it is everything between scenes and notes
+            raw_segment = ' :: '.join(fields[3:-2]) if fields else ""
+            segment = _normalize_segment(raw_segment)
+            if not segment:
+                # Malformed or empty - leave it for parse_ai_response to report
+                kept.append([segment, None, block])
+                continue
+            span = transcript_index.locate(raw_segment) if transcript_index else None
+
+            repeated = None
+            for entry in previous:
+                if span and entry[1] and shared:
+                    if _same_stretch(span, entry[1], shared):
+                        repeated = entry
+                        break
+                elif segment == entry[0]:
+                    repeated = entry
+                    break
+
+            if repeated is None:
+                entry = [segment, span, block]
+                kept.append(entry)
+                current.append(entry)
+                continue
+            if len(segment) > len(repeated[0]):
+                # The overlap produced a longer version of the same moment - keep the longer one
+                repeated[:] = [segment, span, block]
+            current.append(repeated)
+        previous = current
+
+    return '\n\n'.join(block for _, _, block in kept)
@@ -0,0 +1,157 @@
+"""
+Context Cache for Scriptoria
+
+Explicit server-side caching of a prompt's stable prefix - instructions, transcript and
+annotation context - for chat-style sessions that ask many questions about one document.
+The prefix is uploaded once as a Gemini cached-content object with a TTL; later requests
+reference it by name and send only the per-request section. Prefixes come from the
+PromptTemplate layout, so the cache key is simply the prefix text. Concurrent requests for
+the same prefix wait for a single upload; other prefixes are not held up by it. A prefix
+whose creation failed (model without caching support, prefix below the provider minimum, old
+SDK) is not retried for a while and its requests fall back to sending the full prompt. Each
+cache remembers the dialogs (owners) that used it; a dialog releases its caches when it
+closes, and ones no other dialog still uses are deleted from the server on a background thread.
+"""
+
+import hashlib
+import threading
+import time
+
+try:
+    from .ai_client_pool import genai_types
+    from .token_budget import get_token_estimator
+except ImportError:
+    from ai_client_pool import genai_types
+    from token_budget import get_token_estimator
+
+
+DEFAULT_TTL_SECONDS = 600
+MIN_PREFIX_TOKENS = 1024        # Gemini refuses to cache less than this
+EXPIRY_MARGIN_SECONDS = 30      # Stop handing out a cache this close to its expiry
+FAILURE_BACKOFF_SECONDS = 300   # Don't retry creation for a prefix that just failed
+
+
+def _cache_key(api_key, base_url, model, prefix):
+    key_data = '\x00'.join([api_key or "", base_url or "", model, prefix])
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+
+class ContextCache:
+    """Server-side cached-content objects for prompt prefixes (safe to use from the engine's pool threads)"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}   # key -> (cache name, local expiry time, client that created it, owners)
+        self._failures = {}  # key -> time creation last failed
+        self._creating = {}  # key -> threading.Event set when an in-flight upload finishes
+
+    def get_or_create(self, client, api_key, model, prefix, base_url=None, label="AI request", owner=None):
+        """
+        Name of a live cached-content object holding prefix, or None to send the full prompt.
+        owner (any hashable tag, typically one per dialog) is recorded for release().
+        """
+        if genai_types is None or not prefix:
+            return None
+        if get_token_estimator().estimate(prefix) < MIN_PREFIX_TOKENS:
+            return None
+
+        key = _cache_key(api_key, base_url, model, prefix)
+        while True:
+            with self._lock:
+                now = time.time()
+                entry = self._entries.get(key)
+                if entry and entry[1] - EXPIRY_MARGIN_SECONDS > now:
+                    entry[3].add(owner)
+                    return entry[0]
+                failed_at = self._failures.get(key)
+                if failed_at and now - failed_at < FAILURE_BACKOFF_SECONDS:
+                    return None
+                in_flight = self._creating.get(key)
+                if in_flight is None:
+                    # This thread uploads; requests for the same prefix wait for it, others carry on
+                    in_flight = self._creating[key] = threading.Event()
+                    break
+            in_flight.wait()
+
+        cached = None
+        try:
+            cached = client.caches.create(
+                model=model,
+                config=genai_types.CreateCachedContentConfig(
+                    contents=[prefix],
+                    ttl=f"{self.ttl_seconds}s",
+                    display_name=f"Scriptoria - {label}"[:128]
+                )
+            )
+        except Exception as e:
+            print(f"[CONTEXT CACHE] Could not cache context for {model} ({e}) - sending full prompts")
+        finally:
+            with self._lock:
+                if cached is not None:
+                    self._entries[key] = (cached.name, now + self.ttl_seconds, client, {owner})
+                else:
+                    self._failures[key] = time.time()
+                del self._creating[key]
+            in_flight.set()
+
+        if cached is None:
+            return None
+        print(f"[CONTEXT CACHE] Cached {len(prefix):,} chars of context as {cached.name} "
+              f"for '{label}' (ttl {self.ttl_seconds}s)")
+        return cached.name
+
+    def invalidate(self, name):
+        """Forget a cache the server no longer accepts (expired or deleted)"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[0] == name:
+                    del self._entries[key]
+
+    def release(self, owner):
+        """Drop owner from every cache and delete the caches nobody else uses (makes network calls)"""
+        with self._lock:
+            released = []
+            for key, entry in list(self._entries.items()):
+                entry[3].discard(owner)
+                if not entry[3]:
+                    del self._entries[key]
+                    released.append(entry)
+        self._delete(released)
+
+    def release_in_background(self, owner):
+        """release() on a daemon thread, for callers on the GUI thread; returns the thread"""
+        thread = threading.Thread(target=self.release, args=(owner,), name="ContextCacheRelease", daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        """Forget every cache and delete the unexpired ones from the server (makes network calls)"""
+        with self._lock:
+            released = list(self._entries.values())
+            self._entries.clear()
+            self._failures.clear()
+        self._delete(released)
+
+    def _delete(self, entries):
+        """Delete unexpired caches from the server with the client that made them"""
+        now = time.time()
+        for name, expiry, client, _ in entries:
+            if expiry <= now:
+                continue
+            try:
+                client.caches.delete(name=name)
+                print(f"[CONTEXT CACHE] Deleted {name}")
+            except Exception as e:
+                print(f"[CONTEXT CACHE] Could not delete {name}: {e}")
+
+
+_context_cache = None
+
+
+def get_context_cache():
+    """Get the process-wide ContextCache instance"""
+    global _context_cache
+    if _context_cache is None:
+        _context_cache = ContextCache()
+    return _context_cache
@@ -0,0 +1,90 @@
+"""
+Batch DOM Updates for Scriptoria
+
+Applies attribute changes to many annotation spans in the transcript with a single
+runJavaScript call. All (annotation_id, value) pairs travel in one JSON payload; the script
+builds an id -> spans map with one querySelectorAll, applies every change, reads the values
+back and returns one summary, instead of one IPC round trip (and one document query) per
+annotation.
+"""
+
+import json
+
+
+BULK_ATTRIBUTE_SCRIPT = '''
+(function() {
+    const attribute = %(attribute)s;
+    const updates = %(updates)s;
+
+    // One pass over the document: annotation id -> its highlight spans
+    const spansById = new Map();
+    document.querySelectorAll('[data-annotation-id]').forEach(span => {
+        const id = span.getAttribute('data-annotation-id');
+        let spans = spansById.get(id);
+        if (!spans) {
+            spans = [];
+            spansById.set(id, spans);
+        }
+        spans.push(span);
+    });
+
+    const summary = {
+        attribute: attribute,
+        requested: updates.length,
+        updated_annotations: 0,
+        updated_spans: 0,
+        missing_ids: [],
+        mismatches: []
+    };
+
+    updates.forEach(([annotationId, value]) => {
+        const spans = spansById.get(annotationId);
+        if (!spans) {
+            summary.missing_ids.push(annotationId);
+            return;
+        }
+        const expected = String(value);
+        spans.forEach(span => {
+            span.setAttribute(attribute, expected);
+            if (span.getAttribute(attribute) !== expected) {
+                summary.mismatches.push(annotationId);
+            }
+        });
+        summary.updated_annotations++;
+        summary.updated_spans += spans.length;
+    });
+
+    return summary;
+})();
+'''
+
+
+def build_bulk_attribute_script(attribute, updates):
+    """Build the JavaScript that sets `attribute` on the spans of every (annotation_id, value) pair"""
+    payload = [[str(annotation_id), value] for annotation_id, value in updates]
+    return BULK_ATTRIBUTE_SCRIPT % {
+        'attribute': json.dumps(attribute),
+        'updates': json.dumps(payload),
+    }
+
+
+def apply_bulk_attribute_update(web_view, attribute, updates, callback=None):
+    """Set `attribute` on the spans of all annotations in one runJavaScript call; callback gets the summary"""
+    updates = list(updates)
+    if not web_view or not updates:
+        if callback:
+            callback(None)
+        return
+
+    def handle_summary(summary):
+        if summary:
+            print(f"[DOM BATCH] {attribute}: {summary.get('updated_annotations', 0)}/{summary.get('requested', 0)} annotations, "
+                  f"{summary.get('updated_spans', 0)} spans updated, {len(summary.get('missing_ids', []))} missing, "
+                  f"{len(summary.get('mismatches', []))} mismatches")
+        else:
+            print(f"[DOM BATCH] {attribute}: bulk update returned no summary")
+        if callback:
+            callback(summary)
+
+    print(f"[DOM BATCH] Sending {len(updates)} {attribute} updates in one script")
+    web_view.page().runJavaScript(build_bulk_attribute_script(attribute, updates), handle_summary)
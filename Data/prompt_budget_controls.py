@@ -0,0 +1,135 @@
+"""
+Prompt Budget Controls for Scriptoria
+
+The projected prompt size label, token budget spin box and auto-trim toggle shared by the AI
+dialogs, built on the estimator in token_budget.
+"""
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QLabel, QSpinBox, QCheckBox, QMessageBox
+
+try:
+    from .token_budget import DEFAULT_PROMPT_BUDGET, get_token_estimator, trim_blocks_to_budget
+except ImportError:
+    from token_budget import DEFAULT_PROMPT_BUDGET, get_token_estimator, trim_blocks_to_budget
+
+
+class PromptBudgetControls(QWidget):
+    """
+    Projected prompt size plus the budget spin box and auto-trim toggle, shared by the AI dialogs.
+
+    The dialog registers a prompt source (a callable returning its current prompt text) for
+    the live projection, and passes its prompt builder through apply_budget() before submitting.
+    """
+
+    def __init__(self, parent=None, default_budget=DEFAULT_PROMPT_BUDGET, unit="prompt"):
+        super().__init__(parent)
+        self.unit = unit
+        self.prompt_source = None
+        self.fitted_context = ""  # Context text behind the last prompt apply_budget() returned
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.projection_label = QLabel("Projected prompt: -")
+        self.projection_label.setStyleSheet("font-size: 11px; color: #495057;")
+        layout.addWidget(self.projection_label, 1)
+
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(1000, 2000000)
+        self.budget_spin.setSingleStep(10000)
+        self.budget_spin.setValue(default_budget)
+        self.budget_spin.setSuffix(" tokens")
+        self.budget_spin.setToolTip("Largest prompt to send in one request")
+        self.budget_spin.valueChanged.connect(self.schedule_update)
+        layout.addWidget(self.budget_spin)
+
+        self.auto_trim_checkbox = QCheckBox("Auto-trim to fit")
+        self.auto_trim_checkbox.setChecked(True)
+        self.auto_trim_checkbox.setToolTip("Trim transcript context (and annotation detail where possible) so the prompt fits the budget")
+        layout.addWidget(self.auto_trim_checkbox)
+
+        # Debounce projections while the user types
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(400)
+        self._timer.timeout.connect(self.refresh)
+
+    def budget(self):
+        return self.budget_spin.value()
+
+    def auto_trim(self):
+        return self.auto_trim_checkbox.isChecked()
+
+    def set_prompt_source(self, prompt_source):
+        """Callable returning the prompt the dialog would currently send (or None)"""
+        self.prompt_source = prompt_source
+        self.schedule_update()
+
+    def schedule_update(self, *args):
+        self._timer.start()
+
+    def refresh(self):
+        """Re-estimate the prompt from the registered source"""
+        if not self.prompt_source:
+            return
+        try:
+            prompt = self.prompt_source()
+        except Exception as e:
+            print(f"[TOKEN BUDGET] Could not build prompt for projection: {e}")
+            return
+        if prompt:
+            self.show_projection(get_token_estimator().estimate(prompt))
+
+    def show_projection(self, tokens, dropped_blocks=0, note=""):
+        """Display a projected token count, highlighted when it is over budget"""
+        over = tokens > self.budget()
+        text = f"Projected {self.unit}: ~{tokens:,} tokens"
+        if dropped_blocks:
+            text += f" (trimmed {dropped_blocks} context blocks)"
+        if note:
+            text += f" {note}"
+        if over:
+            text += f" - over the {self.budget():,} budget"
+        self.projection_label.setText(text)
+        self.projection_label.setStyleSheet(f"font-size: 11px; color: {'#dc3545' if over else '#495057'};")
+
+    def apply_budget(self, build_prompt, context_text="", compact_build_prompt=None):
+        """
+        Build the prompt and hold it to the budget: trim context_text (then fall back to
+        compact_build_prompt) when auto-trim is on, and ask before sending anything still
+        over budget. Returns the prompt, or None if the user cancels; the (possibly trimmed)
+        context it was built from is left in fitted_context.
+        """
+        estimator = get_token_estimator()
+        budget = self.budget()
+
+        prompt = build_prompt(context_text)
+        tokens = estimator.estimate(prompt)
+        dropped = 0
+        self.fitted_context = context_text
+
+        if tokens > budget and self.auto_trim():
+            for builder in [build_prompt, compact_build_prompt]:
+                if builder is None:
+                    continue
+                overhead = estimator.estimate(builder(""))
+                self.fitted_context, dropped = trim_blocks_to_budget(context_text, max(0, budget - overhead), estimator)
+                prompt = builder(self.fitted_context)
+                tokens = estimator.estimate(prompt)
+                if tokens <= budget:
+                    break
+            print(f"[TOKEN BUDGET] Trimmed prompt to ~{tokens:,} tokens (budget {budget:,}, {dropped} blocks dropped)")
+
+        self.show_projection(tokens, dropped)
+        if tokens <= budget:
+            return prompt
+
+        reply = QMessageBox.question(
+            self.window(), "Prompt Over Budget",
+            f"The prompt is projected at ~{tokens:,} tokens, over the {budget:,} token budget.\n\n"
+            f"Large prompts are slow, expensive and may fail with a token limit error. Send it anyway?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        return prompt if reply == QMessageBox.StandardButton.Yes else None
@@ -0,0 +1,81 @@
+"""
+Prompt Templates for Scriptoria
+
+Every AI prompt is laid out in the same order: the instructions, then the transcript, then the
+annotation context, and only then the per-request part - the user's question, the thinking
+budget, length targets, follow-up history. Everything before the request stays byte-identical
+across repeated questions and follow-ups on the same document, so provider-side prefix caching
+can reuse it. Templates are registered by name; rendering returns the prompt text with the
+section boundaries and the byte length of the stable prefix attached.
+"""
+
+SECTION_ORDER = ('instructions', 'transcript', 'annotations', 'request')
+SECTION_SEPARATOR = "\n\n"
+
+
+class RenderedPrompt(str):
+    """Prompt text that remembers its template and where each section ends"""
+
+    def __new__(cls, text, template_name, section_ends):
+        prompt = super().__new__(cls, text)
+        prompt.template_name = template_name
+        prompt.section_ends = section_ends  # section name -> character offset of its end
+        return prompt
+
+    @property
+    def prefix_length(self):
+        """Characters in the stable prefix (everything before the per-request section)"""
+        return self.section_ends['annotations']
+
+    @property
+    def prefix_bytes(self):
+        """UTF-8 bytes in the stable prefix"""
+        return len(self.prefix().encode('utf-8'))
+
+    def prefix(self, through='annotations'):
+        """Prompt text up to the end of a section"""
+        return self[:self.section_ends[through]]
+
+
+class PromptTemplate:
+    """A named prompt layout"""
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+
+    def render(self, instructions, transcript="", annotations="", request=""):
+        """Join the sections in cache-friendly order (empty sections are left out)"""
+        sections = {'instructions': instructions, 'transcript': transcript,
+                    'annotations': annotations, 'request': request}
+        text = ""
+        section_ends = {}
+        for name in SECTION_ORDER:
+            content = (sections[name] or "").strip('\n')
+            if content:
+                text += (SECTION_SEPARATOR if text else "") + content
+            section_ends[name] = len(text)
+
+        return RenderedPrompt(text, self.name, section_ends)
+
+
+_templates = {}
+
+
+def register_prompt_template(name, description=""):
+    """Register (or return the already registered) template for a prompt"""
+    if name not in _templates:
+        _templates[name] = PromptTemplate(name, description)
+    return _templates[name]
+
+
+def get_prompt_template(name):
+    """Registered template by name"""
+    return _templates[name]
+
+
+register_prompt_template('generate_annotations', "Generate Annotations - story segment selection")
+register_prompt_template('generate_notes', "Generate Notes - notes and commentary for existing annotations")
+register_prompt_template('ask_gemini', "Ask Gemini - questions about the annotations")
+register_prompt_template('generate_script', "AI Generate Script - storyboard ordering")
+register_prompt_template('generate_script_followup', "AI Generate Script - follow-up requests")
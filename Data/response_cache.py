@@ -0,0 +1,164 @@
+"""
+AI Response Cache for Scriptoria
+
+On-disk cache of complete Gemini responses, keyed by a SHA-256 of everything that
+determines the answer (model, prompt, temperature, top_p, thinking budget). Re-running a
+dialog with an identical prompt - after a crash, or to re-apply results - is answered from
+disk instead of the API. Entries are one JSON file each; the directory is kept under a size
+limit by evicting the least recently used entries.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ai_response_cache")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Bump when the key inputs or entry layout change so old entries are never misread
+CACHE_FORMAT_VERSION = 1
+
+
+def request_cache_key(request):
+    """Content address for an AIRequest (prompt plus every generation setting that changes the output)"""
+    key_data = json.dumps({
+        'version': CACHE_FORMAT_VERSION,
+        'model': request.model,
+        'prompt': request.prompt,
+        'temperature': request.temperature,
+        'top_p': request.top_p,
+        'thinking_budget': request.thinking_budget,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of response text on disk (safe to use from the engine's pool threads)"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries = None  # key -> [size, last_access], loaded on first use
+        self._total_bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        """Scan the cache directory once; file mtimes double as last-access times"""
+        if self._entries is not None:
+            return
+        self._entries = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self._entries[name[:-5]] = [stat.st_size, stat.st_mtime]
+            self._total_bytes += stat.st_size
+
+    def get(self, request):
+        """Return the cached entry dict ({'response', 'usage', ...}) for this request, or None"""
+        if not self.enabled:
+            return None
+        key = request_cache_key(request)
+        with self._lock:
+            self._load_index()
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                now = time.time()
+                os.utime(path, (now, now))  # Persist recency for the next session's LRU order
+                self._entries[key][1] = now
+                return entry
+            except Exception as e:
+                print(f"[RESPONSE CACHE] Dropping unreadable entry {key[:12]}: {e}")
+                self._remove(key)
+                return None
+
+    def put(self, request, response_text, usage=None):
+        """Store a complete response and evict least recently used entries beyond max_bytes"""
+        if not self.enabled or not response_text:
+            return
+        key = request_cache_key(request)
+        entry = {
+            'model': request.model,
+            'label': request.label,
+            'created': time.time(),
+            'response': response_text,
+            'usage': usage,
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key)
+                temp_path = f"{path}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)  # Never leave a half-written entry behind
+            except Exception as e:
+                print(f"[RESPONSE CACHE] Could not store response: {e}")
+                return
+
+            if key in self._entries:
+                self._total_bytes -= self._entries[key][0]
+            self._entries[key] = [len(data), time.time()]
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            print(f"[RESPONSE CACHE] Evicted {key[:12]} (cache now {self._total_bytes:,} bytes)")
+
+    def _remove(self, key):
+        size = self._entries.pop(key, [0])[0]
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Delete every cached response"""
+        with self._lock:
+            self._load_index()
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """(entry count, total bytes)"""
+        with self._lock:
+            self._load_index()
+            return len(self._entries), self._total_bytes
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """Get the process-wide ResponseCache instance"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,158 @@
+"""
+Response Records for Scriptoria
+
+Incremental parsing of the record formats the AI dialogs ask Gemini for:
+[[ANNOTATION :: ...]] and [[NOTES :: ...]] blocks, and "annotation-id :: Order#N" lines
+(plus DIVIDER and HEADER variants) for the storyboard. A record stream is fed response
+chunks as they arrive and hands back each record as soon as it is closed, so dialogs can
+show - and validate - results while the model is still generating. The same streams parse
+complete responses, so streamed and non-streamed output go through one code path.
+"""
+
+import re
+
+
+ANNOTATION_RECORD = re.compile(r'\[\[ANNOTATION\s*::\s*([^:]+?)\s*::\s*([^:]+?)\s*::\s*(.+?)\s*::\s*([^:]+?)\s*::\s*([^\]]+?)\]\]', re.DOTALL)
+NOTES_RECORD = re.compile(r'\[\[NOTES\s*::\s*([^:]+?)\s*::\s*([^:]+?)\s*::\s*([^\]]+?)\]\]', re.DOTALL)
+HEADER_HTML_TEXT = re.compile(r'<b[^>]*>([^<]+)</b>')
+
+
+class BracketRecordStream:
+    """Splits streamed text into complete [[TAG ... ]] blocks"""
+
+    def __init__(self, tag):
+        self.opener = f"[[{tag}"
+        self._chunks = []
+        self._buffer = ""
+        self._scan_from = 0  # Where to resume looking for "]]" in an open record
+
+    def feed(self, chunk_text):
+        """Add a chunk; returns the blocks it completed"""
+        self._chunks.append(chunk_text)
+        self._buffer += chunk_text
+        records = []
+        while True:
+            start = self._buffer.find(self.opener)
+            if start == -1:
+                # Keep a possible partial opener at the end of the buffer
+                self._buffer = self._buffer[-(len(self.opener) - 1):]
+                self._scan_from = 0
+                break
+            if start:
+                self._buffer = self._buffer[start:]
+                self._scan_from = 0
+            end = self._buffer.find(']]', max(len(self.opener), self._scan_from))
+            if end == -1:
+                self._scan_from = max(len(self.opener), len(self._buffer) - 1)
+                break
+            records.append(self._buffer[:end + 2])
+            self._buffer = self._buffer[end + 2:]
+            self._scan_from = 0
+        return records
+
+    def finish(self):
+        """End of response; an unclosed block is dropped"""
+        if self._buffer.startswith(self.opener):
+            print(f"[RESPONSE RECORDS] Dropping unterminated {self.opener} block ({len(self._buffer)} chars)")
+        self._buffer = ""
+        return []
+
+    def text(self):
+        """Everything fed so far"""
+        return ''.join(self._chunks)
+
+
+class LineRecordStream:
+    """Splits streamed text into complete "a :: b" lines"""
+
+    def __init__(self):
+        self._chunks = []
+        self._buffer = ""
+
+    def feed(self, chunk_text):
+        """Add a chunk; returns the record lines it completed"""
+        self._chunks.append(chunk_text)
+        self._buffer += chunk_text
+        if '\n' not in chunk_text:
+            return []
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
+        return [line for line in lines if '::' in line]
+
+    def finish(self):
+        """End of response; returns the last line if it is a record"""
+        line, self._buffer = self._buffer, ""
+        return [line] if '::' in line else []
+
+    def text(self):
+        """Everything fed so far"""
+        return ''.join(self._chunks)
+
+
+def iter_bracket_records(response_text, tag):
+    """All complete [[TAG ... ]] blocks in a full response"""
+    stream = BracketRecordStream(tag)
+    return stream.feed(response_text) + stream.finish()
+
+
+def iter_line_records(response_text):
+    """All "a :: b" record lines in a full response"""
+    stream = LineRecordStream()
+    return stream.feed(response_text) + stream.finish()
+
+
+def parse_annotation_record(block):
+    """(primary scene, secondary scenes, text, brief note, detailed footnote) from an ANNOTATION block, or None"""
+    # Line breaks inside a block are layout, not content
+    normalized = block.replace('\n', ' ').replace('  ', ' ')
+    match = ANNOTATION_RECORD.fullmatch(normalized.strip())
+    if not match:
+        return None
+    return tuple(field.strip() for field in match.groups())
+
+
+def parse_notes_record(block):
+    """(annotation id, brief notes, detailed notes) from a NOTES block, or None"""
+    match = NOTES_RECORD.fullmatch(block.strip())
+    if not match:
+        return None
+    return tuple(field.strip() for field in match.groups())
+
+
+def parse_order_line(line):
+    """
+    Parse a storyboard ordering line into a dict - {'type': 'divider', 'order', 'title', 'color'}
+    or {'type': 'annotation', 'id', 'order', 'header'}. Returns None for lines that are not
+    records; raises ValueError for records with a malformed order number.
+    """
+    if '::' not in line:
+        return None
+    parts = [p.strip() for p in line.split('::')]
+
+    # Dividers: DIVIDER :: "Section Name" :: Order#X :: #color
+    if parts[0] == 'DIVIDER' and len(parts) >= 4:
+        return {
+            'type': 'divider',
+            'order': int(parts[2].replace('Order#', '')),
+            'title': parts[1].strip('"'),
+            'color': parts[3],
+        }
+
+    # Annotations with optional headers: id :: Order#X [:: HEADER :: "Title"]
+    if len(parts) >= 2:
+        header_text = None
+        if len(parts) >= 4 and parts[2] == 'HEADER':
+            header_text = parts[3].strip('"')
+            # Handle case where AI incorrectly included HTML
+            if header_text.startswith('<div>') and header_text.endswith('</div>'):
+                match = HEADER_HTML_TEXT.search(header_text)
+                if match:
+                    header_text = match.group(1)
+        return {
+            'type': 'annotation',
+            'id': parts[0],
+            'order': int(parts[1].replace('Order#', '')),
+            'header': header_text,
+        }
+
+    return None
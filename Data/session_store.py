@@ -0,0 +1,217 @@
+"""
+Session Store for Scriptoria
+
+Journaled persistence for small edits to a .scriptoria session. Rewriting a multi-megabyte
+session JSON to persist a title or one annotation's notes costs a full parse and a full
+serialization; instead each edit is appended to a sidecar journal (`<session>.journal`, one
+JSON record per line) and the session is only rewritten when the journal is compacted - when
+a dialog that journaled edits closes, from the main window's save through
+compact_main_window_session(), once the journal grows past a size limit, or after the session
+has been idle for a while. Journal records only set the dialogs' own top-level keys, which the
+app does not write, so they are newer than whatever the session file holds: if the app
+rewrites the session before compaction, the records are replayed onto the new file.
+
+Readers go through the store, which parses the session once (re-parsing only when the file
+on disk changes) and replays the journal on top, so they always see journaled edits.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+
+JOURNAL_SUFFIX = ".journal"
+COMPACT_JOURNAL_BYTES = 256 * 1024  # Fold the journal into the session once it is this large
+IDLE_COMPACT_MS = 30000             # ... or after this long without further edits
+
+
+def write_session_file(path, data):
+    """Atomically write session data as indented JSON"""
+    temp_file = None
+    try:
+        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False,
+                                         dir=os.path.dirname(path) or None) as tf:
+            temp_file = tf.name
+            json.dump(data, tf, indent=2, ensure_ascii=False)
+        os.replace(temp_file, path)
+        temp_file = None
+    finally:
+        if temp_file and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+class SessionStore:
+    """Cached, journaled view of one session file"""
+
+    def __init__(self, session_file):
+        self.session_file = session_file
+        self.journal_file = session_file + JOURNAL_SUFFIX
+        self._lock = threading.RLock()
+        self._base_signature = None
+        self._data = None     # session data with the current journal records applied
+        self._journal = []    # parsed journal records
+        self._idle_timer = None
+
+    def _signature(self, path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _ensure_current(self):
+        """Re-read the session and journal if the session file changed on disk"""
+        signature = self._signature(self.session_file)
+        if self._data is not None and signature == self._base_signature:
+            return
+        self._base_signature = signature
+        self._journal = self._read_journal()
+        data = {}
+        if signature:
+            with open(self.session_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        # Replayed even if the app rewrote the session since they were journaled
+        for record in self._journal:
+            self._apply(data, record)
+        self._data = data
+
+    def _read_journal(self):
+        records = []
+        if not os.path.exists(self.journal_file):
+            return records
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A record cut short by a crash mid-append
+                    print(f"[SESSION STORE] Ignoring truncated journal record in {self.journal_file}")
+        return records
+
+    def _apply(self, data, record):
+        if record.get('op') == 'set':
+            data.update(record.get('values', {}))
+
+    def load(self):
+        """Return the session data with journaled edits applied (a fresh top-level dict; values are shared)"""
+        with self._lock:
+            self._ensure_current()
+            return dict(self._data)
+
+    def get(self, key, default=None):
+        """Top-level session value"""
+        with self._lock:
+            self._ensure_current()
+            return self._data.get(key, default)
+
+    def _append(self, record):
+        with self._lock:
+            self._ensure_current()
+            line = json.dumps(record, ensure_ascii=False) + '\n'
+            if not self._journal_ends_cleanly():
+                line = '\n' + line  # Keep a record cut short by a crash on its own line
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal.append(record)
+            self._apply(self._data, record)
+
+            if os.path.getsize(self.journal_file) >= COMPACT_JOURNAL_BYTES:
+                self.compact()
+            else:
+                self._schedule_idle_compact()
+
+    def _journal_ends_cleanly(self):
+        try:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b'\n'
+        except OSError:
+            return True  # Missing or empty journal
+
+    def set_values(self, values):
+        """Journal new values for top-level session keys"""
+        self._append({'op': 'set', 'values': dict(values)})
+
+    def has_pending_journal(self):
+        return os.path.exists(self.journal_file)
+
+    def compact(self):
+        """Rewrite the session with the journal folded in and remove the journal"""
+        with self._lock:
+            if not self.has_pending_journal():
+                return False
+            self._ensure_current()
+            if self._base_signature is None:
+                print(f"[SESSION STORE] Session file missing - keeping journal {self.journal_file}")
+                return False
+
+            if self._journal:
+                write_session_file(self.session_file, self._data)
+            os.remove(self.journal_file)
+
+            self._journal = []
+            self._base_signature = self._signature(self.session_file)
+            print(f"[SESSION STORE] Compacted journal into {os.path.basename(self.session_file)}")
+            return True
+
+    def _schedule_idle_compact(self):
+        """Restart the idle timer (only when a Qt event loop is available)"""
+        try:
+            from PyQt6.QtCore import QTimer, QCoreApplication
+        except ImportError:
+            return
+        if QCoreApplication.instance() is None:
+            return
+        if self._idle_timer is None:
+            self._idle_timer = QTimer()
+            self._idle_timer.setSingleShot(True)
+            self._idle_timer.setInterval(IDLE_COMPACT_MS)
+            self._idle_timer.timeout.connect(self._compact_quietly)
+        self._idle_timer.start()
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"[SESSION STORE] Idle compaction failed: {e}")
+
+
+_session_stores = {}
+
+
+def get_session_store(session_file):
+    """Get the shared SessionStore for a session file path"""
+    if not session_file:
+        return None
+    key = os.path.abspath(session_file)
+    store = _session_stores.get(key)
+    if store is None:
+        store = SessionStore(session_file)
+        _session_stores[key] = store
+    return store
+
+
+def get_main_window_session_store(main_window):
+    """SessionStore for the main window's current session, or None if no session file exists"""
+    session_file = getattr(main_window, 'current_session_file', None)
+    if not session_file or not os.path.exists(session_file):
+        return None
+    return get_session_store(session_file)
+
+
+def compact_main_window_session(main_window):
+    """Fold any journaled edits into the main window's session file - call before the app saves or reads it"""
+    session_store = get_main_window_session_store(main_window)
+    if session_store is None or not session_store.has_pending_journal():
+        return False
+    try:
+        return session_store.compact()
+    except Exception as e:
+        print(f"[SESSION STORE] Compaction failed: {e}")
+        return False
@@ -0,0 +1,217 @@
+"""
+Streaming Text Sink for Scriptoria
+
+Append-only sink for streaming AI responses into a QTextEdit/QTextBrowser. Chunks are
+buffered and inserted at the end of the document with a QTextCursor on a short timer, so a
+long response costs one incremental insert per repaint interval instead of re-setting (and
+re-laying out) the whole document for every chunk.
+
+StreamingMarkdownSink does the same for markdown answers: each block (paragraph, header,
+list) is rendered to HTML once, as soon as the text after it shows it is complete, and only
+the unfinished tail is shown as raw text.
+"""
+
+import re
+
+from PyQt6.QtCore import QObject, QTimer
+from PyQt6.QtGui import QTextCursor, QTextBlockFormat, QTextCharFormat
+
+
+DEFAULT_FLUSH_INTERVAL_MS = 50
+
+HEADER_LINE = re.compile(r'^#{1,3} ')
+LIST_ITEM_LINE = re.compile(r'^(\* |- |\d+\. )')
+
+
+class StreamingTextSink(QObject):
+    """Coalesces streamed chunks and appends them to a text widget"""
+
+    def __init__(self, text_edit, interval_ms=DEFAULT_FLUSH_INTERVAL_MS, auto_scroll=True):
+        super().__init__(text_edit)
+        self.text_edit = text_edit
+        self.auto_scroll = auto_scroll
+        self._pending = []
+        self._chunks = []  # Everything appended since the last clear()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def append(self, chunk_text):
+        """Queue a chunk; it is painted on the next timer tick"""
+        if not chunk_text:
+            return
+        self._pending.append(chunk_text)
+        self._chunks.append(chunk_text)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Insert all queued chunks at the end of the document now"""
+        self._timer.stop()
+        if not self._pending:
+            return
+
+        text = ''.join(self._pending)
+        self._pending = []
+
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+
+        if self.auto_scroll:
+            scrollbar = self.text_edit.verticalScrollBar()
+            scrollbar.setValue(scrollbar.maximum())
+
+    def discard(self):
+        """Drop queued chunks without painting them (before replacing the widget content)"""
+        self._timer.stop()
+        self._pending = []
+
+    def clear(self):
+        """Drop queued chunks and clear the widget"""
+        self.discard()
+        self._chunks = []
+        self.text_edit.clear()
+
+    def reset(self):
+        """Start a new stream without touching the widget content"""
+        self.discard()
+        self._chunks = []
+
+    def text(self):
+        """All text appended since the last clear()/reset()"""
+        return ''.join(self._chunks)
+
+
+def split_markdown_blocks(text, final=False):
+    """Split streamed markdown into completed blocks and the remainder that may still grow"""
+    if final:
+        lines = text.split('\n')
+        remainder = ""
+    else:
+        cut = text.rfind('\n')
+        if cut < 0:
+            return [], text
+        lines = text[:cut].split('\n')
+        remainder = text[cut + 1:]
+
+    blocks = []
+    current = []
+    current_kind = None
+
+    for line in lines:
+        if not line.strip():
+            # Blank lines end a paragraph; list items separated by blank lines stay one list
+            if current_kind == 'text':
+                blocks.append('\n'.join(current))
+                current, current_kind = [], None
+            continue
+
+        if HEADER_LINE.match(line):
+            kind = 'header'
+        elif LIST_ITEM_LINE.match(line):
+            kind = 'list'
+        else:
+            kind = 'text'
+
+        if current and (kind != current_kind or kind == 'header'):
+            blocks.append('\n'.join(current))
+            current = []
+        current.append(line)
+        current_kind = kind
+
+    # The last block is only complete once something different follows it
+    if current:
+        if final:
+            blocks.append('\n'.join(current))
+        else:
+            remainder = '\n'.join(current) + '\n' + remainder
+
+    return blocks, remainder
+
+
+class StreamingMarkdownSink(StreamingTextSink):
+    """Renders streamed markdown block by block, appending only the HTML of newly completed blocks"""
+
+    def __init__(self, text_edit, render_html, interval_ms=DEFAULT_FLUSH_INTERVAL_MS, auto_scroll=True):
+        super().__init__(text_edit, interval_ms, auto_scroll)
+        self.render_html = render_html  # markdown block -> HTML (links, formatting)
+        self._remainder = ""            # Streamed text not yet rendered
+        self._tail_start = None         # Document position of the raw preview of _remainder
+        self._has_blocks = False
+
+    def flush(self):
+        """Render newly completed blocks and refresh the raw preview of the unfinished tail"""
+        self._timer.stop()
+        if not self._pending:
+            return
+
+        self._remainder += ''.join(self._pending)
+        self._pending = []
+        blocks, self._remainder = split_markdown_blocks(self._remainder)
+        self._paint(blocks)
+
+    def finish(self, full_text=None):
+        """Render whatever is left; re-render from scratch only if full_text differs from what was streamed"""
+        self._timer.stop()
+        if full_text is not None and full_text != self.text():
+            # Nothing (or something else) was streamed - render the complete response in one go
+            self.reset()
+            self._chunks = [full_text]
+            self.text_edit.setHtml(self.render_html(full_text))
+            return
+
+        self._remainder += ''.join(self._pending)
+        self._pending = []
+        blocks, self._remainder = split_markdown_blocks(self._remainder, final=True)
+        self._paint(blocks)
+
+    def _paint(self, blocks):
+        cursor = QTextCursor(self.text_edit.document())
+
+        # Drop the previous raw preview; it is re-inserted below as HTML and/or a new preview
+        if self._tail_start is not None:
+            cursor.setPosition(self._tail_start)
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+            self._tail_start = None
+
+        for block in blocks:
+            html = self.render_html(block)
+            if not html.strip():
+                continue
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            if self._has_blocks:
+                cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+            cursor.insertHtml(html)
+            self._has_blocks = True
+
+        if self._remainder.strip():
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            self._tail_start = cursor.position()
+            if self._has_blocks:
+                cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+            cursor.insertText(self._remainder.strip('\n'), QTextCharFormat())
+
+        if self.auto_scroll:
+            scrollbar = self.text_edit.verticalScrollBar()
+            scrollbar.setValue(scrollbar.maximum())
+
+    def discard(self):
+        """Drop queued chunks without painting them"""
+        super().discard()
+        self._remainder = ""
+
+    def clear(self):
+        """Drop all streamed state and clear the widget"""
+        super().clear()
+        self._tail_start = None
+        self._has_blocks = False
+
+    def reset(self):
+        """Start a new stream without touching the widget content"""
+        super().reset()
+        self._tail_start = None
+        self._has_blocks = False
@@ -0,0 +1,103 @@
+"""
+Theme View Item Cache for Scriptoria
+
+Caches which theme view list items show each annotation: annotation_id ->
+[(tab index, list widget, QListWidgetItem)], across every scene tab an annotation appears in.
+Per-annotation updates (notes, icons) look their items up here instead of walking every item
+of every tab.
+
+The theme view inserts and removes items in main window code that does not report those
+changes, so the cache is never updated in place. Each lookup compares a cheap structural
+fingerprint of the tabs (per tab: widget, item count and end items - O(tabs), not O(items))
+with the one taken at the last scan and rescans everything when it differs. The fingerprint
+misses rows replaced in the middle of a tab, so every hit is also checked - the item must
+still belong to its list widget, hold the annotation and have an item widget - and a stale
+hit or a miss forces a rescan.
+"""
+
+from PyQt6.QtCore import Qt
+
+
+class ThemeViewItemCache:
+    """annotation_id -> theme view items cache for one scene tab widget, rescanned when the tabs change"""
+
+    def __init__(self, scene_tabs):
+        self.scene_tabs = scene_tabs
+        self._items = {}
+        self._fingerprint = None
+
+    def _list_widgets(self):
+        for i in range(self.scene_tabs.count()):
+            list_widget = self.scene_tabs.widget(i)
+            if list_widget is not None and hasattr(list_widget, 'count') and hasattr(list_widget, 'itemWidget'):
+                yield i, list_widget
+
+    def _current_fingerprint(self):
+        """Tab widgets, item counts and end items - changes whenever a tab is rebuilt or items come and go"""
+        fingerprint = []
+        for i, list_widget in self._list_widgets():
+            count = list_widget.count()
+            ends = (id(list_widget.item(0)), id(list_widget.item(count - 1))) if count else (None, None)
+            fingerprint.append((i, id(list_widget), count) + ends)
+        return tuple(fingerprint)
+
+    def rebuild(self):
+        """Scan every tab once and index its items by annotation ID"""
+        self._items = {}
+        total = 0
+        for i, list_widget in self._list_widgets():
+            for row in range(list_widget.count()):
+                item = list_widget.item(row)
+                annotation_id = item.data(Qt.ItemDataRole.UserRole) if item else None
+                if annotation_id and list_widget.itemWidget(item) is not None:
+                    self._items.setdefault(annotation_id, []).append((i, list_widget, item))
+                    total += 1
+        self._fingerprint = self._current_fingerprint()
+        print(f"[THEME VIEW CACHE] Indexed {total} items for {len(self._items)} annotations")
+
+    def invalidate(self):
+        """Force a rescan on next lookup"""
+        self._fingerprint = None
+
+    def _ensure_current(self):
+        """Rescan if the tabs changed shape; returns whether it did"""
+        if self._fingerprint != self._current_fingerprint():
+            self.rebuild()
+            return True
+        return False
+
+    def _live_entries(self, annotation_id):
+        """Cached entries with their item widgets, or None if any of them is stale"""
+        entries = []
+        for i, list_widget, item in self._items.get(annotation_id, []):
+            try:
+                # A row replaced in the middle of a tab keeps the fingerprint, but its old item is detached
+                if item.listWidget() is not list_widget or item.data(Qt.ItemDataRole.UserRole) != annotation_id:
+                    return None
+                item_widget = list_widget.itemWidget(item)
+            except RuntimeError:  # The underlying Qt item or widget was deleted
+                return None
+            if item_widget is None:
+                return None
+            entries.append((i, list_widget, item, item_widget))
+        return entries
+
+    def entries(self, annotation_id):
+        """[(tab index, list widget, item, item widget)] for every theme view item showing this annotation"""
+        rescanned = self._ensure_current()
+        entries = self._live_entries(annotation_id)
+        if not entries and not rescanned:
+            self.rebuild()
+            entries = self._live_entries(annotation_id) or []
+        return entries
+
+
+def get_theme_view_item_cache(scene_tabs):
+    """Get the ThemeViewItemCache for a scene tab widget (kept on the widget, created on first use)"""
+    if scene_tabs is None:
+        return None
+    cache = getattr(scene_tabs, '_theme_view_item_cache', None)
+    if cache is None:
+        cache = ThemeViewItemCache(scene_tabs)
+        scene_tabs._theme_view_item_cache = cache
+    return cache
@@ -0,0 +1,117 @@
+"""
+Token Budget for Scriptoria
+
+Local prompt-size estimation for the AI dialogs. Token counts are projected from character
+counts with a chars-per-token ratio that is calibrated against the promptTokenCount Gemini
+reports for real requests, so dialogs can show a projected prompt size, trim transcript
+context to a user-set budget, and refuse oversized prompts before a multi-minute request
+fails with MAX_TOKENS. The dialogs' budget widget is in prompt_budget_controls; this module
+has no Qt dependency.
+"""
+
+import json
+import math
+import os
+import threading
+
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_PROMPT_BUDGET = 200000
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "token_calibration.json")
+
+# Weight of each new observation in the running chars-per-token average
+CALIBRATION_WEIGHT = 0.2
+MIN_CHARS_PER_TOKEN = 1.5
+MAX_CHARS_PER_TOKEN = 8.0
+
+
+class TokenEstimator:
+    """Character-count token estimate with a ratio learned from usage_metadata"""
+
+    def __init__(self, calibration_path=CALIBRATION_PATH):
+        self.calibration_path = calibration_path
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.calibration_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            ratio = float(data.get('chars_per_token', DEFAULT_CHARS_PER_TOKEN))
+            if MIN_CHARS_PER_TOKEN <= ratio <= MAX_CHARS_PER_TOKEN:
+                self.chars_per_token = ratio
+                self.samples = int(data.get('samples', 0))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[TOKEN BUDGET] Could not read calibration: {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.calibration_path), exist_ok=True)
+            with open(self.calibration_path, 'w', encoding='utf-8') as f:
+                json.dump({'chars_per_token': self.chars_per_token, 'samples': self.samples}, f)
+        except Exception as e:
+            print(f"[TOKEN BUDGET] Could not save calibration: {e}")
+
+    def estimate(self, text):
+        """Projected token count for text"""
+        if not text:
+            return 0
+        return int(math.ceil(len(text) / self.chars_per_token))
+
+    def chars_for_tokens(self, tokens):
+        """How many characters fit in this many tokens"""
+        return max(0, int(tokens * self.chars_per_token))
+
+    def record_usage(self, prompt_chars, prompt_tokens):
+        """Fold a real (prompt length, promptTokenCount) pair into the ratio - called from the engine's pool threads"""
+        if not prompt_chars or not prompt_tokens:
+            return
+        observed = prompt_chars / prompt_tokens
+        if not MIN_CHARS_PER_TOKEN <= observed <= MAX_CHARS_PER_TOKEN:
+            return
+        with self._lock:
+            if self.samples == 0:
+                self.chars_per_token = observed
+            else:
+                self.chars_per_token += CALIBRATION_WEIGHT * (observed - self.chars_per_token)
+            self.samples += 1
+            print(f"[TOKEN BUDGET] Calibrated to {self.chars_per_token:.2f} chars/token "
+                  f"({prompt_chars:,} chars = {prompt_tokens:,} tokens, {self.samples} samples)")
+            self._save()
+
+
+def trim_blocks_to_budget(text, max_tokens, estimator=None, separator='\n\n'):
+    """Keep whole blocks (speech blocks by default) from the start of text until max_tokens; returns (text, dropped_count)"""
+    estimator = estimator or get_token_estimator()
+    if estimator.estimate(text) <= max_tokens:
+        return text, 0
+
+    blocks = text.split(separator)
+    max_chars = estimator.chars_for_tokens(max_tokens) - 100  # Room for the omission marker
+    kept = []
+    size = 0
+    for block in blocks:
+        if size + len(block) + len(separator) > max_chars:
+            break
+        kept.append(block)
+        size += len(block) + len(separator)
+
+    dropped = len(blocks) - len(kept)
+    if dropped:
+        kept.append(f"[... {dropped} further blocks omitted to fit the prompt token budget ...]")
+    return separator.join(kept), dropped
+
+
+_token_estimator = None
+
+
+def get_token_estimator():
+    """Get the process-wide TokenEstimator instance"""
+    global _token_estimator
+    if _token_estimator is None:
+        _token_estimator = TokenEstimator()
+    return _token_estimator
@@ -0,0 +1,156 @@
+"""
+Transcript Cache for Scriptoria
+
+Extracts the clean "Speaker: content" transcript text from the web view once and shares
+it between all AI dialogs (Generate Annotations, Generate Notes, Ask Gemini, AI Generate
+Script). Entries are keyed on a per-document revision counter that is bumped whenever the
+transcript HTML reloads or annotations change, so dialogs opened against an unchanged
+document skip the toHtml round trip and the full DOM parse.
+
+The text comes from the rendered DOM whenever there is a web view, since that is the text
+annotation creation searches; the session's structured input (the .scriptoria `input.text`)
+is only used without a web view or when the DOM holds no transcript. Callers always get the
+text through a callback - there is no blocking variant.
+"""
+
+try:
+    from .transcript_extractor import extract_transcript_text, extract_input_text_transcript
+    from .session_store import get_main_window_session_store
+except ImportError:
+    from transcript_extractor import extract_transcript_text, extract_input_text_transcript
+    from session_store import get_main_window_session_store
+
+
+def load_session_input_text(main_window):
+    """Read the transcript input text from the current .scriptoria session file"""
+    session_store = get_main_window_session_store(main_window)
+    if not session_store:
+        return ""
+
+    try:
+        return session_store.get('input', {}).get('text', '') or ""
+    except Exception as e:
+        print(f"[TRANSCRIPT CACHE] Error reading session input text: {e}")
+        return ""
+
+
+class TranscriptCache:
+    """
+    Transcript text cache keyed on a document revision counter.
+
+    The revision lives on the web view as `document_revision`; anything that changes the
+    transcript HTML or its annotations calls invalidate() (or bumps the attribute) and the
+    next request re-extracts.
+    """
+
+    def __init__(self):
+        self._entries = {}   # id(web_view) -> (revision, transcript_text)
+        self._pending = {}   # id(web_view) -> (revision, [callbacks]) while toHtml is in flight
+        self._watched = set()
+
+    def get_revision(self, web_view):
+        """Current document revision for this web view"""
+        return getattr(web_view, 'document_revision', 0)
+
+    def invalidate(self, web_view, reason=""):
+        """Bump the document revision so cached transcript text is re-extracted"""
+        if not web_view:
+            return
+        revision = self.get_revision(web_view) + 1
+        try:
+            web_view.document_revision = revision
+        except Exception as e:
+            print(f"[TRANSCRIPT CACHE] Could not store revision on web view: {e}")
+            self._entries.pop(id(web_view), None)
+        print(f"[TRANSCRIPT CACHE] Document revision -> {revision}{f' ({reason})' if reason else ''}")
+
+    def get_cached(self, web_view):
+        """Return cached transcript text for the current revision, or None"""
+        if not web_view:
+            return None
+        entry = self._entries.get(id(web_view))
+        if entry and entry[0] == self.get_revision(web_view):
+            return entry[1]
+        return None
+
+    def build_from_session(self, main_window):
+        """Build transcript text from the session's structured input ("" if unavailable)"""
+        if not main_window:
+            return ""
+        return extract_input_text_transcript(load_session_input_text(main_window))
+
+    def request_transcript(self, web_view, callback, main_window=None):
+        """Call callback(transcript_text) - immediately on a cache hit or without a web view, otherwise after one toHtml extraction"""
+        if not web_view:
+            callback(self.build_from_session(main_window))
+            return
+
+        self._watch(web_view)
+
+        cached = self.get_cached(web_view)
+        if cached is not None:
+            print(f"[TRANSCRIPT CACHE] Hit for revision {self.get_revision(web_view)} ({len(cached)} characters)")
+            callback(cached)
+            return
+
+        key = id(web_view)
+        revision = self.get_revision(web_view)
+
+        # Share an in-flight extraction with other dialogs asking for the same revision
+        pending = self._pending.get(key)
+        if pending and pending[0] == revision:
+            pending[1].append(callback)
+            return
+        self._pending[key] = (revision, [callback])
+
+        def handle_html(html):
+            transcript_text = ""
+            try:
+                transcript_text = extract_transcript_text(html)
+            except Exception as e:
+                print(f"[TRANSCRIPT CACHE] Error extracting transcript: {e}")
+
+            if not transcript_text:
+                # No speech markup in the DOM - fall back to the session's structured input
+                transcript_text = self.build_from_session(main_window)
+
+            if transcript_text:
+                self._entries[key] = (revision, transcript_text)
+
+            waiting = self._pending.get(key)
+            if waiting and waiting[0] == revision:
+                callbacks = self._pending.pop(key)[1]
+            else:
+                callbacks = [callback]
+
+            for waiting_callback in callbacks:
+                try:
+                    waiting_callback(transcript_text)
+                except Exception as e:
+                    print(f"[TRANSCRIPT CACHE] Error in transcript callback: {e}")
+
+        print(f"[TRANSCRIPT CACHE] Miss for revision {revision} - extracting from web view DOM")
+        web_view.page().toHtml(handle_html)
+
+    def _watch(self, web_view):
+        """Invalidate automatically when the transcript page reloads"""
+        key = id(web_view)
+        if key in self._watched:
+            return
+        self._watched.add(key)
+        if hasattr(web_view, 'loadFinished'):
+            try:
+                web_view.loadFinished.connect(lambda ok: self.invalidate(web_view, "transcript reloaded"))
+            except Exception as e:
+                print(f"[TRANSCRIPT CACHE] Could not watch web view reloads: {e}")
+
+
+_transcript_cache = None
+
+
+def get_transcript_cache():
+    """Get the process-wide TranscriptCache instance"""
+    global _transcript_cache
+    if _transcript_cache is None:
+        _transcript_cache = TranscriptCache()
+    return _transcript_cache
@@ -0,0 +1,411 @@
+"""
+Transcript Extractor for Scriptoria
+
+Single-pass extraction of (speech_title, speech_content) pairs from the transcript HTML.
+Built on html.parser events, so the work is linear in the document size no matter how many
+speakers there are - unlike the BeautifulSoup walk, which searched siblings and parents for
+every speech header.
+
+Run this module directly to benchmark it against the BeautifulSoup implementation:
+    python transcript_extractor.py [speech_blocks]
+"""
+
+import os
+import re
+import sys
+import time
+from html.parser import HTMLParser
+
+
+# Elements that never have an end tag (html.parser does not know about them)
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr'
+}
+
+# Elements whose text never belongs to the transcript
+SKIPPED_ELEMENTS = {'style', 'script', 'head'}
+
+FEED_CHUNK_SIZE = 64 * 1024
+
+# Session input text markup: **Title** starts a speech, [[TITLE]] is a main (part) header
+SPEECH_HEADER_LINE = re.compile(r'^\*\*(.+?)\*\*$')
+MAIN_HEADER_LINE = re.compile(r'^\[\[(.+?)\]\]$')
+
+
+class SpeechBlockParser(HTMLParser):
+    """
+    html.parser handler that collects transcript text in document order.
+
+    blocks holds (title, content) pairs from speech-header/speech-content markup; the
+    speech-section, speech-content and plain-text fallbacks used by older transcripts are
+    collected in the same pass.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []            # (title, content) pairs, content "" for title-only headers
+        self.header_count = 0
+        self.section_count = 0
+        self.section_parts = []     # Transcript parts for the speech-section fallback
+        self.content_parts = []     # Every speech-content text for the content-only fallback
+        self.text_parts = []        # All visible text for the final fallback
+
+        self._stack = []            # (tag, role) for each open element, role None for plain markup
+        self._text_buffer = []      # Data events of the current text node (split across feed() chunks)
+        self._skip_depth = 0
+        self._title_parts = None    # Text of the speech-title being read
+        self._content_parts = None  # Text of the speech-content being read
+        self._header = None         # {'title': ...} for the speech-header being read
+        self._header_depth = None
+        self._section = None        # {'title': ..., 'content': ...} for the speech-section being read
+        self._pending_title = None  # Header title waiting for its speech-content
+        self._pending_depth = None  # Depth of the header's parent - the title is flushed when it closes
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag in VOID_ELEMENTS:
+            return
+
+        if tag in SKIPPED_ELEMENTS:
+            self._stack.append((tag, 'skip'))
+            self._skip_depth += 1
+            return
+
+        role = None
+        class_attr = None
+        for name, value in attrs:
+            if name == 'class':
+                class_attr = value
+                break
+
+        if class_attr and 'speech' in class_attr:
+            classes = class_attr.split()
+            if 'speech-header' in classes and tag == 'div':
+                role = 'header'
+                self.header_count += 1
+                self._header = {'title': None}
+                self._header_depth = len(self._stack) - 1
+            elif 'speech-title' in classes and self._title_parts is None:
+                role = 'title'
+                self._title_parts = []
+            elif 'speech-content' in classes and self._content_parts is None:
+                role = 'content'
+                self._content_parts = []
+            elif 'speech-section' in classes and tag == 'div':
+                role = 'section'
+                self.section_count += 1
+                self._section = {'title': None, 'content': None}
+
+        self._stack.append((tag, role))
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags (<br/>, <img/>) never contain text but still end a text node
+        self._flush_text()
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if tag in VOID_ELEMENTS:
+            return
+
+        # Tolerate unbalanced markup by closing up to the nearest matching open element
+        depth = len(self._stack) - 1
+        while depth >= 0 and self._stack[depth][0] != tag:
+            depth -= 1
+        if depth < 0:
+            return  # Stray end tag
+
+        while len(self._stack) > depth:
+            self._close(self._stack.pop()[1])
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._text_buffer.append(data)
+
+    def _flush_text(self):
+        """Record the text node collected since the last tag"""
+        if not self._text_buffer:
+            return
+        text = ''.join(self._text_buffer).strip()
+        self._text_buffer = []
+        if not text:
+            return
+
+        self.text_parts.append(text)
+        if self._title_parts is not None:
+            self._title_parts.append(text)
+        if self._content_parts is not None:
+            self._content_parts.append(text)
+
+    def _close(self, role):
+        """Handle the end of an element with the given role"""
+        if role == 'skip':
+            self._skip_depth -= 1
+        elif role == 'title':
+            title_text = ''.join(self._title_parts)
+            self._title_parts = None
+            if self._header is not None and self._header['title'] is None:
+                self._header['title'] = title_text
+            if self._section is not None and self._section['title'] is None:
+                self._section['title'] = title_text
+        elif role == 'content':
+            content_text = ' '.join(self._content_parts)
+            self._content_parts = None
+            if content_text:
+                self.content_parts.append(content_text)
+            if self._section is not None and self._section['content'] is None:
+                self._section['content'] = content_text
+            if self._pending_title is not None:
+                if self._pending_title and content_text:
+                    # Format as "Speaker: content"
+                    self.blocks.append((self._pending_title, content_text))
+                self._pending_title = None
+                self._pending_depth = None
+        elif role == 'header':
+            header = self._header
+            self._header = None
+            if header['title'] is not None:
+                self._flush_pending_title()
+                self._pending_title = header['title']
+                self._pending_depth = self._header_depth
+        elif role == 'section':
+            self._close_section()
+
+        # A header whose parent closes without any speech-content is kept as a title-only entry
+        if self._pending_depth is not None and len(self._stack) <= self._pending_depth:
+            self._flush_pending_title()
+
+    def _close_section(self):
+        section = self._section
+        self._section = None
+        title_text = section['title']
+        content_text = section['content']
+        if title_text is not None and content_text is not None:
+            if title_text and content_text:
+                self.section_parts.append(f"{title_text}: {content_text}")
+        elif content_text:
+            # Just content without title
+            self.section_parts.append(content_text)
+
+    def _flush_pending_title(self):
+        if self._pending_title:
+            self.blocks.append((self._pending_title, ""))
+        self._pending_title = None
+        self._pending_depth = None
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        while self._stack:
+            self._close(self._stack.pop()[1])
+        self._flush_pending_title()
+
+    def take_blocks(self):
+        """Return and clear the blocks completed so far"""
+        blocks = self.blocks
+        self.blocks = []
+        return blocks
+
+
+def iter_speech_blocks(html, parser=None):
+    """Yield (speech_title, speech_content) pairs in document order in a single pass"""
+    parser = parser or SpeechBlockParser()
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        yield from parser.take_blocks()
+    parser.close()
+    yield from parser.take_blocks()
+
+
+def extract_transcript_text(html):
+    """Extract transcript text from the transcript HTML with speech titles preserved"""
+    if not html:
+        return ""
+
+    parser = SpeechBlockParser()
+    transcript_parts = [f"{title}: {content}" if content else title
+                        for title, content in iter_speech_blocks(html, parser)]
+
+    if not parser.header_count:
+        if parser.section_count:
+            # Fallback: Look for speech sections (original logic)
+            transcript_parts = parser.section_parts
+        elif parser.content_parts:
+            # Fallback: look for speech content areas only
+            transcript_parts = parser.content_parts
+        else:
+            # Final fallback: get all text but clean it up
+            transcript_parts = [re.sub(r'\s+', ' ', ' '.join(parser.text_parts)).strip()]
+
+    print(f"[TRANSCRIPT EXTRACTOR] Extracted {len(transcript_parts)} transcript parts from {parser.header_count} speech headers")
+    return '\n\n'.join(transcript_parts)
+
+
+def iter_input_text_blocks(input_text):
+    """Yield (speech_title, speech_content) pairs from session input text, matching the rendered transcript"""
+    title = None
+    content_lines = []
+
+    for line in input_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        speech_match = SPEECH_HEADER_LINE.match(line)
+        if speech_match or MAIN_HEADER_LINE.match(line):
+            if title and content_lines:
+                yield (title, ' '.join(content_lines))
+            # Main headers are not speeches - text under them is not part of the transcript
+            title = speech_match.group(1).strip() if speech_match else None
+            content_lines = []
+        elif title:
+            content_lines.append(line)
+
+    if title and content_lines:
+        yield (title, ' '.join(content_lines))
+
+
+def extract_input_text_transcript(input_text):
+    """Build transcript text from session input text, or "" if it has no speech headers"""
+    if not input_text:
+        return ""
+
+    # Headers without text render with an empty speech-content, which the DOM path skips too
+    transcript_parts = [f"{title}: {content}" for title, content in iter_input_text_blocks(input_text)]
+
+    print(f"[TRANSCRIPT EXTRACTOR] Built {len(transcript_parts)} transcript parts from session input text")
+    return '\n\n'.join(transcript_parts)
+
+
+def extract_transcript_text_bs4(html):
+    """Reference BeautifulSoup implementation of extract_transcript_text (used by the benchmark)"""
+    if not html:
+        return ""
+
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove CSS and script elements
+    for element in soup(["style", "script", "head"]):
+        element.decompose()
+
+    transcript_parts = []
+
+    # Look for speech headers and content sections
+    speech_headers = soup.find_all('div', class_='speech-header')
+
+    if speech_headers:
+        # Process each speech header to get title and find corresponding content
+        for header in speech_headers:
+            title_elem = header.find(class_='speech-title')
+
+            if title_elem:
+                title_text = title_elem.get_text(strip=True)
+
+                # Find the corresponding speech content (usually follows the header)
+                content_elem = None
+                next_sibling = header.find_next_sibling()
+                while next_sibling:
+                    if next_sibling.name == 'div' and 'speech-content' in next_sibling.get('class', []):
+                        content_elem = next_sibling
+                        break
+                    next_sibling = next_sibling.find_next_sibling()
+
+                # If no sibling found, look for speech-content within the same parent
+                if not content_elem:
+                    parent = header.find_parent()
+                    if parent:
+                        content_elem = parent.find(class_='speech-content')
+
+                if content_elem:
+                    content_text = content_elem.get_text(separator=' ', strip=True)
+                    if title_text and content_text:
+                        # Format as "Speaker: content"
+                        transcript_parts.append(f"{title_text}: {content_text}")
+                elif title_text:
+                    # Just title without content
+                    transcript_parts.append(title_text)
+
+    # Fallback: Look for speech sections (original logic)
+    elif soup.find_all('div', class_='speech-section'):
+        for section in soup.find_all('div', class_='speech-section'):
+            title_elem = section.find(class_='speech-title')
+            content_elem = section.find(class_='speech-content')
+
+            if title_elem and content_elem:
+                title_text = title_elem.get_text(strip=True)
+                content_text = content_elem.get_text(separator=' ', strip=True)
+
+                if title_text and content_text:
+                    transcript_parts.append(f"{title_text}: {content_text}")
+            elif content_elem:
+                # Just content without title
+                content_text = content_elem.get_text(separator=' ', strip=True)
+                if content_text:
+                    transcript_parts.append(content_text)
+    else:
+        # Fallback: look for speech content areas only
+        speech_contents = soup.find_all(class_="speech-content")
+        if speech_contents:
+            for content in speech_contents:
+                text = content.get_text(separator=' ', strip=True)
+                if text:
+                    transcript_parts.append(text)
+        else:
+            # Final fallback: get all text but clean it up
+            text = soup.get_text(separator=' ', strip=True)
+            text = re.sub(r'\s+', ' ', text).strip()
+            transcript_parts.append(text)
+
+    return '\n\n'.join(transcript_parts)
+
+
+def build_benchmark_html(speech_blocks=10000, sample_path=None):
+    """Scale Sample.html up to the given number of speech blocks"""
+    sample_path = sample_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sample.html")
+    with open(sample_path, 'r', encoding='utf-8') as f:
+        sample_html = f.read()
+
+    # Reuse the first speech article as the template for every generated block
+    article_start = sample_html.index('<article class="speech">')
+    article_end = sample_html.index('</article>', article_start) + len('</article>')
+    template = sample_html[article_start:article_end]
+
+    articles = []
+    for i in range(speech_blocks):
+        article = template.replace('speech-1', f'speech-{i + 1}')
+        article = article.replace('>Introduction<', f'>Speaker {i % 7 + 1} - Block {i + 1}<')
+        article = article.replace('This is text under the Introduction header.',
+                                  f'Block {i + 1}: this is what the speaker said at this point &amp; more.')
+        articles.append(article)
+
+    main_end = sample_html.index('</main>')
+    return sample_html[:article_start] + ''.join(articles) + sample_html[main_end:]
+
+
+def benchmark_extractors(speech_blocks=10000, repeats=3):
+    """Time the single-pass extractor against the BeautifulSoup implementation"""
+    html = build_benchmark_html(speech_blocks)
+    print(f"Benchmark document: {speech_blocks} speech blocks, {len(html):,} characters")
+
+    results = {}
+    for name, extractor in (("html.parser single pass", extract_transcript_text),
+                            ("BeautifulSoup walk", extract_transcript_text_bs4)):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            text = extractor(html)
+            timings.append(time.perf_counter() - start)
+        results[name] = (min(timings), text)
+        print(f"  {name:<24} best of {repeats}: {min(timings):.3f}s ({len(text):,} characters)")
+
+    single_pass_time, single_pass_text = results["html.parser single pass"]
+    bs4_time, bs4_text = results["BeautifulSoup walk"]
+    print(f"  Output identical: {single_pass_text == bs4_text}")
+    print(f"  Speedup: {bs4_time / single_pass_time:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_extractors(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,153 @@
+"""
+Transcript Index for Scriptoria
+
+Locates AI-returned text segments in the transcript. Models routinely echo a segment with
+small differences - collapsed whitespace, curly vs straight quotes, an en dash for a hyphen,
+a dropped or altered word - and an exact substring check rejects those valid annotations.
+The index keeps a normalized view of the transcript with an offset map back to the original
+text, plus a word n-gram table for anchored fuzzy lookup, and always answers with the exact
+span of the original transcript so annotations are created from real transcript text.
+"""
+
+import re
+from difflib import SequenceMatcher
+
+
+# Characters folded together in the normalized view
+CHAR_FOLDS = {
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"', '\u2033': '"',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-', '\u2015': '-', '\u2212': '-',
+    '\u2026': '...',
+}
+
+WORD = re.compile(r"\w+(?:'\w+)*")
+
+NGRAM_SIZE = 3
+COMMON_NGRAM_LIMIT = 200   # N-grams occurring more often than this are too common to anchor on
+MAX_CANDIDATES = 3         # Best-supported start positions aligned per segment
+MIN_FUZZY_WORDS = 4        # Shorter segments must match the normalized view
+MIN_FUZZY_RATIO = 0.85     # Share of segment words that must line up with the transcript
+
+
+def normalize_text(text, with_offsets=False):
+    """Lowercase, fold quotes/dashes and collapse whitespace; optionally return the offset map too"""
+    chars = []
+    offsets = []
+    in_space = True  # Also drops leading whitespace
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if not in_space:
+                chars.append(' ')
+                if with_offsets:
+                    offsets.append(i)
+                in_space = True
+            continue
+        in_space = False
+        folded = CHAR_FOLDS.get(ch, ch).lower()
+        chars.append(folded)
+        if with_offsets:
+            offsets.extend([i] * len(folded))
+
+    if chars and chars[-1] == ' ':
+        chars.pop()
+        if with_offsets:
+            offsets.pop()
+    normalized = ''.join(chars)
+    return (normalized, offsets) if with_offsets else normalized
+
+
+class TranscriptIndex:
+    """Exact, normalized and fuzzy lookup of segments in one transcript text"""
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.normalized, self.offsets = normalize_text(self.text, with_offsets=True)
+
+        # Word tokens with their spans in the original text, and n-gram -> token positions
+        self.words = []
+        self.word_spans = []
+        for match in WORD.finditer(self.text):
+            self.words.append(normalize_text(match.group()))
+            self.word_spans.append(match.span())
+        self.ngrams = {}
+        for i in range(len(self.words) - NGRAM_SIZE + 1):
+            self.ngrams.setdefault(tuple(self.words[i:i + NGRAM_SIZE]), []).append(i)
+
+    def locate(self, segment):
+        """Return (start, end) of segment in the original text, or None if it is not in the transcript"""
+        if not segment or not self.text:
+            return None
+
+        # Exact
+        start = self.text.find(segment)
+        if start != -1:
+            return start, start + len(segment)
+
+        # Normalized view (also without quotes the model wrapped around the segment)
+        normalized = normalize_text(segment)
+        for candidate in (normalized, normalized.strip(' "\'')):
+            if not candidate:
+                continue
+            start = self.normalized.find(candidate)
+            if start != -1:
+                end = start + len(candidate)
+                return self.offsets[start], self.offsets[end - 1] + 1
+
+        return self._locate_fuzzy(segment)
+
+    def _locate_fuzzy(self, segment):
+        """Anchor on shared word n-grams, then align the segment's words against the transcript there"""
+        seg_words = [normalize_text(word) for word in WORD.findall(segment)]
+        if len(seg_words) < MIN_FUZZY_WORDS:
+            return None
+
+        # Every n-gram of the segment votes for the transcript word position the segment would start at
+        votes = {}
+        for k in range(len(seg_words) - NGRAM_SIZE + 1):
+            positions = self.ngrams.get(tuple(seg_words[k:k + NGRAM_SIZE]), [])
+            if len(positions) > COMMON_NGRAM_LIMIT:
+                continue
+            for position in positions:
+                start = max(0, position - k)
+                votes[start] = votes.get(start, 0) + 1
+        starts = sorted(votes, key=votes.get, reverse=True)[:MAX_CANDIDATES]
+
+        slack = len(seg_words) // 5 + 3
+        best = None
+        for start in starts:
+            window = self.words[start:start + len(seg_words) + slack]
+            blocks = [block for block in SequenceMatcher(None, window, seg_words, autojunk=False).get_matching_blocks() if block.size]
+            if not blocks:
+                continue
+            matched = sum(block.size for block in blocks)
+            ratio = matched / len(seg_words)
+            if ratio >= MIN_FUZZY_RATIO and (best is None or ratio > best[0]):
+                first_word = start + blocks[0].a
+                last_word = start + blocks[-1].a + blocks[-1].size - 1
+                best = (ratio, first_word, last_word)
+                if ratio == 1.0:
+                    break
+
+        if best is None:
+            return None
+        _, first_word, last_word = best
+        return self.word_spans[first_word][0], self.word_spans[last_word][1]
+
+    def extract(self, segment):
+        """Return the transcript text a segment refers to, or None"""
+        span = self.locate(segment)
+        if span is None:
+            return None
+        return self.text[span[0]:span[1]]
+
+
+_transcript_index = None
+
+
+def get_transcript_index(text):
+    """Get the TranscriptIndex for text, rebuilding it only when the transcript changes"""
+    global _transcript_index
+    if _transcript_index is None or (_transcript_index.text is not text and _transcript_index.text != text):
+        _transcript_index = TranscriptIndex(text)
+    return _transcript_index
@@ -0,0 +1,110 @@
+"""
+Word Count Service for Scriptoria
+
+Net word counts for script annotations, matching WordCountTimer: header text and red
+strikethrough words are excluded, and duration is estimated at 200 words per minute. Counts
+are cached per annotation and keyed on the script text they were computed from, so totals
+over thousands of blocks only re-count the annotations whose storyboard text changed.
+"""
+
+import re
+import threading
+
+
+WORDS_PER_MINUTE = 200
+
+# Same header patterns as WordCountTimer, compiled once
+HEADER_PATTERNS = [
+    re.compile(r'<div><b[^>]*>(.*?)</b></div>'),                 # <div><b>Header</b></div>
+    re.compile(r'<p[^>]*><b[^>]*>(.*?)</b></p>'),                # <p><b>Header</b></p>
+    re.compile(r'<b[^>]*>(.*?)</b>'),                            # <b>Header</b>
+    re.compile(r'<span[^>]*style=[\'"][^"\']*font-weight:700[^"\']*[\'"]>(.*?)</span>'),  # styled span with font-weight:700
+    re.compile(r'<h[1-6][^>]*>(.*?)</h[1-6]>'),                  # <h1>-<h6> tags
+]
+STRIKETHROUGH = re.compile(r'<s style="color:#FF9999;">(.*?)</s>')
+HTML_TAG = re.compile(r'<[^>]+>')
+WORD = re.compile(r'\b\w+\b')
+
+
+def count_words(text):
+    """Number of words in plain text"""
+    return len(WORD.findall(text))
+
+
+def count_net_words(html_text):
+    """Words in annotation script HTML, excluding headers and strikethrough"""
+    for pattern in HEADER_PATTERNS:
+        html_text = pattern.sub('', html_text)
+
+    all_words = count_words(HTML_TAG.sub('', html_text))
+    strikethrough_words = sum(count_words(HTML_TAG.sub('', segment)) for segment in STRIKETHROUGH.findall(html_text))
+    return all_words - strikethrough_words
+
+
+def annotation_script_html(annotation):
+    """Storyboard text of an annotation if it has one, otherwise its original text as HTML"""
+    storyboard = annotation.get('storyboard')
+    if isinstance(storyboard, dict) and 'text' in storyboard:
+        return storyboard['text'] or ""
+    return (annotation.get('text') or "").replace('\n', '<br>')
+
+
+def duration_from_words(word_count):
+    """Average speech duration in seconds for a word count"""
+    return (word_count / WORDS_PER_MINUTE) * 60
+
+
+def words_for_duration(seconds):
+    """Word count that fills a duration at the average speaking pace"""
+    return int((seconds / 60) * WORDS_PER_MINUTE)
+
+
+class WordCountService:
+    """Per-annotation net word counts, cached until the annotation's script text changes"""
+
+    def __init__(self):
+        self._counts = {}  # annotation id -> (script html, net words)
+        self._lock = threading.Lock()
+
+    def count(self, annotation):
+        """Net words of one annotation (dividers count as 0)"""
+        if annotation.get('divider'):
+            return 0
+        html_text = annotation_script_html(annotation)
+        key = annotation.get('id') or id(annotation)
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached and (cached[0] is html_text or cached[0] == html_text):
+                return cached[1]
+        words = count_net_words(html_text)
+        with self._lock:
+            self._counts[key] = (html_text, words)
+        return words
+
+    def total(self, annotations):
+        """Net words over a list of annotations"""
+        return sum(self.count(annotation) for annotation in annotations)
+
+    def duration(self, annotations):
+        """(net words, estimated seconds) for a list of annotations"""
+        words = self.total(annotations)
+        return words, duration_from_words(words)
+
+    def invalidate(self, annotation_id=None):
+        """Forget one annotation's cached count, or all of them"""
+        with self._lock:
+            if annotation_id is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(annotation_id, None)
+
+
+_word_count_service = None
+
+
+def get_word_count_service():
+    """Get the process-wide WordCountService instance"""
+    global _word_count_service
+    if _word_count_service is None:
+        _word_count_service = WordCountService()
+    return _word_count_service
@@ -0,0 +1,6 @@
+"""Make the Data modules importable the way the app imports them (as top-level modules)"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data'))
@@ -0,0 +1,88 @@
+"""
+Minimal fake Gemini REST server for tests
+
+Answers generateContent / streamGenerateContent with "echo:<prompt length>" and implements
+enough of cachedContents (create and delete) to exercise the context cache. Point the
+google.genai client at it with base_url=server.base_url.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """Threaded fake server that records what it was asked"""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.cache_creates = []      # contents text of every cachedContents create
+        self.cache_deletes = []      # names of deleted caches
+        self.generate_bodies = []    # request bodies of every generate call
+        self.refuse_caches = False   # answer cachedContents create with 400
+        self.reject_cached = False   # answer generate calls that reference a cache with 404
+        self.create_delay = 0.0      # seconds to hold a cachedContents create
+        self.delete_delay = 0.0      # seconds to hold a cachedContents delete
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, data, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+    def _send_error(self, status, message, reason):
+        self._send_json(status, {'error': {'code': status, 'message': message, 'status': reason}})
+
+    def do_DELETE(self):
+        if self.server.delete_delay:
+            threading.Event().wait(self.server.delete_delay)
+        with self.server._lock:
+            self.server.cache_deletes.append(self.path.split('/v1beta/')[-1])
+        self._send_json(200, {})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+
+        if self.path.split('?')[0].endswith('/cachedContents'):
+            if server.refuse_caches:
+                return self._send_error(400, 'Cached content is too small', 'INVALID_ARGUMENT')
+            if server.create_delay:
+                threading.Event().wait(server.create_delay)
+            with server._lock:
+                server.cache_creates.append(body['contents'][0]['parts'][0]['text'])
+                name = f"cachedContents/fake{len(server.cache_creates)}"
+            return self._send_json(200, {'name': name, 'model': body.get('model'),
+                                         'expireTime': '2099-01-01T00:00:00Z'})
+
+        with server._lock:
+            server.generate_bodies.append(body)
+        if body.get('cachedContent') and server.reject_cached:
+            return self._send_error(404, 'CachedContent not found', 'NOT_FOUND')
+
+        prompt = body['contents'][0]['parts'][0]['text']
+        result = {'candidates': [{'content': {'parts': [{'text': f"echo:{len(prompt)}"}], 'role': 'model'},
+                                  'finishReason': 'STOP'}]}
+        if 'streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            self.wfile.write(b"data: " + json.dumps(result).encode('utf-8') + b"\r\n\r\n")
+        else:
+            self._send_json(200, result)
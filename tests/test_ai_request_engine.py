@@ -0,0 +1,121 @@
+"""AIRequestEngine retry, error classification and cancellation paths"""
+
+import threading
+import time
+import unittest
+
+try:
+    from ai_request_engine import AIJob, AIRequest, AIRequestEngine
+except ImportError:  # The engine needs PyQt6
+    AIJob = AIRequest = AIRequestEngine = None
+
+
+def chunk(text, finish_reason=None):
+    return {'text': text, 'finish_reason': finish_reason, 'safety_ratings': None, 'usage': None}
+
+
+class ScriptedTransport:
+    """Each call to generate() plays the next script: a list of chunk dicts and exceptions"""
+
+    name = "scripted"
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.calls = 0
+        self.failed = threading.Event()
+
+    def generate(self, request):
+        script = self.scripts[min(self.calls, len(self.scripts) - 1)]
+        self.calls += 1
+        for step in script:
+            if isinstance(step, Exception):
+                self.failed.set()
+                raise step
+            if callable(step):
+                step()
+                continue
+            yield step
+
+
+@unittest.skipUnless(AIRequestEngine, "PyQt6 is not installed")
+class RequestEngineTest(unittest.TestCase):
+
+    def make_job(self, transport, max_retries=2):
+        job = AIJob(AIRequest("prompt", "key", max_retries=max_retries), transport)
+        self.events = {'chunks': [], 'responses': [], 'errors': [], 'retry': []}
+        job.chunk_received.connect(self.events['chunks'].append)
+        job.response_received.connect(self.events['responses'].append)
+        job.error_occurred.connect(self.events['errors'].append)
+        job.retry_suggested.connect(self.events['retry'].append)
+        return job
+
+    def run_job(self, job):
+        AIRequestEngine(transport=job.transport)._run_with_retries(job)
+
+    def test_transient_error_is_retried(self):
+        transport = ScriptedTransport([RuntimeError("503 Service Unavailable")], [chunk("answer", 'STOP')])
+        job = self.make_job(transport, max_retries=1)
+        started = time.monotonic()
+        self.run_job(job)
+        self.assertGreaterEqual(time.monotonic() - started, 2)  # Backoff before the second attempt
+        self.assertEqual(transport.calls, 2)
+        self.assertEqual(self.events['responses'], ["answer"])
+
+    def test_transient_error_after_last_attempt_suggests_a_retry(self):
+        transport = ScriptedTransport([RuntimeError("Connection reset by peer")])
+        self.run_job(self.make_job(transport, max_retries=0))
+        self.assertEqual(transport.calls, 1)
+        self.assertEqual(len(self.events['retry']), 1)
+        self.assertEqual(self.events['errors'], [])
+
+    def test_permanent_error_is_not_retried(self):
+        transport = ScriptedTransport([RuntimeError("API_KEY_INVALID")])
+        self.run_job(self.make_job(transport))
+        self.assertEqual(transport.calls, 1)
+        self.assertIn("Please check your API key", self.events['errors'][0])
+
+    def test_no_retry_after_partial_output(self):
+        transport = ScriptedTransport([chunk("partial "), RuntimeError("503 Service Unavailable")])
+        self.run_job(self.make_job(transport))
+        self.assertEqual(transport.calls, 1)
+        self.assertEqual(self.events['chunks'], ["partial "])
+        self.assertEqual(len(self.events['errors']), 1)
+        self.assertEqual(self.events['responses'], [])
+
+    def test_empty_response_reports_the_finish_reason(self):
+        self.run_job(self.make_job(ScriptedTransport([chunk("", 'MAX_TOKENS')])))
+        self.assertIn("truncated due to token limits", self.events['errors'][0])
+
+    def test_cancel_mid_stream_stops_output(self):
+        transport = ScriptedTransport([chunk("first "), lambda: job.cancel(), chunk("second", 'STOP')])
+        job = self.make_job(transport)
+        self.run_job(job)
+        self.assertEqual(self.events['chunks'], ["first "])
+        self.assertEqual(self.events['responses'], [])
+        self.assertEqual(self.events['errors'], [])
+
+    def test_cancel_during_backoff_returns_promptly(self):
+        transport = ScriptedTransport([RuntimeError("503 Service Unavailable")])
+        job = self.make_job(transport, max_retries=3)
+        runner = threading.Thread(target=self.run_job, args=(job,))
+        runner.start()
+        self.assertTrue(transport.failed.wait(5))
+        job.cancel()
+        runner.join(1)
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(transport.calls, 1)
+
+    def test_cancelled_job_is_never_started(self):
+        transport = ScriptedTransport([chunk("answer", 'STOP')])
+        job = self.make_job(transport)
+        started, finished = [], []
+        job.started.connect(lambda: started.append(True))
+        job.finished.connect(lambda: finished.append(True))
+        job.cancel()
+        AIRequestEngine(transport=transport)._execute(job)
+        self.assertEqual((started, finished, transport.calls), ([], [True], 0))
+        self.assertFalse(job.is_active())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Short annotation aliases in prompts and their resolution in responses"""
+
+import unittest
+
+from annotation_aliases import AnnotationAliases
+
+
+class AnnotationAliasesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aliases = AnnotationAliases()
+        self.first = self.aliases.alias("a99b0c1d-0000-4000-8000-000000000001")
+        self.second = self.aliases.alias("f00d0c1d-0000-4000-8000-000000000002")
+
+    def test_aliases_are_stable(self):
+        self.assertEqual((self.first, self.second), ("A1", "A2"))
+        self.assertEqual(self.aliases.alias("a99b0c1d-0000-4000-8000-000000000001"), "A1")
+        self.assertEqual(len(self.aliases), 2)
+
+    def test_alias_references_resolve(self):
+        for reference in ("A2", "a2", "[A2]", " A-2 ", "[[A 2]]"):
+            with self.subTest(reference=reference):
+                self.assertEqual(self.aliases.resolve(reference), "f00d0c1d-0000-4000-8000-000000000002")
+
+    def test_real_ids_pass_through(self):
+        real_id = "f00d0c1d-0000-4000-8000-000000000002"
+        self.assertEqual(self.aliases.resolve(real_id), real_id)
+        self.assertFalse(self.aliases.is_alias(real_id))
+        self.assertFalse(self.aliases.is_alias(""))
+
+    def test_unknown_alias_is_recognised_as_an_alias(self):
+        # "A99" must not be fuzzy-matched to the ID starting "a99b..." - callers check is_alias()
+        self.assertEqual(self.aliases.resolve("A99"), "A99")
+        self.assertTrue(self.aliases.is_alias("A99"))
+        self.assertTrue(self.aliases.is_alias("[A99]"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""create_annotations: per-spec results, cancellation, throttled progress and the single refresh"""
+
+import itertools
+import unittest
+from unittest import mock
+
+import annotation_creation
+from annotation_creation import PROGRESS_INTERVAL, create_annotations
+
+
+class FakeWebView:
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.created = []
+
+    def create_new_annotation_and_highlight(self, text, **kwargs):
+        if text in self.fail_on:
+            raise ValueError(f"text not found: {text}")
+        self.created.append(text)
+
+
+class FakeMainWindow:
+
+    def __init__(self):
+        self.refreshes = 0
+
+    def update_theme_view(self, show_progress=True):
+        self.refreshes += 1
+
+
+def specs(count):
+    return [{'text': f"segment {i}", 'scene': "Scene"} for i in range(count)]
+
+
+class CreateAnnotationsTest(unittest.TestCase):
+
+    def test_counts_successes_from_the_specs(self):
+        web_view, main_window = FakeWebView(fail_on={"segment 1"}), FakeMainWindow()
+        created, failures = create_annotations(web_view, main_window, specs(3))
+        self.assertEqual(created, [0, 2])
+        self.assertEqual([i for i, _ in failures], [1])
+        self.assertEqual(main_window.refreshes, 1)
+
+    def test_web_view_without_annotations_list(self):
+        # Success does not depend on web_view exposing (or keeping) an annotations list
+        web_view = FakeWebView()
+        created, failures = create_annotations(web_view, None, specs(2))
+        self.assertEqual(created, [0, 1])
+        self.assertEqual(failures, [])
+
+    def test_no_refresh_when_nothing_was_created(self):
+        main_window = FakeMainWindow()
+        create_annotations(FakeWebView(fail_on={"segment 0"}), main_window, specs(1))
+        self.assertEqual(main_window.refreshes, 0)
+
+    def test_cancel_is_checked_before_every_annotation(self):
+        web_view = FakeWebView()
+        created, _ = create_annotations(web_view, FakeMainWindow(), specs(80), progress=lambda done, total: None,
+                                        cancelled=lambda: len(web_view.created) >= 1)
+        self.assertEqual(created, [0])
+        self.assertEqual(web_view.created, ["segment 0"])
+
+    def test_progress_is_reported_on_a_timer(self):
+        # Each clock read advances a fifth of the interval, so progress runs every fifth annotation
+        ticks = (step * PROGRESS_INTERVAL / 5 for step in itertools.count())
+        calls = []
+        with mock.patch.object(annotation_creation, 'monotonic', lambda: next(ticks)):
+            created, _ = create_annotations(FakeWebView(), FakeMainWindow(), specs(12),
+                                            progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(len(created), 12)
+        self.assertEqual(calls, [(0, 12), (5, 12), (10, 12)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Fuzzy resolution of annotation IDs returned by the AI"""
+
+import unittest
+
+from annotation_id_resolver import AnnotationIdResolver, prefix_edit_distance
+
+IDS = [
+    "annotation-1712345678901-harbour",
+    "annotation-1712345678901-harvest",
+    "annotation-1712399999999-quay",
+    "anno-42",
+    "Mixed-Case-ID-0001",
+]
+
+
+class ResolveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = AnnotationIdResolver(IDS)
+
+    def test_exact_and_case_folded(self):
+        self.assertEqual(self.resolver.resolve("anno-42"), "anno-42")
+        self.assertEqual(self.resolver.resolve("mixed-case-id-0001"), "Mixed-Case-ID-0001")
+
+    def test_wrapping_is_stripped(self):
+        self.assertEqual(self.resolver.resolve(' [annotation-1712399999999-quay] '), "annotation-1712399999999-quay")
+
+    def test_truncated(self):
+        self.assertEqual(self.resolver.resolve("annotation-17123999"), "annotation-1712399999999-quay")
+
+    def test_ambiguous_prefix(self):
+        self.assertIsNone(self.resolver.resolve("annotation-1712345678901-har"))
+        self.assertEqual(self.resolver.resolve("annotation-1712345678901-harb"), "annotation-1712345678901-harbour")
+
+    def test_typos(self):
+        self.assertEqual(self.resolver.resolve("annotation-1712399989999-quay"), "annotation-1712399999999-quay")
+        self.assertEqual(self.resolver.resolve("annotation-171239999999-quay"), "annotation-1712399999999-quay")
+        self.assertEqual(self.resolver.resolve("annotation-17123999999999-quay"), "annotation-1712399999999-quay")
+
+    def test_typo_equally_close_to_two_ids(self):
+        # One edit from both IDs
+        self.assertIsNone(AnnotationIdResolver(["id-000000-aaaa", "id-000000-aaab"]).resolve("id-000000-aaac"))
+
+    def test_short_references_are_not_corrected(self):
+        # Below MIN_REFERENCE_LENGTH even an unambiguous prefix is not trusted
+        self.assertIsNone(self.resolver.resolve("anno-"))
+        self.assertEqual(self.resolver.resolve("anno-4"), "anno-42")
+        # Short references tolerate a single edit
+        self.assertEqual(self.resolver.resolve("anno-43"), "anno-42")
+        self.assertIsNone(self.resolver.resolve("anno-99"))
+
+    def test_too_far_off(self):
+        self.assertIsNone(self.resolver.resolve("annotation-9999999999999-none"))
+        self.assertIsNone(self.resolver.resolve(""))
+
+
+class PrefixEditDistanceTest(unittest.TestCase):
+
+    def test_distance_to_closest_prefix(self):
+        self.assertEqual(prefix_edit_distance("abcdef", "abcdefghij", 2), 0)
+        self.assertEqual(prefix_edit_distance("abxdef", "abcdefghij", 2), 1)
+        self.assertEqual(prefix_edit_distance("abdef", "abcdefghij", 2), 1)
+
+    def test_above_bound(self):
+        self.assertIsNone(prefix_edit_distance("zzzzzz", "abcdefghij", 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
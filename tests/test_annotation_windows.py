@@ -0,0 +1,79 @@
+"""Windowed annotation generation: splitting and merging"""
+
+import unittest
+
+from annotation_windows import merge_annotation_responses, split_transcript_window_spans, split_transcript_windows
+from transcript_index import TranscriptIndex
+
+BLOCKS = [f"Speaker {i}: this is speech number {i} about topic {i}." for i in range(10)]
+TRANSCRIPT = "\n\n".join(BLOCKS)
+
+
+def block(segment, scene="Scene"):
+    return f"[[ANNOTATION :: {scene} :: None :: {segment} :: note :: footnote]]"
+
+
+class SplitTest(unittest.TestCase):
+
+    def test_short_transcript_is_one_window(self):
+        self.assertEqual(split_transcript_window_spans(TRANSCRIPT, max_chars=10000), [(0, len(TRANSCRIPT))])
+        self.assertEqual(split_transcript_window_spans("\n\n  \n\n"), [])
+
+    def test_windows_cover_whole_blocks_and_overlap(self):
+        spans = split_transcript_window_spans(TRANSCRIPT, max_chars=200, overlap_blocks=2)
+        self.assertGreater(len(spans), 1)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(TRANSCRIPT))
+        for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+            self.assertLess(next_start, end)  # Overlap
+            self.assertGreater(next_end, end)  # Progress
+        for window in split_transcript_windows(TRANSCRIPT, max_chars=200, overlap_blocks=2):
+            self.assertLessEqual(len(window), 200)
+            for part in window.split("\n\n"):
+                self.assertIn(part, BLOCKS)
+
+    def test_oversized_block_gets_its_own_window(self):
+        transcript = "A: short\n\nB: " + "long " * 100 + "\n\nC: short"
+        windows = split_transcript_windows(transcript, max_chars=50, overlap_blocks=1)
+        self.assertIn("B: " + "long " * 100, windows)
+        self.assertEqual(windows[-1], "C: short")
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spans = split_transcript_window_spans(TRANSCRIPT, max_chars=200, overlap_blocks=2)
+        self.index = TranscriptIndex(TRANSCRIPT)
+        # A block inside the overlap of windows 0 and 1
+        self.shared = next(b for b in BLOCKS if self.spans[1][0] <= TRANSCRIPT.index(b) < self.spans[0][1])
+
+    def test_overlap_duplicate_kept_once_with_longer_version(self):
+        short = self.shared[:30]
+        merged = merge_annotation_responses([block(short), block(self.shared), None],
+                                            self.spans[:3], self.index)
+        self.assertEqual(merged, block(self.shared))
+
+    def test_distinct_segments_in_the_overlap_are_kept(self):
+        other = BLOCKS[0]
+        merged = merge_annotation_responses([block(other) + block(self.shared[:20]), block(self.shared[-20:])],
+                                            self.spans[:2], self.index)
+        self.assertEqual(merged.count("[[ANNOTATION"), 3)
+
+    def test_same_text_outside_adjacent_windows_is_kept(self):
+        # Window 2 doesn't overlap window 0, so an identical segment there is a separate pick
+        merged = merge_annotation_responses([block(BLOCKS[0]), None, block(BLOCKS[0])])
+        self.assertEqual(merged.count("[[ANNOTATION"), 2)
+
+    def test_identical_text_without_spans(self):
+        merged = merge_annotation_responses([block("The same words"), block("the  same\nwords")])
+        self.assertEqual(merged.count("[[ANNOTATION"), 1)
+
+    def test_empty_and_malformed_blocks_pass_through(self):
+        empty = "[[ANNOTATION :: Scene :: None ::  :: note :: footnote]]"
+        malformed = "[[ANNOTATION :: broken]]"
+        merged = merge_annotation_responses([empty + malformed, empty + malformed])
+        self.assertEqual(merged.split("\n\n"), [empty, malformed, empty, malformed])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""ContextCache and the engine's cached-prefix path against a fake Gemini server"""
+
+import threading
+import unittest
+
+import context_cache
+from ai_client_pool import NEW_API, get_client_pool
+from context_cache import ContextCache, get_context_cache
+from prompt_templates import get_prompt_template
+
+from fake_gemini_server import FakeGeminiServer
+
+try:
+    from ai_request_engine import AIRequest, GenAITransport
+except ImportError:  # The engine needs PyQt6; the cache itself does not
+    AIRequest = GenAITransport = None
+
+TRANSCRIPT = "the speaker describes the harbour at dawn " * 400
+MODEL = "gemini-2.5-flash"
+
+
+@unittest.skipUnless(NEW_API, "google.genai is not installed")
+class ContextCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeGeminiServer().start()
+        self.client = get_client_pool().get_client("key", MODEL, base_url=self.server.base_url)
+        self.cache = ContextCache()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, prefix=TRANSCRIPT, owner=None):
+        return self.cache.get_or_create(self.client, "key", MODEL, prefix, base_url=self.server.base_url, owner=owner)
+
+    def test_creates_once_and_reuses(self):
+        name = self.get()
+        self.assertEqual(name, "cachedContents/fake1")
+        self.assertEqual(self.get(), name)
+        self.assertEqual(len(self.server.cache_creates), 1)
+
+    def test_short_prefix_is_not_cached(self):
+        self.assertIsNone(self.get("too short to cache"))
+        self.assertEqual(self.server.cache_creates, [])
+
+    def test_create_failure_falls_back_and_backs_off(self):
+        self.server.refuse_caches = True
+        self.assertIsNone(self.get())
+        self.server.refuse_caches = False
+        # Still inside the failure backoff - no second attempt
+        self.assertIsNone(self.get())
+        self.assertEqual(self.server.cache_creates, [])
+        # ... but only for that prefix
+        self.assertEqual(self.get("a second document " + TRANSCRIPT), "cachedContents/fake1")
+
+    def test_concurrent_requests_share_one_upload(self):
+        self.server.create_delay = 0.3
+        names = []
+        threads = [threading.Thread(target=lambda: names.append(self.get())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(names, ["cachedContents/fake1"] * 4)
+        self.assertEqual(len(self.server.cache_creates), 1)
+
+    def test_upload_does_not_block_other_prefixes(self):
+        other_prefix = "a second document " + TRANSCRIPT
+        key = context_cache._cache_key("key", self.server.base_url, MODEL, other_prefix)
+        self.cache._entries[key] = ("cachedContents/ready", float('inf'), self.client, {None})
+        self.server.create_delay = 0.5
+        upload = threading.Thread(target=self.get)
+        upload.start()
+        while not self.cache._creating:
+            threading.Event().wait(0.01)
+        # Answered from the cache while the other prefix is still uploading
+        self.assertEqual(self.get(other_prefix), "cachedContents/ready")
+        self.assertTrue(upload.is_alive())
+        upload.join()
+
+    def test_invalidate_forgets_the_name(self):
+        name = self.get()
+        self.cache.invalidate(name)
+        self.assertEqual(self.get(), "cachedContents/fake2")
+
+    def test_clear_deletes_on_server(self):
+        name = self.get()
+        self.cache.clear()
+        self.assertEqual(self.server.cache_deletes, [name])
+        self.assertEqual(self.get(), "cachedContents/fake2")
+
+    def test_release_deletes_only_caches_no_one_else_uses(self):
+        chat_only = self.get(owner="chat")
+        shared = self.get("a second document " + TRANSCRIPT, owner="chat")
+        self.get("a second document " + TRANSCRIPT, owner="storyboard")
+        storyboard_only = self.get("a third document " + TRANSCRIPT, owner="storyboard")
+
+        self.cache.release("chat")
+        self.assertEqual(self.server.cache_deletes, [chat_only])
+        self.cache.release("storyboard")
+        self.assertEqual(sorted(self.server.cache_deletes), sorted([chat_only, shared, storyboard_only]))
+
+    def test_release_in_background_does_not_block(self):
+        self.get(owner="chat")
+        self.server.delete_delay = 0.5
+        thread = self.cache.release_in_background("chat")
+        self.assertEqual(self.server.cache_deletes, [])
+        self.assertEqual(self.cache._entries, {})
+        thread.join()
+        self.assertEqual(self.server.cache_deletes, ["cachedContents/fake1"])
+
+
+@unittest.skipUnless(NEW_API, "google.genai is not installed")
+@unittest.skipUnless(GenAITransport, "PyQt6 is not installed")
+class CachedPrefixRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeGeminiServer().start()
+        self.transport = GenAITransport(base_url=self.server.base_url)
+        context_cache._context_cache = None
+        self.prompt = get_prompt_template('ask_gemini').render("Answer the question.", TRANSCRIPT,
+                                                               "ANNOTATION A1", "QUESTION: Who speaks?")
+
+    def tearDown(self):
+        get_context_cache().clear()
+        context_cache._context_cache = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def generate(self, stream=False, prompt=None):
+        request = AIRequest(prompt or self.prompt, "key", MODEL, stream=stream, max_retries=0, context_cache=True)
+        return "".join(chunk['text'] for chunk in self.transport.generate(request))
+
+    def test_sends_only_the_request_section(self):
+        self.generate()
+        self.generate(stream=True)
+        self.assertEqual(len(self.server.cache_creates), 1)
+        for body in self.server.generate_bodies:
+            self.assertEqual(body['cachedContent'], "cachedContents/fake1")
+            self.assertNotIn("harbour", body['contents'][0]['parts'][0]['text'])
+
+    def test_rejected_cache_is_invalidated_and_full_prompt_resent(self):
+        self.generate()
+        self.server.reject_cached = True
+        self.assertEqual(self.generate(), f"echo:{len(str(self.prompt))}")
+        retry = self.server.generate_bodies[-1]
+        self.assertNotIn('cachedContent', retry)
+        self.assertEqual(get_context_cache()._entries, {})
+
+    def test_prompt_without_request_section_is_sent_once_uncached(self):
+        prompt = get_prompt_template('ask_gemini').render("Answer the question.", TRANSCRIPT, "ANNOTATION A1")
+        self.assertEqual(self.generate(prompt=prompt), f"echo:{len(str(prompt))}")
+        self.assertEqual(self.server.cache_creates, [])
+        self.assertNotIn('cachedContent', self.server.generate_bodies[-1])
+
+    def test_falls_back_to_full_prompt_when_caching_fails(self):
+        self.server.refuse_caches = True
+        self.assertEqual(self.generate(), f"echo:{len(str(self.prompt))}")
+        self.assertNotIn('cachedContent', self.server.generate_bodies[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""ResponseCache on disk, and which engine responses are stored in it"""
+
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import response_cache
+from response_cache import ResponseCache, request_cache_key
+
+try:
+    from ai_request_engine import AIJob, AIRequest, AIRequestEngine
+except ImportError:  # The engine needs PyQt6; the cache itself does not
+    AIJob = AIRequest = AIRequestEngine = None
+
+
+def request(prompt, **settings):
+    """Stand-in carrying the AIRequest attributes the cache reads"""
+    fields = dict(model="gemini-2.5-pro", temperature=0.3, top_p=0.8, thinking_budget=None, label="AI request")
+    fields.update(settings)
+    return SimpleNamespace(prompt=prompt, **fields)
+
+
+def chunk(text, finish_reason=None):
+    return {'text': text, 'finish_reason': finish_reason, 'safety_ratings': None, 'usage': None}
+
+
+class ScriptedTransport:
+    """Transport that yields a fixed list of chunk dicts and counts calls"""
+
+    name = "scripted"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate(self, request):
+        self.calls += 1
+        yield from self.chunks
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_survives_a_new_instance(self):
+        cached = request("prompt")
+        self.cache.put(cached, "answer", {'total_tokens': 3})
+        entry = ResponseCache(self.directory).get(cached)
+        self.assertEqual(entry['response'], "answer")
+        self.assertEqual(entry['usage'], {'total_tokens': 3})
+
+    def test_key_covers_every_generation_setting(self):
+        base = request_cache_key(request("prompt"))
+        self.assertEqual(base, request_cache_key(request("prompt", label="other")))
+        for changed in (request("prompt!"), request("prompt", model="gemini-2.5-flash"),
+                        request("prompt", temperature=0.9), request("prompt", top_p=0.5),
+                        request("prompt", thinking_budget=128)):
+            self.assertNotEqual(base, request_cache_key(changed))
+
+    def test_evicts_least_recently_used(self):
+        first, second, third = (request(f"prompt {i}") for i in range(3))
+        self.cache.put(first, "a" * 100)
+        self.cache.put(second, "b" * 100)
+        entry_bytes = self.cache.stats()[1] // 2
+        self.cache.max_bytes = entry_bytes * 2 + entry_bytes // 2
+        self.cache.get(first)  # first is now more recent than second
+        self.cache.put(third, "c" * 100)
+
+        self.assertIsNotNone(self.cache.get(first))
+        self.assertIsNone(self.cache.get(second))
+        self.assertIsNotNone(self.cache.get(third))
+
+    def test_disabled_cache_stores_nothing(self):
+        self.cache.enabled = False
+        self.cache.put(request("prompt"), "answer")
+        self.assertEqual(self.cache.stats(), (0, 0))
+
+
+@unittest.skipUnless(AIRequestEngine, "PyQt6 is not installed")
+class EngineResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved_cache = response_cache._response_cache
+        response_cache._response_cache = ResponseCache(self.directory)
+
+    def tearDown(self):
+        response_cache._response_cache = self.saved_cache
+        shutil.rmtree(self.directory)
+
+    def run_job(self, transport):
+        """Run one cached request synchronously; returns (responses, errors)"""
+        job = AIJob(AIRequest("prompt", "key", use_cache=True, max_retries=0), transport)
+        responses, errors = [], []
+        job.response_received.connect(responses.append)
+        job.error_occurred.connect(errors.append)
+        AIRequestEngine(transport=transport)._run_with_retries(job)
+        return responses, errors
+
+    def test_complete_response_is_cached_and_replayed(self):
+        transport = ScriptedTransport([chunk("part one, "), chunk("part two", 'STOP')])
+        self.assertEqual(self.run_job(transport)[0], ["part one, part two"])
+        self.assertEqual(self.run_job(transport)[0], ["part one, part two"])
+        self.assertEqual(transport.calls, 1)
+
+    def test_truncated_or_blocked_response_is_not_cached(self):
+        for finish_reason in ('MAX_TOKENS', 'SAFETY', None):
+            with self.subTest(finish_reason=finish_reason):
+                transport = ScriptedTransport([chunk("partial"), chunk("", finish_reason)])
+                self.assertEqual(self.run_job(transport)[0], ["partial"])
+                self.run_job(transport)
+                self.assertEqual(transport.calls, 2)
+                self.assertEqual(response_cache.get_response_cache().stats()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
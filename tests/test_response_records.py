@@ -0,0 +1,85 @@
+"""Streamed record parsing for the AI dialogs"""
+
+import unittest
+
+from response_records import (BracketRecordStream, LineRecordStream, iter_bracket_records, iter_line_records,
+                              parse_annotation_record, parse_notes_record, parse_order_line)
+
+RESPONSE = (
+    "Here are the annotations:\n"
+    "[[ANNOTATION :: Childhood :: None :: I grew up by the harbour :: Early memory :: Sets the scene]]\n"
+    "[[ANNOTATION :: Work :: Family, Harbour :: He repaired nets\nfor the fishermen :: Father's trade :: Twenty years]]\n"
+    "Done."
+)
+
+
+def feed_in_chunks(stream, text, size):
+    records = []
+    for i in range(0, len(text), size):
+        records += stream.feed(text[i:i + size])
+    return records + stream.finish()
+
+
+class BracketRecordStreamTest(unittest.TestCase):
+
+    def test_every_chunk_size_gives_the_same_records(self):
+        expected = iter_bracket_records(RESPONSE, "ANNOTATION")
+        self.assertEqual(len(expected), 2)
+        for size in range(1, 40):
+            with self.subTest(size=size):
+                self.assertEqual(feed_in_chunks(BracketRecordStream("ANNOTATION"), RESPONSE, size), expected)
+
+    def test_split_opener_and_closer(self):
+        stream = BracketRecordStream("NOTES")
+        self.assertEqual(stream.feed("intro ["), [])
+        self.assertEqual(stream.feed("[NOTES :: id1 :: brief :: detail]"), [])
+        self.assertEqual(stream.feed("] tail [[NO"), ["[[NOTES :: id1 :: brief :: detail]]"])
+        self.assertEqual(stream.feed("TES :: id2 :: b :: d]]"), ["[[NOTES :: id2 :: b :: d]]"])
+        self.assertEqual(stream.text(), "intro [[NOTES :: id1 :: brief :: detail]] tail [[NOTES :: id2 :: b :: d]]")
+
+    def test_unterminated_block_is_dropped(self):
+        stream = BracketRecordStream("NOTES")
+        self.assertEqual(stream.feed("[[NOTES :: id1 :: brief"), [])
+        self.assertEqual(stream.finish(), [])
+
+    def test_other_tags_are_ignored(self):
+        self.assertEqual(iter_bracket_records("[[NOTES :: a :: b :: c]]", "ANNOTATION"), [])
+
+
+class LineRecordStreamTest(unittest.TestCase):
+
+    def test_lines_split_across_chunks(self):
+        text = "Intro\nabc123 :: Order#1\nDIVIDER :: \"Act One\" :: Order#2 :: #FF0000\ndef456 :: Order#3"
+        expected = ["abc123 :: Order#1", "DIVIDER :: \"Act One\" :: Order#2 :: #FF0000", "def456 :: Order#3"]
+        self.assertEqual(iter_line_records(text), expected)
+        for size in range(1, 20):
+            with self.subTest(size=size):
+                self.assertEqual(feed_in_chunks(LineRecordStream(), text, size), expected)
+
+
+class ParseRecordTest(unittest.TestCase):
+
+    def test_annotation_record_joins_wrapped_lines(self):
+        blocks = iter_bracket_records(RESPONSE, "ANNOTATION")
+        self.assertEqual(parse_annotation_record(blocks[1]),
+                         ("Work", "Family, Harbour", "He repaired nets for the fishermen", "Father's trade", "Twenty years"))
+
+    def test_malformed_records(self):
+        self.assertIsNone(parse_annotation_record("[[ANNOTATION :: only :: three]]"))
+        self.assertIsNone(parse_notes_record("[[NOTES :: id1]]"))
+
+    def test_notes_record(self):
+        self.assertEqual(parse_notes_record(" [[NOTES :: id1 :: brief :: detailed]] "), ("id1", "brief", "detailed"))
+
+    def test_order_lines(self):
+        self.assertEqual(parse_order_line("abc :: Order#4"), {'type': 'annotation', 'id': 'abc', 'order': 4, 'header': None})
+        self.assertEqual(parse_order_line('abc :: Order#5 :: HEADER :: "<div><b>Opening</b></div>"')['header'], "Opening")
+        self.assertEqual(parse_order_line('DIVIDER :: "Act Two" :: Order#6 :: #00FF00'),
+                         {'type': 'divider', 'order': 6, 'title': "Act Two", 'color': "#00FF00"})
+        self.assertIsNone(parse_order_line("no record here"))
+        with self.assertRaises(ValueError):
+            parse_order_line("abc :: Order#x")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""SessionStore: journaled edits, replay and compaction"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from session_store import JOURNAL_SUFFIX, SessionStore, write_session_file
+
+
+class SessionStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.session_file = os.path.join(self.directory, "interview.scriptoria")
+        write_session_file(self.session_file, {'input': {'text': "transcript"}, 'ai_notes_title': "Old"})
+        self.store = SessionStore(self.session_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_file(self):
+        with open(self.session_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def app_rewrites_session(self, data):
+        write_session_file(self.session_file, data)
+        os.utime(self.session_file, ns=(1, 1))  # Make the signature change even within one mtime tick
+
+    def test_edits_are_journaled_not_written(self):
+        self.store.set_values({'ai_notes_title': "New"})
+        self.assertEqual(self.store.get('ai_notes_title'), "New")
+        self.assertEqual(self.read_file()['ai_notes_title'], "Old")
+        self.assertTrue(os.path.exists(self.session_file + JOURNAL_SUFFIX))
+
+    def test_a_fresh_store_replays_the_journal(self):
+        self.store.set_values({'ai_notes_title': "New", 'ai_notes_description': "About"})
+        self.store.set_values({'ai_notes_title': "Newer"})
+        reopened = SessionStore(self.session_file)
+        self.assertEqual(reopened.get('ai_notes_title'), "Newer")
+        self.assertEqual(reopened.get('ai_notes_description'), "About")
+
+    def test_compact_folds_the_journal_into_the_file(self):
+        self.store.set_values({'ai_notes_title': "New"})
+        self.assertTrue(self.store.compact())
+        self.assertEqual(self.read_file(), {'input': {'text': "transcript"}, 'ai_notes_title': "New"})
+        self.assertFalse(self.store.has_pending_journal())
+        self.assertFalse(self.store.compact())
+
+    def test_edits_survive_the_app_rewriting_the_session(self):
+        self.store.set_values({'ai_notes_title': "New"})
+        self.app_rewrites_session({'input': {'text': "edited transcript"}, 'ai_notes_title': "Old"})
+
+        self.assertEqual(self.store.get('input'), {'text': "edited transcript"})
+        self.assertEqual(self.store.get('ai_notes_title'), "New")
+        self.store.compact()
+        self.assertEqual(self.read_file(), {'input': {'text': "edited transcript"}, 'ai_notes_title': "New"})
+
+    def test_truncated_record_is_skipped(self):
+        self.store.set_values({'ai_notes_title': "New"})
+        with open(self.session_file + JOURNAL_SUFFIX, 'a', encoding='utf-8') as f:
+            f.write('{"op": "set", "values": {"ai_notes_ti')
+        self.store.set_values({'ai_notes_description': "About"})
+
+        reopened = SessionStore(self.session_file)
+        self.assertEqual(reopened.get('ai_notes_title'), "New")
+        self.assertEqual(reopened.get('ai_notes_description'), "About")
+
+    def test_missing_session_keeps_the_journal(self):
+        self.store.set_values({'ai_notes_title': "New"})
+        os.remove(self.session_file)
+        self.assertFalse(self.store.compact())
+        self.assertTrue(self.store.has_pending_journal())
+
+
+if __name__ == '__main__':
+    unittest.main()
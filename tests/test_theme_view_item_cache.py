@@ -0,0 +1,69 @@
+"""ThemeViewItemCache: lookups never return items that left the theme view"""
+
+import unittest
+
+try:
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtWidgets import QApplication, QLabel, QListWidget, QListWidgetItem, QTabWidget
+    from theme_view_item_cache import get_theme_view_item_cache
+except ImportError:  # The cache works on Qt widgets
+    QApplication = None
+
+
+@unittest.skipUnless(QApplication, "PyQt6 is not installed")
+class ThemeViewItemCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.tabs = QTabWidget()
+        self.list_widget = QListWidget()
+        self.tabs.addTab(self.list_widget, "Scene")
+        for annotation_id in ("a", "b", "c"):
+            self.list_widget.addItem(self.make_item(annotation_id))
+            self.list_widget.setItemWidget(self.list_widget.item(self.list_widget.count() - 1), QLabel(annotation_id))
+        self.cache = get_theme_view_item_cache(self.tabs)
+
+    def make_item(self, annotation_id):
+        item = QListWidgetItem(annotation_id)
+        item.setData(Qt.ItemDataRole.UserRole, annotation_id)
+        return item
+
+    def test_lookup_and_reuse(self):
+        (tab, list_widget, item, item_widget), = self.cache.entries("b")
+        self.assertEqual((tab, item.text(), item_widget.text()), (0, "b", "b"))
+        self.assertIs(list_widget, self.list_widget)
+        self.assertIs(get_theme_view_item_cache(self.tabs), self.cache)
+
+    def test_middle_row_replaced_for_the_same_annotation(self):
+        old_item = self.cache.entries("b")[0][2]
+        self.list_widget.takeItem(1)
+        new_item = self.make_item("b")
+        self.list_widget.insertItem(1, new_item)
+        self.list_widget.setItemWidget(new_item, QLabel("b again"))
+
+        (_, list_widget, item, item_widget), = self.cache.entries("b")
+        self.assertIsNot(item, old_item)
+        self.assertIs(item.listWidget(), list_widget)
+        self.assertEqual(item_widget.text(), "b again")
+
+    def test_middle_row_replaced_by_another_annotation(self):
+        self.cache.entries("b")
+        self.list_widget.takeItem(1)
+        new_item = self.make_item("d")
+        self.list_widget.insertItem(1, new_item)
+        self.list_widget.setItemWidget(new_item, QLabel("d"))
+
+        self.assertEqual(self.cache.entries("b"), [])
+        self.assertEqual([entry[3].text() for entry in self.cache.entries("d")], ["d"])
+
+    def test_removed_row(self):
+        self.cache.entries("c")
+        self.list_widget.takeItem(2)
+        self.assertEqual(self.cache.entries("c"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
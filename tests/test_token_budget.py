@@ -0,0 +1,66 @@
+"""TokenEstimator calibration and block trimming"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from token_budget import DEFAULT_CHARS_PER_TOKEN, TokenEstimator, trim_blocks_to_budget
+
+MISSING_PATH = os.path.join(tempfile.gettempdir(), "scriptoria-no-such-calibration.json")
+
+
+class TokenEstimatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "token_calibration.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_default_estimate(self):
+        estimator = TokenEstimator(self.path)
+        self.assertEqual(estimator.chars_per_token, DEFAULT_CHARS_PER_TOKEN)
+        self.assertEqual(estimator.estimate("x" * 10), 3)
+        self.assertEqual(estimator.estimate(""), 0)
+
+    def test_calibration_is_learned_and_persisted(self):
+        estimator = TokenEstimator(self.path)
+        estimator.record_usage(3000, 1000)
+        self.assertEqual(estimator.chars_per_token, 3.0)
+        estimator.record_usage(5000, 1000)
+        self.assertAlmostEqual(estimator.chars_per_token, 3.4)
+
+        reloaded = TokenEstimator(self.path)
+        self.assertAlmostEqual(reloaded.chars_per_token, 3.4)
+        self.assertEqual(reloaded.samples, 2)
+
+    def test_implausible_observations_are_ignored(self):
+        estimator = TokenEstimator(self.path)
+        estimator.record_usage(100, 1000)
+        estimator.record_usage(0, 10)
+        self.assertEqual(estimator.samples, 0)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TrimBlocksTest(unittest.TestCase):
+
+    def test_keeps_whole_leading_blocks_and_marks_the_rest(self):
+        estimator = TokenEstimator(MISSING_PATH)
+        blocks = [f"Speaker: block {i} " + "word " * 40 for i in range(20)]
+        text = "\n\n".join(blocks)
+
+        trimmed, dropped = trim_blocks_to_budget(text, 500, estimator)
+        self.assertGreater(dropped, 0)
+        kept = trimmed.split("\n\n")
+        self.assertEqual(kept[:-1], blocks[:len(kept) - 1])
+        self.assertIn(f"{dropped} further blocks omitted", kept[-1])
+        self.assertLessEqual(estimator.estimate(trimmed), 500)
+
+    def test_text_within_budget_is_unchanged(self):
+        self.assertEqual(trim_blocks_to_budget("short", 100, TokenEstimator(MISSING_PATH)), ("short", 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
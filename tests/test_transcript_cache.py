@@ -0,0 +1,98 @@
+"""TranscriptCache: the DOM text is preferred, the session input is only the fallback"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from session_store import write_session_file
+from transcript_cache import TranscriptCache
+
+DOM_HTML = (
+    '<div class="speech-header"><span class="speech-title">Maria</span></div>'
+    '<div class="speech-content"><p>I grew up by the <mark>harbour</mark>.</p></div>'
+)
+INPUT_TEXT = "**Maria (edited)**\nSomething the DOM does not show."
+
+
+class FakePage:
+
+    def __init__(self, view):
+        self.view = view
+
+    def toHtml(self, callback):
+        self.view.to_html_calls += 1
+        self.view.pending.append(callback)
+
+
+class FakeWebView:
+    """Web view whose toHtml callbacks are delivered by deliver(), as the event loop would"""
+
+    def __init__(self, html):
+        self.html = html
+        self.to_html_calls = 0
+        self.pending = []
+
+    def page(self):
+        return FakePage(self)
+
+    def deliver(self):
+        callbacks, self.pending = self.pending, []
+        for callback in callbacks:
+            callback(self.html)
+
+
+class FakeMainWindow:
+
+    def __init__(self, session_file):
+        self.current_session_file = session_file
+
+
+class TranscriptCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        session_file = os.path.join(self.directory, "interview.scriptoria")
+        write_session_file(session_file, {'input': {'text': INPUT_TEXT}})
+        self.main_window = FakeMainWindow(session_file)
+        self.cache = TranscriptCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def request(self, web_view):
+        results = []
+        self.cache.request_transcript(web_view, results.append, self.main_window)
+        return results
+
+    def test_dom_text_is_preferred_over_the_session_input(self):
+        web_view = FakeWebView(DOM_HTML)
+        results = self.request(web_view)
+        self.assertEqual(results, [])  # Nothing until toHtml answers
+        web_view.deliver()
+        self.assertEqual(results, ["Maria: I grew up by the harbour ."])
+
+    def test_one_extraction_per_revision(self):
+        web_view = FakeWebView(DOM_HTML)
+        first, second = self.request(web_view), self.request(web_view)
+        web_view.deliver()
+        self.assertEqual(first, second)
+        self.assertEqual(self.request(web_view), first)
+        self.assertEqual(web_view.to_html_calls, 1)
+
+        self.cache.invalidate(web_view, "annotations changed")
+        self.request(web_view)
+        self.assertEqual(web_view.to_html_calls, 2)
+
+    def test_session_input_when_the_dom_has_no_transcript(self):
+        web_view = FakeWebView("<html><body></body></html>")
+        results = self.request(web_view)
+        web_view.deliver()
+        self.assertEqual(results, ["Maria (edited): Something the DOM does not show."])
+
+    def test_session_input_without_a_web_view(self):
+        self.assertEqual(self.request(None), ["Maria (edited): Something the DOM does not show."])
+
+
+if __name__ == '__main__':
+    unittest.main()
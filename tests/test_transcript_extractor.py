@@ -0,0 +1,73 @@
+"""Single-pass transcript extraction from HTML and from session input text"""
+
+import unittest
+
+import transcript_extractor
+from transcript_extractor import (build_benchmark_html, extract_input_text_transcript, extract_transcript_text,
+                                  extract_transcript_text_bs4, iter_speech_blocks)
+
+try:
+    import bs4
+except ImportError:
+    bs4 = None
+
+
+def speech(title, content_html):
+    return (f'<div class="speech-header"><span class="speech-title">{title}</span></div>'
+            f'<div class="speech-content">{content_html}</div>')
+
+
+class ExtractTranscriptTextTest(unittest.TestCase):
+
+    def test_speech_blocks_in_document_order(self):
+        html = "<body>" + speech("Maria", "<p>First <b>part</b>.</p><p>Second</p>") + speech("Ana", "<p>Reply</p>") + "</body>"
+        self.assertEqual(extract_transcript_text(html), "Maria: First part . Second\n\nAna: Reply")
+
+    def test_title_only_header_and_skipped_elements(self):
+        html = ("<head><style>.speech-title {}</style></head><body><section>"
+                '<div class="speech-header"><span class="speech-title">Part One</span></div></section>'
+                "<script>var x = 1;</script>" + speech("Maria", "Hello") + "</body>")
+        self.assertEqual(extract_transcript_text(html), "Part One\n\nMaria: Hello")
+
+    def test_text_split_across_feed_chunks(self):
+        content = "word " * (transcript_extractor.FEED_CHUNK_SIZE // 5 + 10)
+        html = speech("Maria", f"<p>{content}</p>")
+        self.assertEqual(extract_transcript_text(html), f"Maria: {content.strip()}")
+
+    def test_unbalanced_markup_is_tolerated(self):
+        html = speech("Maria", "<p>Unclosed <i>italic</p>") + "</span></div>" + speech("Ana", "Fine")
+        self.assertEqual([title for title, _ in iter_speech_blocks(html)], ["Maria", "Ana"])
+
+    def test_fallbacks(self):
+        sections = ('<div class="speech-section"><span class="speech-title">Maria</span>'
+                    '<div class="speech-content">Hello</div></div>'
+                    '<div class="speech-section"><div class="speech-content">Untitled</div></div>')
+        self.assertEqual(extract_transcript_text(sections), "Maria: Hello\n\nUntitled")
+        self.assertEqual(extract_transcript_text('<div class="speech-content">Only content</div>'), "Only content")
+        self.assertEqual(extract_transcript_text("<p>Plain\n   text</p><p>here</p>"), "Plain text here")
+        self.assertEqual(extract_transcript_text(""), "")
+
+    @unittest.skipUnless(bs4, "beautifulsoup4 is not installed")
+    def test_matches_the_beautifulsoup_walk(self):
+        html = build_benchmark_html(200)
+        self.assertEqual(extract_transcript_text(html), extract_transcript_text_bs4(html))
+
+
+class ExtractInputTextTranscriptTest(unittest.TestCase):
+
+    def test_speeches_from_input_markup(self):
+        input_text = ("Preamble outside any speech\n"
+                      "[[PART ONE]]\nText under a main header\n"
+                      "**Maria**\nI grew up\n\n  by the harbour  \n"
+                      "**Empty**\n"
+                      "**Ana**\nReply")
+        self.assertEqual(extract_input_text_transcript(input_text),
+                         "Maria: I grew up by the harbour\n\nAna: Reply")
+
+    def test_no_speech_headers(self):
+        self.assertEqual(extract_input_text_transcript("Just some text"), "")
+        self.assertEqual(extract_input_text_transcript(""), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
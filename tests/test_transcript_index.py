@@ -0,0 +1,76 @@
+"""TranscriptIndex: exact, normalized and fuzzy segment lookup"""
+
+import unittest
+
+from transcript_index import MIN_FUZZY_RATIO, TranscriptIndex, get_transcript_index, normalize_text
+
+TRANSCRIPT = (
+    "Interviewer: Where did you grow up?\n\n"
+    "Maria:   I grew up by the harbour – we watched the boats come in every morning.\n\n"
+    "Interviewer: And your father’s work?\n\n"
+    "Maria: He repaired nets for the fishermen, twenty years on the same quay, until the cannery closed."
+)
+
+
+class NormalizeTextTest(unittest.TestCase):
+
+    def test_folds_quotes_dashes_case_and_whitespace(self):
+        self.assertEqual(normalize_text("  Father’s “Work” —\n\tdone  "), "father's \"work\" - done")
+
+    def test_offsets_point_into_the_original(self):
+        text = "A  “b”\n…c"
+        normalized, offsets = normalize_text(text, with_offsets=True)
+        self.assertEqual(normalized, 'a "b" ...c')
+        self.assertEqual(len(offsets), len(normalized))
+        # The ellipsis expands to three characters that all map back to it
+        self.assertEqual([text[i] for i in offsets[6:9]], ['…'] * 3)
+        self.assertEqual(text[offsets[-1]], 'c')
+
+
+class LocateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TranscriptIndex(TRANSCRIPT)
+
+    def test_exact(self):
+        segment = "we watched the boats come in"
+        start, end = self.index.locate(segment)
+        self.assertEqual(TRANSCRIPT[start:end], segment)
+
+    def test_normalized_returns_original_text(self):
+        extracted = self.index.extract("MARIA: I grew up by the harbour - we watched")
+        self.assertEqual(extracted, "Maria:   I grew up by the harbour – we watched")
+
+    def test_wrapping_quotes_are_ignored(self):
+        self.assertEqual(self.index.extract('"And your father\'s work?"'), "And your father’s work?")
+
+    def test_one_substituted_word(self):
+        extracted = self.index.extract("He repaired nets for the fishermen, twenty years on the same pier, until the cannery closed.")
+        self.assertEqual(extracted, "He repaired nets for the fishermen, twenty years on the same quay, until the cannery closed")
+
+    def test_dropped_word(self):
+        extracted = self.index.extract("He repaired nets for fishermen twenty years on the same quay")
+        self.assertEqual(extracted, "He repaired nets for the fishermen, twenty years on the same quay")
+
+    def test_below_fuzzy_ratio_is_not_found(self):
+        # 7 of 10 words line up - under MIN_FUZZY_RATIO
+        segment = "He repaired sails for the sailors, twenty months on the same quay"
+        self.assertLess(7 / 10, MIN_FUZZY_RATIO)
+        self.assertIsNone(self.index.locate(segment))
+
+    def test_short_segments_are_not_fuzzy_matched(self):
+        self.assertIsNone(self.index.locate("grew up harbor"))
+
+    def test_missing_and_empty(self):
+        self.assertIsNone(self.index.locate("the lighthouse keeper never spoke"))
+        self.assertIsNone(self.index.locate(""))
+        self.assertIsNone(TranscriptIndex("").locate("anything"))
+
+    def test_shared_index_is_rebuilt_for_new_text(self):
+        first = get_transcript_index(TRANSCRIPT)
+        self.assertIs(get_transcript_index(TRANSCRIPT), first)
+        self.assertIsNot(get_transcript_index(TRANSCRIPT + " More."), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
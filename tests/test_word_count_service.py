@@ -0,0 +1,106 @@
+"""Net script word counts and the per-annotation count cache"""
+
+import re
+import unittest
+from unittest import mock
+
+import word_count_service
+from word_count_service import (WordCountService, count_net_words, duration_from_words,
+                                words_for_duration)
+
+
+def calculate_annotation_word_count(annotations_list):
+    """The storyboard organizer's word count before it moved into WordCountService"""
+    total_words = 0
+    for anno in annotations_list:
+        if anno.get('divider'):
+            continue
+        if 'storyboard' in anno and 'text' in anno['storyboard']:
+            html_text = anno['storyboard']['text']
+        else:
+            html_text = anno.get('text', '').replace('\n', '<br>')
+        header_patterns = [
+            r'<div><b[^>]*>(.*?)</b></div>',
+            r'<p[^>]*><b[^>]*>(.*?)</b></p>',
+            r'<b[^>]*>(.*?)</b>',
+            r'<span[^>]*style=[\'"][^"\']*font-weight:700[^"\']*[\'"]>(.*?)</span>',
+            r'<h[1-6][^>]*>(.*?)</h[1-6]>'
+        ]
+        html_without_headers = html_text
+        for pattern in header_patterns:
+            html_without_headers = re.sub(pattern, '', html_without_headers)
+        plain_text = re.sub(r'<[^>]+>', '', html_without_headers)
+        all_words = len(re.findall(r'\b\w+\b', plain_text))
+        strikethrough_words = 0
+        for segment in re.findall(r'<s style="color:#FF9999;">(.*?)</s>', html_without_headers):
+            strikethrough_words += len(re.findall(r'\b\w+\b', re.sub(r'<[^>]+>', '', segment)))
+        total_words += all_words - strikethrough_words
+    return total_words
+
+
+ANNOTATIONS = [
+    {'id': "plain", 'text': "I grew up\nby the harbour."},
+    {'id': "header", 'storyboard': {'text': "<div><b>Part One</b></div>Three words here"}},
+    {'id': "struck", 'storyboard': {'text': 'Keep these <s style="color:#FF9999;">drop <i>these</i> two</s> words'}},
+    {'id': "styled", 'storyboard': {'text': '<span style="font-weight:700">Title</span><h2>Scene</h2><p>Body text</p>'}},
+    {'id': "divider", 'divider': True, 'text': "Act Two starts here"},
+]
+
+
+class CountNetWordsTest(unittest.TestCase):
+
+    def test_headers_and_strikethrough_are_excluded(self):
+        self.assertEqual(count_net_words("<div><b>Part One</b></div>Three words here"), 3)
+        self.assertEqual(count_net_words('Keep these <s style="color:#FF9999;">drop <i>these</i> two</s> words'), 3)
+        self.assertEqual(count_net_words('<span style="font-weight:700">Title</span><h2>Scene</h2><p>Body text</p>'), 2)
+        self.assertEqual(count_net_words(""), 0)
+
+    def test_matches_the_old_storyboard_count(self):
+        service = WordCountService()
+        for annotation in ANNOTATIONS:
+            with self.subTest(annotation=annotation['id']):
+                self.assertEqual(service.count(annotation), calculate_annotation_word_count([annotation]))
+        self.assertEqual(service.total(ANNOTATIONS), calculate_annotation_word_count(ANNOTATIONS))
+
+    def test_duration_at_200_words_per_minute(self):
+        self.assertEqual(duration_from_words(300), 90)
+        self.assertEqual(words_for_duration(90), 300)
+
+
+class WordCountServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = WordCountService()
+        patcher = mock.patch.object(word_count_service, 'count_net_words', wraps=count_net_words)
+        self.counter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_count_is_reused_until_the_storyboard_text_changes(self):
+        annotation = {'id': "a", 'storyboard': {'text': "one two three"}}
+        self.assertEqual(self.service.count(annotation), 3)
+        self.assertEqual(self.service.count(annotation), 3)
+        self.assertEqual(self.service.count({'id': "a", 'storyboard': {'text': "one two three"}}), 3)
+        self.assertEqual(self.counter.call_count, 1)
+
+        annotation['storyboard']['text'] = "one two three four"
+        self.assertEqual(self.service.count(annotation), 4)
+        self.assertEqual(self.counter.call_count, 2)
+
+    def test_invalidate_forces_a_recount(self):
+        annotation = {'id': "a", 'text': "one two"}
+        self.service.count(annotation)
+        self.service.invalidate("a")
+        self.service.count(annotation)
+        self.service.invalidate()
+        self.service.count(annotation)
+        self.assertEqual(self.counter.call_count, 3)
+
+    def test_dividers_count_as_zero(self):
+        divider = {'id': "d", 'divider': True, 'storyboard': {'text': "Act Two"}}
+        self.assertEqual(self.service.count(divider), 0)
+        self.assertEqual(self.service.duration([divider]), (0, 0))
+        self.assertEqual(self.counter.call_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()